@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -11,9 +12,44 @@ class Config:
     EMAIL_IMAP_SERVER = os.getenv('EMAIL_IMAP_SERVER', 'imap.gmail.com')
     EMAIL_SMTP_SERVER = os.getenv('EMAIL_SMTP_SERVER', 'smtp.gmail.com:587')
     
+    # Polling Configuration (continuous mode)
+    ADAPTIVE_POLLING = os.getenv('ADAPTIVE_POLLING', 'false').lower() == 'true'
+    POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', '10'))
+    POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', '300'))
+    POLL_TARGET_PER_CHECK = float(os.getenv('POLL_TARGET_PER_CHECK', '1'))
+    POLL_PROFILES = os.getenv('POLL_PROFILES', '')  # JSON list of business-hours profiles
+    MAX_EMAILS_PER_CYCLE = int(os.getenv('MAX_EMAILS_PER_CYCLE', '200'))  # 0 = no limit
+    
+    # Backfill Configuration (historical imports)
+    BACKFILL_BATCH_SIZE = int(os.getenv('BACKFILL_BATCH_SIZE', '500'))
+    # 'skip' never sends, 'defer' records the action for --mode deliver-deferred, 'send' sends immediately
+    BACKFILL_REPLY_POLICY = os.getenv('BACKFILL_REPLY_POLICY', 'skip')
+    BACKFILL_FORWARD_POLICY = os.getenv('BACKFILL_FORWARD_POLICY', 'defer')
+    
+    # Multi-account Configuration (supervisor mode)
+    EMAIL_ACCOUNTS_FILE = os.getenv('EMAIL_ACCOUNTS_FILE', 'accounts.json')
+    SUPERVISOR_RESTART_DELAY = int(os.getenv('SUPERVISOR_RESTART_DELAY', '10'))
+    SUPERVISOR_MAX_RESTART_DELAY = int(os.getenv('SUPERVISOR_MAX_RESTART_DELAY', '300'))
+    
     # MongoDB Configuration
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
     MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'email_segregation_db')
+    MONGODB_BATCH_SIZE = int(os.getenv('MONGODB_BATCH_SIZE', '500'))
+    MONGODB_PAGE_SIZE = int(os.getenv('MONGODB_PAGE_SIZE', '50'))
+    
+    # Store the extracted text before cleaning (raw_content) alongside cleaned_content
+    STORE_RAW_CONTENT = os.getenv('STORE_RAW_CONTENT', 'true').lower() == 'true'
+    
+    # Content Compression Configuration (raw_content / cleaned_content)
+    COMPRESS_CONTENT = os.getenv('COMPRESS_CONTENT', 'false').lower() == 'true'
+    COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '512'))
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '6'))
+    GRIDFS_MIN_BYTES = int(os.getenv('GRIDFS_MIN_BYTES', '1048576'))
+    
+    # Archival Configuration (moves old emails out of the hot collection)
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '180'))
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '1000'))
+    ARCHIVE_COMPRESS = os.getenv('ARCHIVE_COMPRESS', 'true').lower() == 'true'
     
     # MonkeyLearn API Configuration
     MONKEYLEARN_API_KEY = os.getenv('MONKEYLEARN_API_KEY')
@@ -31,10 +67,164 @@ class Config:
         'general': os.getenv('GENERAL_EMAIL', 'general@company.com')
     }
     
+    # Forward delivery per department: 'immediate' (one message per email) or 'digest'
+    DEPARTMENT_DELIVERY = {
+        'hardware': os.getenv('HARDWARE_DELIVERY', 'immediate'),
+        'software': os.getenv('SOFTWARE_DELIVERY', 'immediate'),
+        'order': os.getenv('ORDER_DELIVERY', 'immediate'),
+        'payment': os.getenv('PAYMENT_DELIVERY', 'immediate'),
+        'general': os.getenv('GENERAL_DELIVERY', 'immediate')
+    }
+    # A department digest is sent once it holds this many forwards or its oldest is this old
+    DIGEST_MAX_EMAILS = int(os.getenv('DIGEST_MAX_EMAILS', '50'))
+    DIGEST_MAX_AGE_SECONDS = int(os.getenv('DIGEST_MAX_AGE_SECONDS', '1800'))
+    
+    # UID Lease Configuration (several instances on one mailbox)
+    ENABLE_UID_LEASES = os.getenv('ENABLE_UID_LEASES', 'false').lower() == 'true'
+    LEASE_TTL_SECONDS = int(os.getenv('LEASE_TTL_SECONDS', '300'))
+    LEASE_RENEW_INTERVAL = int(os.getenv('LEASE_RENEW_INTERVAL', '60'))
+    LEASE_MAX_CLAIMS_PER_CYCLE = int(os.getenv('LEASE_MAX_CLAIMS_PER_CYCLE', '0'))  # 0 = no limit
+    
+    # Content Extraction Configuration
+    # 'legacy' concatenates every text part; 'prefer_plain' keeps one body per multipart/alternative
+    EMAIL_CONTENT_MODE = os.getenv('EMAIL_CONTENT_MODE', 'legacy')
+    HTML_TEXT_MAX_CHARS = int(os.getenv('HTML_TEXT_MAX_CHARS', '100000'))
+    
+    # IMAP Fetch Configuration
+    # 'rfc822' downloads the full message; 'bodystructure' fetches only headers and text sections
+    IMAP_FETCH_MODE = os.getenv('IMAP_FETCH_MODE', 'rfc822')
+    IMAP_SECTION_MAX_BYTES = int(os.getenv('IMAP_SECTION_MAX_BYTES', '65536'))
+    # Parallel backlog fetching; the server's per-account connection cap includes the main connection
+    IMAP_FETCH_CONNECTIONS = int(os.getenv('IMAP_FETCH_CONNECTIONS', '4'))
+    IMAP_MAX_CONNECTIONS = int(os.getenv('IMAP_MAX_CONNECTIONS', '10'))
+    PARALLEL_FETCH_MIN_EMAILS = int(os.getenv('PARALLEL_FETCH_MIN_EMAILS', '20'))
+    
+    # Near-duplicate Detection Configuration (SimHash over cleaned content)
+    NEAR_DUPLICATE_DETECTION = os.getenv('NEAR_DUPLICATE_DETECTION', 'false').lower() == 'true'
+    NEAR_DUPLICATE_WINDOW_SECONDS = int(os.getenv('NEAR_DUPLICATE_WINDOW_SECONDS', '3600'))
+    NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', '6'))
+    NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv('NEAR_DUPLICATE_MAX_ENTRIES', '10000'))
+    NEAR_DUPLICATE_MIN_TOKENS = int(os.getenv('NEAR_DUPLICATE_MIN_TOKENS', '8'))
+    
+    # Conversation Threading Configuration
+    THREAD_ROUTING = os.getenv('THREAD_ROUTING', 'false').lower() == 'true'
+    THREAD_CACHE_SIZE = int(os.getenv('THREAD_CACHE_SIZE', '10000'))
+    
+    # Sender Prior Configuration (skip classification for consistent repeat senders)
+    SENDER_PRIOR = os.getenv('SENDER_PRIOR', 'false').lower() == 'true'
+    SENDER_PRIOR_MIN_COUNT = int(os.getenv('SENDER_PRIOR_MIN_COUNT', '5'))
+    SENDER_PRIOR_MIN_SHARE = float(os.getenv('SENDER_PRIOR_MIN_SHARE', '0.9'))
+    SENDER_PRIOR_CACHE_SIZE = int(os.getenv('SENDER_PRIOR_CACHE_SIZE', '10000'))
+    SENDER_PRIOR_CACHE_TTL = int(os.getenv('SENDER_PRIOR_CACHE_TTL', '600'))
+    SENDER_PRIOR_AUDIT_RATE = float(os.getenv('SENDER_PRIOR_AUDIT_RATE', '0.05'))
+    # Domains shared by unrelated senders only get per-address histograms
+    SENDER_PRIOR_SHARED_DOMAINS = [
+        domain.strip().lower() for domain in os.getenv(
+            'SENDER_PRIOR_SHARED_DOMAINS',
+            'gmail.com,googlemail.com,yahoo.com,ymail.com,hotmail.com,outlook.com,live.com,msn.com,aol.com,'
+            'icloud.com,me.com,mac.com,proton.me,protonmail.com,gmx.com,gmx.de,mail.com,yandex.com,yandex.ru,zoho.com'
+        ).split(',')
+    ]
+    
+    # Priority Ordering (urgent emails are fetched, classified and forwarded first)
+    PRIORITY_ORDERING = os.getenv('PRIORITY_ORDERING', 'false').lower() == 'true'
+    PRIORITY_KEYWORDS = os.getenv(
+        'PRIORITY_KEYWORDS', 'urgent,asap,critical,emergency,outage,down,payment failed,declined,escalation'
+    ).split(',')
+    PRIORITY_SENDERS = os.getenv('PRIORITY_SENDERS', '').split(',')  # Addresses or @domains
+    PRIORITY_AGING_SECONDS = int(os.getenv('PRIORITY_AGING_SECONDS', '600'))  # One priority point per period waited
+    HIGH_PRIORITY_DEPARTMENTS = [
+        department.strip() for department in os.getenv('HIGH_PRIORITY_DEPARTMENTS', 'payment,hardware,software').split(',')
+    ]
+    
+    # Classifier Worker Pool (forked after the models load; 0 workers classifies in-process)
+    CLASSIFIER_POOL_WORKERS = int(os.getenv('CLASSIFIER_POOL_WORKERS', '0'))
+    CLASSIFIER_POOL_BATCH_SIZE = int(os.getenv('CLASSIFIER_POOL_BATCH_SIZE', '16'))
+    CLASSIFIER_POOL_MAX_TASKS = int(os.getenv('CLASSIFIER_POOL_MAX_TASKS', '500'))  # Batches before a worker is replaced
+    CLASSIFIER_POOL_TIMEOUT = int(os.getenv('CLASSIFIER_POOL_TIMEOUT', '120'))
+    CLASSIFIER_POOL_HEALTH_INTERVAL = int(os.getenv('CLASSIFIER_POOL_HEALTH_INTERVAL', '60'))
+    CLASSIFIER_POOL_MAX_RESTARTS = int(os.getenv('CLASSIFIER_POOL_MAX_RESTARTS', '5'))  # Consecutive failures before giving up
+    CLASSIFIER_POOL_RESTART_DELAY = int(os.getenv('CLASSIFIER_POOL_RESTART_DELAY', '30'))  # Doubles per consecutive failure
+    
+    # Pipeline Journal (local SQLite write-ahead log of each email's progress, resumed on startup)
+    PIPELINE_JOURNAL = os.getenv('PIPELINE_JOURNAL', 'false').lower() == 'true'
+    JOURNAL_PATH = os.getenv('JOURNAL_PATH', 'pipeline_journal.db')
+    JOURNAL_SYNCHRONOUS = os.getenv('JOURNAL_SYNCHRONOUS', 'normal').lower()  # 'normal' or 'full' (fsync every commit)
+    
+    # Asynchronous Database Writes (needs the journal; emails are stored in background batches)
+    ASYNC_DB_WRITES = os.getenv('ASYNC_DB_WRITES', 'false').lower() == 'true'
+    DB_WRITE_BATCH_SIZE = int(os.getenv('DB_WRITE_BATCH_SIZE', '100'))
+    DB_WRITE_FLUSH_SECONDS = float(os.getenv('DB_WRITE_FLUSH_SECONDS', '2'))
+    DB_WRITE_MAX_RETRIES = int(os.getenv('DB_WRITE_MAX_RETRIES', '3'))
+    DB_WRITE_RETRY_SECONDS = float(os.getenv('DB_WRITE_RETRY_SECONDS', '5'))
+    
+    # Auto-Reply Suppression (at most one auto-reply per sender per window)
+    AUTO_REPLY_SUPPRESSION = os.getenv('AUTO_REPLY_SUPPRESSION', 'false').lower() == 'true'
+    AUTO_REPLY_WINDOW_SECONDS = int(os.getenv('AUTO_REPLY_WINDOW_SECONDS', '3600'))
+    AUTO_REPLY_CACHE_SIZE = int(os.getenv('AUTO_REPLY_CACHE_SIZE', '10000'))
+    
+    # Daemon Configuration (resident process driven by email_client.py)
+    DAEMON_SOCKET = os.getenv('DAEMON_SOCKET', 'email_segregation.sock')
+    DAEMON_PORT = int(os.getenv('DAEMON_PORT', '8765'))  # Loopback TCP where Unix sockets are unavailable
+    DAEMON_CLIENT_TIMEOUT = float(os.getenv('DAEMON_CLIENT_TIMEOUT', '300'))
+    DAEMON_MAX_REQUEST_BYTES = int(os.getenv('DAEMON_MAX_REQUEST_BYTES', '1048576'))
+    DAEMON_KEEPALIVE_SECONDS = int(os.getenv('DAEMON_KEEPALIVE_SECONDS', '240'))
+    
+    # Classification API (local HTTP service for other systems, started with --mode api)
+    API_HOST = os.getenv('API_HOST', '127.0.0.1')
+    API_PORT = int(os.getenv('API_PORT', '8080'))
+    API_BATCH_WINDOW_MS = float(os.getenv('API_BATCH_WINDOW_MS', '10'))  # How long a batch waits for more requests
+    API_MAX_BATCH_SIZE = int(os.getenv('API_MAX_BATCH_SIZE', '32'))
+    API_QUEUE_LIMIT = int(os.getenv('API_QUEUE_LIMIT', '1000'))  # Queued requests beyond this get 503
+    API_REQUEST_TIMEOUT = float(os.getenv('API_REQUEST_TIMEOUT', '30'))
+    API_MAX_REQUEST_BYTES = int(os.getenv('API_MAX_REQUEST_BYTES', str(1024 * 1024)))
+    
+    # Logging Configuration
+    LOG_FILE = os.getenv('LOG_FILE', 'email_segregation.log')
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # 'text' or 'json' (one object per line)
+    LOG_ROTATION = os.getenv('LOG_ROTATION', 'size')  # 'size' or 'time'
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+    LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', 'midnight')
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+    # Per-email log lines allowed per second from each call site (0 = unlimited)
+    LOG_HOT_PATH_RATE = float(os.getenv('LOG_HOT_PATH_RATE', '5'))
+    
     # Email Templates
     AUTO_REPLY_SUBJECT = "[Auto-Reply] Query Submitted"
     FORWARD_SUBJECT = "Forwarded message from company's mail-id"
     
+    @classmethod
+    def load_mailboxes(cls, accounts_file: str = None) -> list:
+        """Load the account/folder list for supervisor mode
+        
+        The file is a JSON list of accounts, for example:
+        [{"username": "support@company.com", "password_env": "SUPPORT_PASSWORD",
+          "imap_server": "imap.gmail.com", "folders": ["inbox", "Escalations"]}]
+        
+        Returns one entry per (account, folder) pair.
+        """
+        accounts_file = accounts_file or cls.EMAIL_ACCOUNTS_FILE
+        with open(accounts_file, 'r', encoding='utf-8') as f:
+            accounts = json.load(f)
+        
+        mailboxes = []
+        for account in accounts:
+            username = account.get('username')
+            # Prefer reading the password from an environment variable over storing it in the file
+            password = os.getenv(account['password_env']) if account.get('password_env') else account.get('password')
+            if not username or not password:
+                raise ValueError(f"Account entry is missing a username or password: {username or account}")
+            
+            for folder in account.get('folders', ['inbox']):
+                mailboxes.append({
+                    'username': username,
+                    'password': password,
+                    'imap_server': account.get('imap_server', cls.EMAIL_IMAP_SERVER),
+                    'folder': folder
+                })
+        return mailboxes
+    
     # Validation
     @classmethod
     def validate_config(cls):
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Lightweight client for the Email Segregation System daemon (main.py --mode daemon).
+Triggers a processing cycle, classifies ad hoc text or prints statistics without
+loading the classifiers or reconnecting to IMAP and MongoDB.
+"""
+
+import argparse
+import json
+import sys
+
+from src.daemon import send_command
+
+def main():
+    """Client entry point"""
+    parser = argparse.ArgumentParser(description='Email Segregation System daemon client')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('run', help='Check for and process new emails now')
+    classify = subparsers.add_parser('classify', help='Classify a piece of text')
+    classify.add_argument('text', help="Text to classify, '-' to read stdin")
+    classify.add_argument('--from-email', default=None, help='Sender address (enables the sender prior)')
+    subparsers.add_parser('stats', help='Print processing statistics')
+    subparsers.add_parser('ping', help='Check that the daemon is running')
+    subparsers.add_parser('stop', help='Shut the daemon down')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Seconds to wait for a response (default: DAEMON_CLIENT_TIMEOUT)')
+    args = parser.parse_args()
+    
+    params = {}
+    if args.command == 'classify':
+        params = {'text': sys.stdin.read() if args.text == '-' else args.text, 'from_email': args.from_email}
+    
+    try:
+        response = send_command(args.command, args.timeout, **params)
+    except (OSError, ValueError) as e:
+        print(f"Could not reach the daemon: {e}", file=sys.stderr)
+        return 2
+    
+    print(json.dumps(response, indent=2))
+    return 0 if response.get('ok') else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,14 +5,16 @@ Automatically processes incoming emails, classifies them using NLP,
 and forwards them to appropriate departments with auto-replies.
 """
 
+import json
 import logging
 import sys
 import os
-import csv
 import time
 import signal
-from datetime import datetime
-from typing import List, Dict
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Set, Tuple
+from pymongo.errors import PyMongoError
 
 # Add src directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
@@ -22,29 +24,72 @@ from src.email_processor import EmailProcessor
 from src.unified_classifier import UnifiedClassifier
 from src.email_responder import EmailResponder
 from src.database import DatabaseManager
+from src.supervisor import MailboxSupervisor
+from src.exporter import EmailExporter
+from src.near_duplicate import NearDuplicateDetector
+from src.thread_index import ThreadIndex, parse_message_ids
+from src.sender_prior import SenderPrior
+from src.poll_scheduler import AdaptivePollScheduler
+from src.digest import DigestBuffer
+from src.reply_suppression import ReplySuppressor
+from src.logging_setup import HOT_PATH, setup_logging, setup_worker_logging
+from src.daemon import DaemonServer
+from src.classification_api import ClassificationApi
+from src.evaluation import ClassifierEvaluator
+from src.classifier_pool import ClassifierPool
+from src.journal import PipelineJournal
+from src.async_writer import AsyncEmailWriter
+from src.priority import AgingPriorityQueue, FirstSeenTimes, ForwardLatencyTracker, PriorityScorer
 from config.settings import Config
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('email_segregation.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
 class EmailSegregationSystem:
     """Main class for the email segregation system"""
     
-    def __init__(self):
+    def __init__(self, mailbox: Dict = None):
         self.logger = logging.getLogger(__name__)
-        self.email_processor = EmailProcessor()
+        # A specific account/folder in supervisor mode, otherwise the primary inbox
+        self.email_processor = EmailProcessor(**mailbox) if mailbox else EmailProcessor()
         self.classifier = UnifiedClassifier(preferred_method='openai')
         self.responder = EmailResponder()
         self.db_manager = DatabaseManager()
+        self.near_duplicates = NearDuplicateDetector(
+            window_seconds=Config.NEAR_DUPLICATE_WINDOW_SECONDS,
+            max_distance=Config.NEAR_DUPLICATE_MAX_DISTANCE,
+            max_entries=Config.NEAR_DUPLICATE_MAX_ENTRIES
+        ) if Config.NEAR_DUPLICATE_DETECTION else None
+        self.sender_prior = SenderPrior(
+            self.db_manager,
+            min_count=Config.SENDER_PRIOR_MIN_COUNT,
+            min_share=Config.SENDER_PRIOR_MIN_SHARE,
+            capacity=Config.SENDER_PRIOR_CACHE_SIZE,
+            ttl_seconds=Config.SENDER_PRIOR_CACHE_TTL
+        ) if Config.SENDER_PRIOR else None
+        if self.sender_prior:
+            self.classifier.set_sender_prior(self.sender_prior)
+        # Serializes classifier and prior calls, so daemon requests can classify between a cycle's emails
+        self._classifier_lock = threading.Lock()
+        self.thread_index = ThreadIndex(self.db_manager, Config.THREAD_CACHE_SIZE) if Config.THREAD_ROUTING else None
+        self.reply_suppressor = ReplySuppressor(
+            self.db_manager, Config.AUTO_REPLY_WINDOW_SECONDS, Config.AUTO_REPLY_CACHE_SIZE
+        ) if Config.AUTO_REPLY_SUPPRESSION else None
+        self.priority_scorer = PriorityScorer(
+            Config.PRIORITY_KEYWORDS, Config.PRIORITY_SENDERS
+        ) if Config.PRIORITY_ORDERING else None
+        self.forward_latency = ForwardLatencyTracker()
+        self.first_seen = FirstSeenTimes()  # Ages emails from when they were found, not their Date header
+        # Latency is recorded when a forward is sent, which for digest departments is when the digest goes out
+        self.responder.on_forwarded = lambda department, first_seen_at: self.forward_latency.record(
+            department, time.time() - first_seen_at
+        )
+        if 'digest' in Config.DEPARTMENT_DELIVERY.values():
+            self.responder.set_digest_buffer(
+                DigestBuffer(self.db_manager, Config.DIGEST_MAX_EMAILS, Config.DIGEST_MAX_AGE_SECONDS)
+            )
         self.running = True
+        self._stop_event = threading.Event()  # Wakes the continuous-mode wait on shutdown
         self.check_interval = 60  # Check every 60 seconds (1 minute)
+        self.cycle_callback = None  # Called with self.stats after every continuous-mode cycle
+        self.stats = {'cycles': 0, 'fetched': 0, 'processed': 0, 'errors': 0, 'near_duplicates': 0, 'thread_routed': 0, 'suppressed_replies': 0, 'last_cycle_at': None}
         
         # Validate configuration
         try:
@@ -54,19 +99,206 @@ class EmailSegregationSystem:
             self.logger.error(f"Configuration validation failed: {e}")
             sys.exit(1)
         
+        self.db_writer = None  # Started with the other services when ASYNC_DB_WRITES is on
+        # Emails handed to db_writer but not yet stored: their duplicate-check keys and UIDs (whose leases stay held)
+        self._unwritten_keys = set()
+        self._unwritten_uids = set()
+        self._unwritten_lock = threading.Lock()
+        
+        # Fork the classifier pool host now: the models are loaded and no connections are open yet
+        self.classifier_pool = None
+        self._prefetched_routes = {}
+        if Config.CLASSIFIER_POOL_WORKERS > 0:
+            if ClassifierPool.is_available():
+                self.classifier_pool = ClassifierPool(
+                    self.classifier,
+                    workers=Config.CLASSIFIER_POOL_WORKERS,
+                    batch_size=Config.CLASSIFIER_POOL_BATCH_SIZE,
+                    max_tasks=Config.CLASSIFIER_POOL_MAX_TASKS,
+                    timeout=Config.CLASSIFIER_POOL_TIMEOUT,
+                    health_interval=Config.CLASSIFIER_POOL_HEALTH_INTERVAL,
+                    max_restarts=Config.CLASSIFIER_POOL_MAX_RESTARTS,
+                    restart_delay=Config.CLASSIFIER_POOL_RESTART_DELAY
+                )
+                self.classifier_pool.start()
+                self.classifier.set_pool(self.classifier_pool)
+            else:
+                self.logger.warning("Classifier pool needs the 'fork' start method; classifying in-process")
+        
+        # Opened after the pool host is forked, so the host does not inherit the database file
+        self.journal = PipelineJournal(Config.JOURNAL_PATH, Config.JOURNAL_SYNCHRONOUS) if Config.PIPELINE_JOURNAL else None
+        
         # Setup signal handlers for graceful shutdown
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
     
+    def _start_services(self):
+        """Start database-backed helpers once the database connection is up"""
+        if Config.ENABLE_UID_LEASES:
+            self.db_manager.start_lease_heartbeat()
+        if self.near_duplicates:
+            self._warm_near_duplicate_index()
+        if self.journal:
+            self._resume_journal()
+            if Config.ASYNC_DB_WRITES:
+                self.db_writer = AsyncEmailWriter(
+                    self.db_manager,
+                    self._on_emails_written,
+                    Config.DB_WRITE_BATCH_SIZE,
+                    Config.DB_WRITE_FLUSH_SECONDS,
+                    on_failed=self._on_emails_not_written,
+                    max_retries=Config.DB_WRITE_MAX_RETRIES,
+                    retry_delay=Config.DB_WRITE_RETRY_SECONDS
+                )
+                self.db_writer.start()
+        elif Config.ASYNC_DB_WRITES:
+            self.logger.warning("ASYNC_DB_WRITES needs PIPELINE_JOURNAL; storing emails synchronously")
+    
+    @staticmethod
+    def _write_keys(email_data: Dict) -> List[tuple]:
+        """The identifiers email_exists() matches on, besides the UID"""
+        keys = [('sent', email_data.get('date'), email_data.get('from_email'), email_data.get('subject'))]
+        if email_data.get('message_id'):
+            keys.append(('message_id', email_data['message_id']))
+        return keys
+    
+    def _submit_write(self, email_data: Dict):
+        """Queue an email for db_writer, keeping its lease until the write is confirmed"""
+        with self._unwritten_lock:
+            self._unwritten_keys.update(self._write_keys(email_data))
+            self._unwritten_uids.add(email_data['uid'])
+        self.db_writer.submit(email_data)
+    
+    def _write_pending(self, email_data: Dict) -> bool:
+        """Whether an email still queued in db_writer has the same identifiers (email_exists cannot see it yet)"""
+        with self._unwritten_lock:
+            return any(key in self._unwritten_keys for key in self._write_keys(email_data))
+    
+    def _finish_writes(self, emails: List[Dict]) -> List[str]:
+        """Forget emails that db_writer is done with, returning their UIDs"""
+        with self._unwritten_lock:
+            for email_data in emails:
+                self._unwritten_keys.difference_update(self._write_keys(email_data))
+                self._unwritten_uids.discard(email_data['uid'])
+        return [email_data['uid'] for email_data in emails]
+    
+    def _on_emails_written(self, emails: List[Dict]):
+        """Called on the db_writer thread once emails are in the database"""
+        for email_data in emails:
+            self.journal.mark(email_data['account'], email_data['folder'], email_data['uid'], 'persisted')
+        uids = self._finish_writes(emails)
+        if Config.ENABLE_UID_LEASES:
+            self.db_manager.release_email_uids(self.email_processor.username, self.email_processor.folder, uids)
+    
+    def _on_emails_not_written(self, emails: List[Dict]):
+        """Called on the db_writer thread for emails it gave up storing after its retries
+        
+        They stay in the journal, which stores them on the next start. Their leases are released so
+        another instance can store them in the meantime; the replay then finds them stored.
+        """
+        uids = self._finish_writes(emails)
+        if Config.ENABLE_UID_LEASES:
+            self.db_manager.release_email_uids(self.email_processor.username, self.email_processor.folder, uids)
+    
+    def _resume_journal(self):
+        """Finish emails a previous run classified but did not store, acknowledge or forward
+        
+        With UID leases on, each entry is leased before it is replayed, and entries another
+        instance is working on are left alone.
+        """
+        account = self.email_processor.username
+        folder = self.email_processor.folder
+        entries = self.journal.unfinished(account, folder)
+        if not entries:
+            return
+        
+        self.logger.info(f"Resuming {len(entries)} unfinished emails from the journal")
+        for entry in entries:
+            uid = entry['uid']
+            email_data = entry['document']
+            if email_data is None:
+                # Fetched but never classified; the next check fetches it again
+                self.journal.discard(account, folder, uid)
+                continue
+            
+            if Config.ENABLE_UID_LEASES and not self.db_manager.claim_email_uids(account, folder, [uid]):
+                if entry['persisted']:
+                    self.logger.info(f"Journaled email {uid} is leased by another instance; will retry on the next start")
+                else:
+                    # The other instance fetched it again and stores and sends it itself
+                    self.journal.discard(account, folder, uid)
+                continue
+            try:
+                self._resume_entry(entry)
+            finally:
+                if Config.ENABLE_UID_LEASES:
+                    self.db_manager.release_email_uids(account, folder, [uid])
+    
+    def _resume_entry(self, entry: Dict):
+        account, folder, uid = self.email_processor.username, self.email_processor.folder, entry['uid']
+        email_data = entry['document']
+        if not entry['persisted']:
+            if not (self.db_manager.email_exists(email_data) or self.db_manager.insert_email(email_data)):
+                self.logger.warning(f"Could not store journaled email {uid}; will retry on the next start")
+                return
+            self.journal.mark(account, folder, uid, 'persisted')
+        
+        for action in self._send_actions(email_data, entry['actions']):
+            self.journal.mark(account, folder, uid, PipelineJournal.ACTION_STEPS[action])
+    
+    def _warm_near_duplicate_index(self):
+        """Load fingerprints of recently processed emails so detection survives restarts"""
+        since = datetime.now() - timedelta(seconds=Config.NEAR_DUPLICATE_WINDOW_SECONDS)
+        for document in self.db_manager.get_recent_fingerprints(since):
+            self.near_duplicates.add(
+                int(document['fingerprint'], 16),
+                document.get('uid'),
+                document.get('department', 'general'),
+                document.get('from_email', ''),
+                document['processed_at'].timestamp()
+            )
+        self.logger.info(f"Near-duplicate index warmed with {len(self.near_duplicates)} recent emails")
+    
+    def _find_near_duplicate(self, email_data: Dict) -> Optional[Dict]:
+        """Find a recently processed email this one nearly duplicates"""
+        if not self.near_duplicates or not email_data.get('fingerprint'):
+            return None
+        return self.near_duplicates.find(int(email_data['fingerprint'], 16))
+    
     def _signal_handler(self, signum, frame):
         """Handle shutdown signals gracefully"""
         self.logger.info(f"Received signal {signum}, initiating graceful shutdown...")
         self.running = False
+        self._stop_event.set()
+    
+    def _create_scheduler(self) -> AdaptivePollScheduler:
+        """Build the polling scheduler (a fixed interval unless adaptive polling is enabled)"""
+        if not Config.ADAPTIVE_POLLING:
+            return AdaptivePollScheduler(min_interval=self.check_interval, max_interval=self.check_interval)
+        
+        try:
+            profiles = AdaptivePollScheduler.parse_profiles(Config.POLL_PROFILES)
+        except ValueError as e:
+            self.logger.warning(f"Ignoring invalid POLL_PROFILES: {e}")
+            profiles = []
+        scheduler = AdaptivePollScheduler(
+            min_interval=Config.POLL_MIN_INTERVAL,
+            max_interval=Config.POLL_MAX_INTERVAL,
+            target_per_poll=Config.POLL_TARGET_PER_CHECK,
+            profiles=profiles
+        )
+        # The configured check interval is the starting point
+        scheduler.interval = min(max(self.check_interval, Config.POLL_MIN_INTERVAL), Config.POLL_MAX_INTERVAL)
+        return scheduler
     
     def run_continuous(self):
-        """Run the system continuously, checking for emails every minute"""
+        """Run the system continuously, checking for emails on an adaptive schedule"""
         self.logger.info("Starting Email Segregation System in CONTINUOUS mode")
-        self.logger.info(f"Will check for new emails every {self.check_interval} seconds")
+        if Config.ADAPTIVE_POLLING:
+            self.logger.info(f"Will check for new emails every {Config.POLL_MIN_INTERVAL:g}-{Config.POLL_MAX_INTERVAL:g} seconds depending on traffic")
+        else:
+            self.logger.info(f"Will check for new emails every {self.check_interval} seconds")
+        scheduler = self._create_scheduler()
         
         try:
             # Connect to database once
@@ -74,6 +306,8 @@ class EmailSegregationSystem:
                 self.logger.error("Failed to connect to database")
                 return False
             
+            self._start_services()
+            
             # Connect to email server once
             if not self.email_processor.connect_to_email():
                 self.logger.error("Failed to connect to email server")
@@ -89,20 +323,35 @@ class EmailSegregationSystem:
                 
                 try:
                     # Check for new emails
+                    cycle_started_at = time.time()
+                    processed_before = self.stats['processed']
                     self._check_and_process_emails()
+                    self.stats['cycles'] += 1
+                    self.stats['last_cycle_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    if self.cycle_callback:
+                        self.cycle_callback(self.stats)
+                    
+                    # The wait counts from the start of the cycle, so a long cycle shortens it. A backlog
+                    # only skips the wait if this cycle got somewhere; otherwise it backs off as usual.
+                    # Arrivals are the UIDs first seen this cycle, not the backlog fetched again
+                    made_progress = self.stats['processed'] > processed_before
+                    interval = scheduler.next_interval(
+                        cycle_started_at,
+                        self.email_processor.arrival_count,
+                        self.email_processor.pending_count if made_progress else 0
+                    )
+                    wait = max(0.0, interval - (time.time() - cycle_started_at))
                     
                     # Wait for the next check (with ability to interrupt)
-                    if self.running:
-                        self.logger.info(f"Waiting {self.check_interval} seconds until next check...")
-                        for i in range(self.check_interval):
-                            if not self.running:
-                                break
-                            time.sleep(1)
+                    if self.running and wait > 0:
+                        self.logger.info(f"Waiting {wait:.0f} seconds until next check...")
+                        self._stop_event.wait(wait)
                     
                 except Exception as e:
+                    self.stats['errors'] += 1
                     self.logger.error(f"Error in email check cycle: {e}")
                     self.logger.info("Continuing with next cycle...")
-                    time.sleep(5)  # Short delay before retrying
+                    self._stop_event.wait(5)  # Short delay before retrying
             
             self.logger.info("Email Segregation System stopped gracefully")
             return True
@@ -123,13 +372,15 @@ class EmailSegregationSystem:
                 self.logger.error("Failed to connect to database")
                 return False
             
+            self._start_services()
+            
             # Connect to email server
             if not self.email_processor.connect_to_email():
                 self.logger.error("Failed to connect to email server")
                 return False
             
-            # Check and process emails once
-            self._check_and_process_emails()
+            # Check and process emails once, draining anything left over by the batch cap
+            self._check_until_drained()
             
             return True
             
@@ -139,74 +390,572 @@ class EmailSegregationSystem:
         finally:
             self.cleanup()
     
-    def _check_and_process_emails(self):
-        """Check for new emails and process them"""
+    def run_daemon(self):
+        """Stay resident with warm connections and classifiers, serving email_client.py requests"""
+        self.logger.info("Starting Email Segregation System in DAEMON mode")
+        # Cycles and keepalives share the connections; classify requests only share the classifier
+        self._daemon_lock = threading.Lock()
+        self._started_at = time.time()
+        server = DaemonServer({
+            'run': self._daemon_run,
+            'classify': self._daemon_classify,
+            'stats': self._daemon_stats,
+            'ping': lambda request: {'pid': os.getpid()},
+            'stop': self._daemon_stop
+        })
+        
         try:
-            # Get list of already processed email UIDs from database
-            processed_uids = self.db_manager.get_processed_uids()
+            if not self.db_manager.connect():
+                self.logger.error("Failed to connect to database")
+                return False
+            
+            self._start_services()
+            
+            if not self.email_processor.connect_to_email():
+                self.logger.error("Failed to connect to email server")
+                return False
+            
+            server.start()
+            while self.running:
+                # Keep the IMAP session alive between triggers
+                if self._stop_event.wait(Config.DAEMON_KEEPALIVE_SECONDS):
+                    break
+                with self._daemon_lock:
+                    self.email_processor.ensure_connected()
             
-            # Fetch only new emails that haven't been processed
-            emails = self.email_processor.fetch_emails(processed_uids)
+            self.logger.info("Email Segregation System daemon stopped gracefully")
+            return True
             
-            if not emails:
-                self.logger.info("No new emails to process")
+        except Exception as e:
+            self.logger.error(f"Critical error in daemon mode: {e}")
+            return False
+        finally:
+            server.stop()
+            self.cleanup()
+    
+    def run_api(self):
+        """Serve the classifiers over local HTTP to other internal systems"""
+        self.logger.info("Starting Email Segregation System in API mode")
+        api = ClassificationApi(
+            self.classifier,
+            host=Config.API_HOST,
+            port=Config.API_PORT,
+            max_batch_size=Config.API_MAX_BATCH_SIZE,
+            window_seconds=Config.API_BATCH_WINDOW_MS / 1000,
+            queue_limit=Config.API_QUEUE_LIMIT,
+            request_timeout=Config.API_REQUEST_TIMEOUT,
+            max_request_bytes=Config.API_MAX_REQUEST_BYTES,
+            metrics=self._api_metrics
+        )
+        
+        try:
+            # Only the sender prior reads from the database
+            if self.sender_prior and not self.db_manager.connect():
+                self.logger.error("Failed to connect to database")
+                return False
+            
+            if not self.classifier_pool:
+                self.logger.warning(
+                    "Classification API without a classifier pool: batches are classified one email at a time, "
+                    "so throughput is that of sequential classification; set CLASSIFIER_POOL_WORKERS to spread them over workers"
+                )
+            api.start()
+            self._stop_event.wait()
+            
+            self.logger.info("Classification API stopped gracefully")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Critical error in API mode: {e}")
+            return False
+        finally:
+            api.stop()
+            self.cleanup()
+    
+    def _api_metrics(self) -> Dict:
+        """Pipeline counters reported by the classification API"""
+        return {
+            'sender_prior': self.classifier.get_prior_stats() if self.sender_prior else None,
+            'classifier_pool': dict(self.classifier_pool.stats) if self.classifier_pool else None
+        }
+    
+    def _daemon_run(self, request: Dict) -> Dict:
+        """Run one processing cycle (draining any batch-cap backlog) and report its counts"""
+        with self._daemon_lock:
+            started_at = time.time()
+            fetched_before, processed_before = self.stats['fetched'], self.stats['processed']
+            if not self.email_processor.ensure_connected():
+                raise ConnectionError("Email server is unreachable")
+            self._check_until_drained()
+            self.stats['cycles'] += 1
+            self.stats['last_cycle_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            return {
+                'fetched': self.stats['fetched'] - fetched_before,
+                'processed': self.stats['processed'] - processed_before,
+                'duration_ms': round((time.time() - started_at) * 1000, 1)
+            }
+    
+    def _daemon_classify(self, request: Dict) -> Dict:
+        """Classify ad hoc text without storing or forwarding it
+        
+        Does not wait for a running cycle, only for the classification in progress.
+        """
+        with self._classifier_lock:
+            return self.classifier.route_email(request.get('text', ''), request.get('from_email'))
+    
+    def _daemon_stats(self, request: Dict) -> Dict:
+        """Report the counters of this daemon and the database totals"""
+        with self._daemon_lock:
+            return {
+                'uptime_seconds': round(time.time() - self._started_at),
+                'stats': dict(self.stats),
+                'sender_prior': self.classifier.get_prior_stats() if self.sender_prior else None,
+                'time_to_forward': self.forward_latency.summary(),
+                'database': self.db_manager.get_database_stats()
+            }
+    
+    def _daemon_stop(self, request: Dict) -> Dict:
+        """Shut the daemon down after the current request"""
+        self.running = False
+        self._stop_event.set()
+        return {'stopping': True}
+    
+    def _check_until_drained(self):
+        """Check for emails, repeating while the batch cap leaves a backlog and cycles make progress"""
+        while True:
+            processed_before = self.stats['processed']
+            self._check_and_process_emails()
+            # Emails that keep failing would otherwise be retried back to back forever
+            if not (self.running and self.email_processor.pending_count > 0 and self.stats['processed'] > processed_before):
                 return
+    
+    def _check_and_process_emails(self):
+        """Check for new emails and process them"""
+        try:
+            # Get list of already processed email UIDs from database
+            account = self.email_processor.username
+            folder = self.email_processor.folder
+            processed_uids = self.db_manager.get_processed_uids(account, folder)
+            if self.journal:
+                # Journaled emails may not be in the database yet but must not be fetched again
+                processed_uids = list(set(processed_uids) | self.journal.uids(account, folder))
             
-            self.logger.info(f"Found {len(emails)} new emails to process")
+            # Lease new UIDs so other instances on the same mailbox skip them
+            claimed_uids = []
             
-            # Process each email
-            processed_count = 0
-            for email_data in emails:
-                if self.process_single_email(email_data):
-                    processed_count += 1
+            def claim_uids(uids, limit):
+                limits = [n for n in (limit, Config.LEASE_MAX_CLAIMS_PER_CYCLE) if n]
+                claimed_uids.extend(self.db_manager.claim_email_uids(account, folder, uids, min(limits) if limits else 0))
+                return claimed_uids
             
-            self.logger.info(f"Successfully processed {processed_count} out of {len(emails)} emails")
+            try:
+                self._process_fetched_emails(processed_uids, claim_uids if Config.ENABLE_UID_LEASES else None)
+            finally:
+                # Emails still queued for the async writer keep their leases until it stores them
+                with self._unwritten_lock:
+                    released = [uid for uid in claimed_uids if uid not in self._unwritten_uids]
+                self.db_manager.release_email_uids(account, folder, released)
             
-            # Display statistics only when emails were processed
-            if processed_count > 0:
-                self.display_statistics()
+            # Send department digests that reached their size or age threshold
+            self.responder.flush_digests()
                 
         except Exception as e:
             self.logger.error(f"Error in email check and process: {e}")
             raise
     
+    def _process_fetched_emails(self, processed_uids: List[str], claim_uids=None):
+        """Fetch new emails and run each through the pipeline"""
+        # Fetch only new emails that haven't been processed
+        emails = self.email_processor.fetch_emails(
+            processed_uids, claim_uids, Config.MAX_EMAILS_PER_CYCLE,
+            self._rank_uids if self.priority_scorer else None
+        )
+        
+        if not emails:
+            self.logger.info("No new emails to process")
+            return
+        
+        self.logger.info(f"Found {len(emails)} new emails to process")
+        self.stats['fetched'] += len(emails)
+        for email_data in emails:
+            self.first_seen.get(email_data['uid'])
+        if self.journal:
+            self.journal.record_fetched(
+                self.email_processor.username, self.email_processor.folder, [email_data['uid'] for email_data in emails]
+            )
+        
+        self._prefetched_routes = {}
+        processed_count = 0
+        try:
+            if self.classifier_pool and len(emails) > 1:
+                # Route by thread and near-duplicate first, as a backfill does, and classify only the
+                # rest of the batch in the worker pool up front
+                for email_data in emails:
+                    route = self._route_from_history(email_data)
+                    if route:
+                        self._prefetched_routes[email_data['uid']] = route
+                pending = [email_data for email_data in emails if email_data['uid'] not in self._prefetched_routes]
+                if pending:
+                    routes = self._route_batch(pending)
+                    self._prefetched_routes.update((email_data['uid'], route) for email_data, route in zip(pending, routes))
+            
+            # Process each email, most urgent first
+            for email_data in self._priority_order(emails):
+                if self.process_single_email(email_data):
+                    processed_count += 1
+        finally:
+            if self.journal:
+                # Emails that were skipped, failed or never reached are fetched again; only classified ones stay journaled
+                self.journal.discard_fetched(
+                    self.email_processor.username, self.email_processor.folder, [email_data['uid'] for email_data in emails]
+                )
+        
+        self.logger.info(f"Successfully processed {processed_count} out of {len(emails)} emails")
+        self.stats['processed'] += processed_count
+        
+        # Display statistics only when emails were processed
+        if processed_count > 0:
+            self.display_statistics()
+        self._prefetched_routes = {}
+    
+    def _route_batch(self, emails: List[Dict]) -> List[Dict]:
+        """Classify emails together (in the worker pool, if there is one)"""
+        with self._classifier_lock:
+            return self.classifier.route_batch(
+                [email_data['cleaned_content'] for email_data in emails],
+                [email_data.get('from_email') for email_data in emails]
+            )
+    
+    def _priority_queue(self, items: List, headers: List[Dict], uids: List[str]) -> AgingPriorityQueue:
+        """Queue items by header score, aged by how long each email has been waiting"""
+        queue = AgingPriorityQueue(Config.PRIORITY_AGING_SECONDS)
+        for item, item_headers, uid in zip(items, headers, uids):
+            queue.push(item, self.priority_scorer.score(item_headers), self.first_seen.get(uid))
+        return queue
+    
+    def _rank_uids(self, uids: List[bytes]) -> List[bytes]:
+        """Order a backlog of UIDs by priority from a bulk fetch of their headers"""
+        # uids is every new UID, so anything else was handled elsewhere and stops aging
+        self.first_seen.retain(uid.decode() for uid in uids)
+        headers = self.email_processor.fetch_priority_headers(uids)
+        queue = self._priority_queue(uids, [headers.get(uid, {}) for uid in uids], [uid.decode() for uid in uids])
+        return [queue.pop() for _ in range(len(queue))]
+    
+    def _priority_order(self, emails: List[Dict]) -> List[Dict]:
+        """Order fetched emails for classification and delivery"""
+        if not self.priority_scorer:
+            return emails
+        queue = self._priority_queue(emails, emails, [email_data['uid'] for email_data in emails])
+        return [queue.pop() for _ in range(len(queue))]
+    
+    def _route_email(self, email_data: Dict) -> Dict:
+        """Decide an email's department, trying cheap lookups before the classifiers"""
+        prefetched = self._prefetched_routes.pop(email_data['uid'], None)
+        if prefetched and prefetched['method'] in ('thread', 'near_duplicate'):
+            return prefetched
+        # Checked again for pooled emails: an earlier email of the same batch may have started the thread
+        route = self._route_from_history(email_data)
+        if route:
+            return route
+        if prefetched:
+            return prefetched
+        
+        # Classify the email (repeat senders with a consistent history skip the classifiers)
+        with self._classifier_lock:
+            return self.classifier.route_email(email_data['cleaned_content'], email_data.get('from_email'))
+    
+    def _route_from_history(self, email_data: Dict) -> Optional[Dict]:
+        """Route an email from its thread or a recent near-duplicate, if either is known"""
+        # Replies follow their thread's department
+        thread = self.thread_index.find_thread(email_data) if self.thread_index else None
+        if thread:
+            email_data['thread_root'] = thread['root']
+            self.logger.info(f"Email {email_data['uid']} continues thread {thread['root']} -> {thread['department']}", extra=HOT_PATH)
+            return {'method': 'thread', 'department': thread['department'], 'thread': thread}
+        
+        # Near-duplicates of a recent email reuse its classification
+        original = self._find_near_duplicate(email_data)
+        if original:
+            email_data['near_duplicate_of'] = original['uid']
+            self.logger.info(f"Email {email_data['uid']} is a near-duplicate of {original['uid']} -> {original['department']}", extra=HOT_PATH)
+            return {'method': 'near_duplicate', 'department': original['department'], 'original': original}
+        return None
+    
+    def _record_routing(self, email_data: Dict, route: Dict):
+        """Add a stored email to the thread and near-duplicate indexes"""
+        department = route['department']
+        if self.sender_prior and route['method'] == 'classifier':
+            with self._classifier_lock:
+                self.sender_prior.record(email_data.get('from_email', ''), department)
+        if self.thread_index:
+            message_ids = parse_message_ids(email_data.get('message_id', ''))
+            if message_ids:
+                thread = route.get('thread')
+                self.thread_index.add(message_ids[0], department, thread['root'] if thread else None)
+        
+        if self.near_duplicates and route['method'] != 'near_duplicate' and email_data.get('fingerprint'):
+            self.near_duplicates.add(
+                int(email_data['fingerprint'], 16), email_data['uid'], department, email_data['from_email']
+            )
+    
     def process_single_email(self, email_data: Dict) -> bool:
         """Process a single email through the entire pipeline"""
         try:
-            # Check if email already exists in database
-            if self.db_manager.email_exists(email_data):
-                self.logger.info(f"Email from {email_data['from_email']} already processed, skipping")
+            # Check if email already exists in database (or is on its way there)
+            if self.db_manager.email_exists(email_data) or (self.db_writer and self._write_pending(email_data)):
+                self.logger.info(f"Email from {email_data['from_email']} already processed, skipping", extra=HOT_PATH)
+                # The stored copy may come from another mailbox; without a record of this UID it is fetched every cycle
+                self.db_manager.record_skipped_uid(email_data)
+                self.first_seen.forget(email_data['uid'])
                 return False
             
-            # Classify the email
-            department = self.classifier.classify_email(email_data['cleaned_content'])
+            route = self._route_email(email_data)
+            department = route['department']
             email_data['department'] = department
+            email_data['routed_by'] = route['method']
+            actions = self._planned_actions(email_data, route)
+            
+            # Journal the routed email first so a crash from here on is resumed on startup
+            journal_key = (email_data['account'], email_data['folder'], email_data['uid'])
+            if self.journal:
+                self.journal.record_classified(*journal_key, self._journal_document(email_data), actions)
             
             # Insert into database
-            if not self.db_manager.insert_email(email_data):
-                self.logger.error(f"Failed to insert email into database")
+            if self.db_writer:
+                self._submit_write(email_data)
+            elif self.db_manager.insert_email(email_data):
+                if self.journal:
+                    self.journal.mark(*journal_key, 'persisted')
+            else:
+                self.logger.error("Failed to insert email into database")
+                if self.journal:
+                    # Nothing was sent yet; the next check fetches it again
+                    self.journal.discard(*journal_key)
                 return False
             
+            self._record_routing(email_data, route)
+            
+            if route['method'] == 'near_duplicate':
+                self.stats['near_duplicates'] += 1
+            elif route['method'] == 'thread':
+                self.stats['thread_routed'] += 1
+            done = self._send_actions(email_data, actions, self.first_seen.get(email_data['uid']))
+            if self.journal:
+                for action in done:
+                    self.journal.mark(*journal_key, PipelineJournal.ACTION_STEPS[action])
+            self.first_seen.forget(email_data['uid'])
+            
+            self.logger.info(f"Successfully processed email from {email_data['from_email']} -> {department}", extra=HOT_PATH)
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error processing email: {e}")
+            return False
+    
+    @staticmethod
+    def _journal_document(email_data: Dict) -> Dict:
+        """The fields needed to store and send an email again after a restart"""
+        return {key: email_data[key] for key in email_data.keys() if key not in ('_id', 'processed_at')}
+    
+    def _planned_actions(self, email_data: Dict, route: Dict) -> List[str]:
+        """Decide which of 'reply' and 'forward' a routed email needs"""
+        if route['method'] == 'near_duplicate':
+            # Only a sender's own repeats collapse into the original forward; similar emails from
+            # other senders (e.g. two customers asking about different orders) are still forwarded,
+            # tagged with near_duplicate_of
+            if route['original']['from_email'].lower() == email_data['from_email'].lower():
+                return []
+            return ['reply', 'forward']
+        if route['method'] == 'thread':
+            # The sender was already acknowledged when the thread started
+            return ['forward']
+        return ['reply', 'forward']
+    
+    def _send_actions(self, email_data: Dict, actions: List[str], first_seen_at: Optional[float] = None) -> List[str]:
+        """Send the auto-reply and/or forward of an email, returning the actions that succeeded
+        
+        Forwards count towards time-to-forward only when first_seen_at is known (not for
+        backfilled or resumed emails).
+        """
+        done = []
+        department = email_data['department']
+        if 'reply' in actions:
+            if self.reply_suppressor and not self.reply_suppressor.should_send(email_data['from_email']):
+                # Already acknowledged within the suppression window; nothing left to send
+                self.stats['suppressed_replies'] += 1
+                self.logger.info(f"Auto-reply to {email_data['from_email']} suppressed", extra=HOT_PATH)
+                done.append('reply')
             # Send auto-reply to sender
-            if not self.responder.send_auto_reply(email_data['from_email'], department):
+            elif self.responder.send_auto_reply(email_data['from_email'], department):
+                done.append('reply')
+            else:
                 self.logger.warning(f"Failed to send auto-reply to {email_data['from_email']}")
-            
+                if self.reply_suppressor:
+                    self.reply_suppressor.release(email_data['from_email'])
+        
+        if 'forward' in actions:
             # Forward email to appropriate department
-            if not self.responder.forward_email(
+            if self.responder.forward_email(
                 email_data['from_email'], 
                 department, 
                 email_data['cleaned_content'],
                 email_data.get('subject', ''),
-                email_data.get('date', '')
+                email_data.get('date', ''),
+                first_seen_at
             ):
+                done.append('forward')
+            else:
                 self.logger.warning(f"Failed to forward email to {department} department")
+        return done
+    
+    def run_backfill(self, criteria: str, job_id: Optional[str] = None) -> bool:
+        """Import a historical UID or date range in large batches, resuming from the last checkpoint
+        
+        Routing uses the thread, near-duplicate and sender-prior fast paths before one
+        bulk classification per batch, and emails are stored with a single bulk write.
+        Replies and forwards follow BACKFILL_REPLY_POLICY / BACKFILL_FORWARD_POLICY.
+        """
+        account = self.email_processor.username
+        folder = self.email_processor.folder
+        job_id = job_id or f"{account}/{folder}/{criteria}"
+        policies = {'reply': Config.BACKFILL_REPLY_POLICY, 'forward': Config.BACKFILL_FORWARD_POLICY}
+        self.logger.info(f"Starting backfill {job_id} (replies: {policies['reply']}, forwards: {policies['forward']})")
+        
+        try:
+            if not self.db_manager.connect():
+                self.logger.error("Failed to connect to database")
+                return False
+            self._start_services()
+            if not self.email_processor.connect_to_email():
+                self.logger.error("Failed to connect to email server")
+                return False
             
-            self.logger.info(f"Successfully processed email from {email_data['from_email']} -> {department}")
+            checkpoint = self.db_manager.get_backfill_checkpoint(job_id) or {}
+            if checkpoint.get('status') == 'completed':
+                self.logger.info(f"Backfill {job_id} already completed ({checkpoint.get('processed', 0)} emails)")
+                return True
+            counters = {key: checkpoint.get(key, 0) for key in ('fetched', 'processed', 'skipped')}
+            
+            uids = self.email_processor.search_uids(criteria)
+            if checkpoint.get('last_uid'):
+                # Resume exactly after the last batch that was written
+                uids = [uid for uid in uids if int(uid) > int(checkpoint['last_uid'])]
+                self.logger.info(f"Resuming backfill after UID {checkpoint['last_uid']}")
+            processed_uids = set(self.db_manager.get_processed_uids(account, folder))
+            last_uid = checkpoint.get('last_uid')
+            
+            started_at = time.time()
+            done = 0
+            batch_size = max(1, Config.BACKFILL_BATCH_SIZE)
+            for start in range(0, len(uids), batch_size):
+                if not self.running:
+                    self.logger.info(f"Backfill {job_id} stopped; it will resume from its checkpoint")
+                    return True
+                
+                batch = uids[start:start + batch_size]
+                new_uids = [uid for uid in batch if uid.decode() not in processed_uids]
+                counters['skipped'] += len(batch) - len(new_uids)
+                emails = self.email_processor.fetch_uids(new_uids)
+                counters['fetched'] += len(emails)
+                stored_count, stored = self._backfill_batch(emails, policies)
+                counters['processed'] += stored_count
+                self.responder.flush_digests()
+                
+                # The checkpoint only moves past UIDs that are in the database; a UID that could not be
+                # fetched or written ends the job there, so a rerun retries it instead of skipping it
+                for uid in batch:
+                    if uid.decode() not in processed_uids and uid.decode() not in stored:
+                        self.db_manager.save_backfill_checkpoint(job_id, last_uid, counters)
+                        self.logger.error(f"Backfill {job_id} stopped at UID {uid.decode()}, which could not be fetched or stored; run it again to resume")
+                        return False
+                    last_uid = uid.decode()
+                self.db_manager.save_backfill_checkpoint(job_id, last_uid, counters)
+                done += len(batch)
+                elapsed = time.time() - started_at
+                rate = done / elapsed if elapsed > 0 else 0.0
+                eta = (len(uids) - done) / rate if rate > 0 else 0.0
+                self.logger.info(
+                    f"Backfill {job_id}: {done}/{len(uids)} UIDs, {counters['processed']} stored, "
+                    f"{rate:.1f} emails/s, ETA {timedelta(seconds=int(eta))}"
+                )
+            
+            self.db_manager.save_backfill_checkpoint(
+                job_id, last_uid, counters, status='completed'
+            )
+            self.logger.info(f"Backfill {job_id} completed: {counters}")
+            self.display_statistics()
             return True
             
         except Exception as e:
-            self.logger.error(f"Error processing email: {e}")
+            self.logger.error(f"Error during backfill: {e}")
             return False
+        finally:
+            self.cleanup()
+    
+    def _backfill_batch(self, emails: List[Dict], policies: Dict[str, str]) -> Tuple[int, Set[str]]:
+        """Route and store one backfill batch, returning the number of emails stored and the
+        UIDs of the batch that are now in the database (stored or already present)"""
+        if not emails:
+            return 0, set()
+        
+        routes = [self._route_from_history(email_data) for email_data in emails]
+        pending = [index for index, route in enumerate(routes) if route is None]
+        if pending:
+            classified = self._route_batch([emails[index] for index in pending])
+            for index, route in zip(pending, classified):
+                routes[index] = route
+        
+        actions = {}
+        for email_data, route in zip(emails, routes):
+            email_data['department'] = route['department']
+            email_data['routed_by'] = route['method']
+            planned = self._planned_actions(email_data, route)
+            deferred = [action for action in planned if policies[action] == 'defer']
+            if deferred:
+                email_data['deferred_actions'] = deferred
+            actions[email_data['uid']] = [action for action in planned if policies[action] == 'send']
+        
+        inserted = self.db_manager.insert_emails(emails)
+        routes_by_uid = {email_data['uid']: route for email_data, route in zip(emails, routes)}
+        for email_data in inserted:
+            self._record_routing(email_data, routes_by_uid[email_data['uid']])
+            if actions[email_data['uid']]:
+                self._send_actions(email_data, actions[email_data['uid']])
+        
+        stored = {email_data['uid'] for email_data in inserted}
+        for email_data in emails:
+            # Rejected as a duplicate means the message is stored already (possibly from another mailbox)
+            if email_data['uid'] not in stored and self.db_manager.email_exists(email_data):
+                self.db_manager.record_skipped_uid(email_data)
+                stored.add(email_data['uid'])
+        
+        self.stats['fetched'] += len(emails)
+        self.stats['processed'] += len(inserted)
+        return len(inserted), stored
+    
+    def deliver_deferred(self) -> bool:
+        """Send the replies and forwards that a backfill deferred"""
+        try:
+            if not self.db_manager.connect():
+                self.logger.error("Failed to connect to database")
+                return False
+            
+            delivered = 0
+            for email_data in self.db_manager.get_deferred_emails():
+                for action in self._send_actions(email_data, email_data['deferred_actions']):
+                    self.db_manager.complete_deferred_action(email_data['_id'], action)
+                    delivered += 1
+                if not self.running:
+                    break
+            self.responder.flush_digests()
+            self.logger.info(f"Delivered {delivered} deferred replies and forwards")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error delivering deferred actions: {e}")
+            return False
+        finally:
+            self.cleanup()
     
     def display_statistics(self):
         """Display processing statistics"""
@@ -219,6 +968,30 @@ class EmailSegregationSystem:
             self.logger.info(f"Order department: {stats.get('order_emails', 0)}")
             self.logger.info(f"Payment department: {stats.get('payment_emails', 0)}")
             self.logger.info(f"General department: {stats.get('general_emails', 0)}")
+            self.logger.info(f"Archived: {stats.get('archived_emails', 0)}")
+            if self.reply_suppressor:
+                self.logger.info(f"Auto-replies suppressed: {self.stats['suppressed_replies']}")
+            latency = self.forward_latency.summary()
+            if latency:
+                high = [d for d in Config.HIGH_PRIORITY_DEPARTMENTS if d in latency]
+                other = [d for d in latency if d not in Config.HIGH_PRIORITY_DEPARTMENTS]
+                for label, departments in (('high-priority', high), ('other', other)):
+                    if departments:
+                        self.logger.info(f"Time to forward p99 ({label}): " + ', '.join(
+                            f"{d} {latency[d]['p99']:.0f}s (n={latency[d]['count']})" for d in departments
+                        ))
+            if self.classifier_pool:
+                pool = self.classifier_pool.stats
+                self.logger.info(
+                    f"Classifier pool: {pool['texts']} emails in {pool['batches']} batches, "
+                    f"{pool['restarts']} worker restarts, {pool['fallbacks']} batches classified in-process"
+                )
+            if self.sender_prior:
+                prior = self.classifier.get_prior_stats()
+                self.logger.info(
+                    f"Sender prior: {prior['hits']}/{prior['lookups']} fast-path hits ({prior['hit_rate']:.1%}), "
+                    f"{prior['disagreements']}/{prior['audits']} audited disagreements ({prior['disagreement_rate']:.1%})"
+                )
             self.logger.info("===================================")
         except Exception as e:
             self.logger.error(f"Error displaying statistics: {e}")
@@ -226,26 +999,253 @@ class EmailSegregationSystem:
     def cleanup(self):
         """Clean up resources"""
         try:
+            if self.classifier_pool:
+                self.classifier_pool.stop()
+            if self.db_writer:
+                # Store whatever is still queued before the connection goes away
+                self.db_writer.stop()
+            if self.journal:
+                self.journal.close()
             self.email_processor.disconnect_from_email()
             self.db_manager.disconnect()
             self.logger.info("Cleanup completed")
         except Exception as e:
             self.logger.error(f"Error during cleanup: {e}")
 
+def run_mailbox_worker(mailbox: Dict, check_interval: int, status_queue, log_queue):
+    """Entry point of a supervisor worker process handling a single account/folder"""
+    # Records go to the supervisor, which owns the log file and its rotation
+    setup_worker_logging(log_queue)
+    key = MailboxSupervisor.mailbox_key(mailbox)
+    system = EmailSegregationSystem(mailbox=mailbox)
+    system.check_interval = check_interval
+    
+    def report(stats: Dict):
+        status_queue.put({'key': key, 'pid': os.getpid(), 'state': 'running', **stats})
+    
+    system.cycle_callback = report
+    sys.exit(0 if system.run_continuous() else 1)
+
+def run_supervisor(accounts_file: str, check_interval: int) -> bool:
+    """Run one worker process per configured account/folder"""
+    logger = logging.getLogger(__name__)
+    try:
+        Config.validate_config()
+        mailboxes = Config.load_mailboxes(accounts_file)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Failed to load supervisor configuration: {e}")
+        return False
+    
+    # The supervisor only reads stats; each worker opens its own connections
+    db_manager = DatabaseManager()
+    if not db_manager.connect():
+        db_manager = None
+    
+    supervisor = MailboxSupervisor(mailboxes, run_mailbox_worker, check_interval, db_manager)
+    
+    def stop_supervisor(signum, frame):
+        logger.info(f"Received signal {signum}, stopping all workers...")
+        supervisor.running = False
+    
+    signal.signal(signal.SIGINT, stop_supervisor)
+    signal.signal(signal.SIGTERM, stop_supervisor)
+    
+    try:
+        return supervisor.run()
+    finally:
+        if db_manager:
+            db_manager.disconnect()
+
+def backfill_criteria(args) -> str:
+    """Build the IMAP search criteria of a backfill from --uid-range or --since/--until"""
+    if args.uid_range:
+        return f"UID {args.uid_range}"
+    
+    criteria = []
+    if args.since:
+        criteria.append(f"SINCE {datetime.fromisoformat(args.since).strftime('%d-%b-%Y')}")
+    if args.until:
+        criteria.append(f"BEFORE {datetime.fromisoformat(args.until).strftime('%d-%b-%Y')}")
+    return ' '.join(criteria) or 'ALL'
+
+def run_export(args) -> bool:
+    """Stream processed emails from the database to a file"""
+    logger = logging.getLogger(__name__)
+    try:
+        since = datetime.fromisoformat(args.since) if args.since else None
+        until = datetime.fromisoformat(args.until) if args.until else None
+    except ValueError as e:
+        logger.error(f"Invalid date range: {e}")
+        return False
+    
+    db_manager = DatabaseManager()
+    if not db_manager.connect():
+        logger.error("Failed to connect to database")
+        return False
+    
+    try:
+        exporter = EmailExporter(db_manager)
+        fields = [field.strip() for field in args.fields.split(',')] if args.fields else None
+        output = args.output or f"emails_export.{args.format}"
+        exporter.export(output, args.format, fields, args.department, since, until)
+        return True
+    except (OSError, ValueError, PyMongoError) as e:
+        logger.error(f"Export failed: {e}")
+        return False
+    finally:
+        db_manager.disconnect()
+
+def run_archive(args) -> bool:
+    """Move old emails from the hot collection to the archive"""
+    logger = logging.getLogger(__name__)
+    db_manager = DatabaseManager()
+    if not db_manager.connect():
+        logger.error("Failed to connect to database")
+        return False
+    
+    try:
+        db_manager.archive_emails(args.archive_days)
+        return True
+    finally:
+        db_manager.disconnect()
+
+def run_evaluate(args) -> bool:
+    """Compare the accuracy, latency and memory of every classifier on a labeled corpus"""
+    logger = logging.getLogger(__name__)
+    if not args.corpus:
+        logger.error("Evaluation needs --corpus (a CSV/JSONL file or 'mongo')")
+        return False
+    
+    db_manager = None
+    try:
+        if args.corpus == 'mongo':
+            db_manager = DatabaseManager()
+            if not db_manager.connect():
+                logger.error("Failed to connect to database")
+                return False
+            corpus = ClassifierEvaluator.load_corpus_mongo(db_manager, args.label_field or 'corrected_department')
+        else:
+            corpus = ClassifierEvaluator.load_corpus_file(args.corpus, label_field=args.label_field or 'label')
+    except (OSError, ValueError, KeyError, PyMongoError) as e:
+        logger.error(f"Could not load corpus: {e}")
+        return False
+    finally:
+        if db_manager:
+            db_manager.disconnect()
+    
+    if not corpus:
+        logger.error("The corpus has no labeled emails")
+        return False
+    
+    evaluator = ClassifierEvaluator(UnifiedClassifier(preferred_method='openai'))
+    methods = [method.strip() for method in args.methods.split(',')] if args.methods else None
+    report = evaluator.evaluate(corpus, methods)
+    
+    print(f"=== Classifier Evaluation ({len(corpus)} emails) ===")
+    for line in ClassifierEvaluator.format_report(report):
+        print(line)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'emails': len(corpus), 'methods': report}, f, indent=2)
+        print(f"Report written to {args.output}")
+    return True
+
+def run_explain() -> bool:
+    """Print which index serves each built-in database query"""
+    logger = logging.getLogger(__name__)
+    db_manager = DatabaseManager()
+    if not db_manager.connect():
+        logger.error("Failed to connect to database")
+        return False
+    
+    try:
+        report = db_manager.explain_queries()
+        print("=== Query Index Report ===")
+        for name, plan in report.items():
+            state = 'COVERED' if plan['covered'] else 'INDEXED' if plan['indexed'] else 'NOT INDEXED'
+            print(f"{name}: {state} ({', '.join(plan['indexes']) or ' > '.join(reversed(plan['stages']))})")
+        print("==========================")
+        return all(plan['indexed'] for plan in report.values())
+    finally:
+        db_manager.disconnect()
+
 def main():
     """Main entry point"""
     import argparse
     
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Email Segregation System')
-    parser.add_argument('--mode', choices=['continuous', 'once'], default='continuous',
-                       help='Run mode: continuous (default) or once')
+    parser.add_argument('--mode', choices=['continuous', 'once', 'supervisor', 'export', 'archive', 'explain',
+                                           'backfill', 'deliver-deferred', 'daemon', 'evaluate', 'api'],
+                       default='continuous',
+                       help='Run mode: continuous (default), once, supervisor (one worker per account/folder), '
+                            'export (write processed emails to a file), archive (move old emails to the archive), '
+                            'explain (report the index used by each database query), backfill (import a historical '
+                            'UID or date range), deliver-deferred (send replies and forwards deferred by a backfill) '
+                            'daemon (stay resident and serve email_client.py requests), '
+                            'evaluate (compare classifiers on a labeled corpus) '
+                            'or api (serve classification over local HTTP)')
     parser.add_argument('--interval', type=int, default=60,
                        help='Check interval in seconds for continuous mode (default: 60)')
     
+    parser.add_argument('--accounts', default=None,
+                       help='Accounts JSON file for supervisor mode (default: EMAIL_ACCOUNTS_FILE)')
+    
+    parser.add_argument('--format', choices=EmailExporter.FORMATS, default='csv',
+                       help='Export format (default: csv)')
+    parser.add_argument('--output', default=None,
+                       help="Export file path, '-' for stdout (default: emails_export.<format>); "
+                            "in evaluate mode, where to write the JSON report")
+    parser.add_argument('--department', default=None,
+                       help='Only export emails of this department')
+    parser.add_argument('--since', default=None,
+                       help='Only export emails processed (or backfill emails received) at or after this date '
+                            '(YYYY-MM-DD or ISO format)')
+    parser.add_argument('--until', default=None,
+                       help='Only export emails processed (or backfill emails received) before this date '
+                            '(YYYY-MM-DD or ISO format)')
+    parser.add_argument('--fields', default=None,
+                       help=f"Comma-separated fields to export (default: {','.join(EmailExporter.DEFAULT_FIELDS)})")
+    parser.add_argument('--archive-days', type=int, default=None,
+                       help='Archive emails processed more than this many days ago (default: ARCHIVE_AFTER_DAYS)')
+    parser.add_argument('--corpus', default=None,
+                       help="Labeled corpus to evaluate on: a CSV/JSONL file with text and label columns, "
+                            "or 'mongo' for stored emails with a human-assigned label")
+    parser.add_argument('--label-field', default=None,
+                       help="Label column of the corpus (default: 'label' in files, 'corrected_department' in MongoDB)")
+    parser.add_argument('--methods', default=None,
+                       help='Comma-separated classifiers to evaluate (default: all available)')
+    parser.add_argument('--uid-range', default=None,
+                       help="UID range to backfill, e.g. '1:50000' or '40000:*' (default: --since/--until, else all)")
+    
     args = parser.parse_args()
     
+    # Configure logging (records are written by a background listener thread); an export
+    # to stdout keeps the console log on stderr so it does not end up in the data
+    setup_logging(stream=sys.stderr if args.mode == 'export' and args.output == '-' else None)
+    
+    schedule = (f"every {Config.POLL_MIN_INTERVAL:g}-{Config.POLL_MAX_INTERVAL:g} seconds depending on traffic"
+                if Config.ADAPTIVE_POLLING else f"every {args.interval} seconds")
+    
     try:
+        if args.mode == 'export':
+            return 0 if run_export(args) else 1
+        if args.mode == 'archive':
+            return 0 if run_archive(args) else 1
+        if args.mode == 'explain':
+            return 0 if run_explain() else 1
+        if args.mode == 'evaluate':
+            return 0 if run_evaluate(args) else 1
+        
+        if args.mode == 'supervisor':
+            print(f"Starting Email Segregation System in SUPERVISOR mode (checking {schedule})")
+            print("Press Ctrl+C to stop all workers gracefully")
+            if run_supervisor(args.accounts, args.interval):
+                print("Email segregation supervisor stopped successfully!")
+                return 0
+            print("Email segregation supervisor failed!")
+            return 1
+        
         # Create the system
         system = EmailSegregationSystem()
         
@@ -255,9 +1255,24 @@ def main():
             
         # Run in the specified mode
         if args.mode == 'continuous':
-            print(f"Starting Email Segregation System in CONTINUOUS mode (checking every {args.interval} seconds)")
+            print(f"Starting Email Segregation System in CONTINUOUS mode (checking {schedule})")
             print("Press Ctrl+C to stop the system gracefully")
             success = system.run_continuous()
+        elif args.mode == 'backfill':
+            criteria = backfill_criteria(args)
+            print(f"Starting Email Segregation System in BACKFILL mode ({criteria})")
+            print("Press Ctrl+C to stop; the next run resumes from the last checkpoint")
+            success = system.run_backfill(criteria)
+        elif args.mode == 'daemon':
+            print("Starting Email Segregation System in DAEMON mode")
+            print("Trigger cycles with 'python email_client.py run'; press Ctrl+C to stop")
+            success = system.run_daemon()
+        elif args.mode == 'api':
+            print(f"Starting classification API on http://{Config.API_HOST}:{Config.API_PORT}; press Ctrl+C to stop")
+            success = system.run_api()
+        elif args.mode == 'deliver-deferred':
+            print("Delivering replies and forwards deferred by backfills")
+            success = system.deliver_deferred()
         else:
             print("Starting Email Segregation System in SINGLE-RUN mode")
             success = system.run_once()
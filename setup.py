@@ -48,6 +48,7 @@ setup(
         "dev": [
             "pytest>=7.0.0",
             "pytest-cov>=4.0.0",
+            "mongomock>=4.1.0",
             "black>=23.0.0",
             "flake8>=6.0.0",
             "isort>=5.12.0",
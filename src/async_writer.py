@@ -0,0 +1,116 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+class AsyncEmailWriter:
+    """Stores emails in MongoDB from a background thread, in batches
+
+    Emails are queued by the pipeline (which has already journaled them) and
+    written with one bulk insert per batch_size emails or flush_interval seconds.
+    After each batch, on_persisted is called with the emails the database now
+    holds, including ones another instance stored first. Emails that could not
+    be stored are written again with later batches, every retry_delay seconds,
+    up to max_retries times (and once more on stop); on_failed (if given) is
+    then called with the ones that still failed. Both run on the writer thread.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db_manager, on_persisted: Callable[[List[Dict]], None], batch_size: int = 100,
+                 flush_interval: float = 2.0, on_failed: Optional[Callable[[List[Dict]], None]] = None,
+                 max_retries: int = 3, retry_delay: float = 5.0):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.on_persisted = on_persisted
+        self.on_failed = on_failed
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_retries = max(0, max_retries)
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        # Writer thread only: emails waiting to be written again, and their failed attempts so far
+        self._retries: List[Tuple[float, Dict]] = []
+        self._attempts: Dict[int, int] = {}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='async-email-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, email_data):
+        self._queue.put(email_data)
+
+    def stop(self):
+        """Write everything still queued and stop the thread"""
+        if self._thread:
+            self._queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            batch = self._due_retries()
+            deadline = time.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                self._write(batch)
+            if stopping:
+                # One last attempt for the emails still waiting to be retried
+                final = [email_data for _, email_data in self._retries]
+                self._retries = []
+                for email_data in final:
+                    self._attempts[id(email_data)] = self.max_retries
+                if final:
+                    self._write(final)
+                return
+
+    def _due_retries(self) -> List[Dict]:
+        now = time.time()
+        due = [email_data for due_at, email_data in self._retries if due_at <= now]
+        self._retries = [retry for retry in self._retries if retry[0] > now]
+        return due
+
+    def _write(self, batch: List):
+        persisted, failed = [], []
+        try:
+            inserted = {id(email_data) for email_data in self.db_manager.insert_emails(batch)}
+            for email_data in batch:
+                # Rejected as a duplicate means the database already has it
+                if id(email_data) in inserted or self.db_manager.email_exists(email_data):
+                    persisted.append(email_data)
+                else:
+                    failed.append(email_data)
+        except Exception as e:
+            self.logger.error(f"Error writing batch of {len(batch)} emails: {e}")
+            persisted, failed = [], batch
+        
+        for email_data in persisted:
+            self._attempts.pop(id(email_data), None)
+        given_up = []
+        for email_data in failed:
+            attempt = self._attempts.get(id(email_data), 0) + 1
+            if attempt <= self.max_retries:
+                self._attempts[id(email_data)] = attempt
+                self._retries.append((time.time() + self.retry_delay, email_data))
+            else:
+                self._attempts.pop(id(email_data), None)
+                self.logger.error(f"Email {email_data.get('uid')} was not stored after {attempt} attempts; it stays in the journal")
+                given_up.append(email_data)
+        failed = given_up
+        for callback, emails in ((self.on_persisted, persisted), (self.on_failed, failed)):
+            if callback and emails:
+                try:
+                    callback(emails)
+                except Exception as e:
+                    self.logger.error(f"Error in write callback: {e}")
@@ -0,0 +1,328 @@
+import bisect
+import json
+import logging
+import math
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+class LatencyHistogram:
+    """Response times per key in fixed logarithmic buckets, safe to record from any thread
+
+    Buckets grow by a factor of 2 ** (1 / buckets_per_doubling) from min_seconds
+    to max_seconds (longer times land in the last bucket), so memory stays
+    constant however many requests are served. Percentiles are reported as the
+    upper bound of the bucket they fall in.
+    """
+
+    def __init__(self, min_seconds: float = 0.001, max_seconds: float = 120.0, buckets_per_doubling: int = 4):
+        self.bounds = [min_seconds]
+        while self.bounds[-1] < max_seconds:
+            self.bounds.append(self.bounds[-1] * 2 ** (1 / buckets_per_doubling))
+        self._counts: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        index = min(bisect.bisect_left(self.bounds, seconds), len(self.bounds) - 1)
+        with self._lock:
+            self._counts.setdefault(key, [0] * len(self.bounds))[index] += 1
+
+    def _percentile(self, counts: List[int], fraction: float) -> float:
+        target = max(1, math.ceil(fraction * sum(counts)))
+        seen = 0
+        for bound, count in zip(self.bounds, counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return self.bounds[-1]
+
+    def summary(self) -> Dict[str, Dict]:
+        """Sample count and p50/p99 seconds per key"""
+        with self._lock:
+            counts = {key: list(key_counts) for key, key_counts in self._counts.items()}
+        return {
+            key: {
+                'count': sum(key_counts),
+                'p50': round(self._percentile(key_counts, 0.50), 6),
+                'p99': round(self._percentile(key_counts, 0.99), 6)
+            }
+            for key, key_counts in counts.items()
+        }
+
+class _Pending:
+    """One request waiting in a MicroBatcher"""
+
+    __slots__ = ('item', 'enqueued_at', 'started_at', 'finished_at', 'batch_size', 'result', 'error', 'done',
+                 'cancelled')
+
+    def __init__(self, item):
+        self.item = item
+        self.enqueued_at = time.time()
+        self.started_at = self.finished_at = None
+        self.batch_size = 0
+        self.result = self.error = None
+        self.done = threading.Event()
+        self.cancelled = False
+
+    def cancel(self):
+        """The caller stopped waiting; drop the item if its batch has not started"""
+        self.cancelled = True
+
+class MicroBatcher:
+    """Coalesces concurrent requests into batches for a single worker thread
+
+    The first queued request opens a window of window_seconds; everything that
+    arrives before it closes (up to max_batch_size) is handled in one call to
+    handler, which takes a list of items and returns one result per item.
+    Submitting to a full queue raises queue.Full so callers can shed load, and
+    items cancelled while queued (their caller timed out) are never handled.
+    """
+
+    _STOP = object()
+
+    def __init__(self, handler: Callable[[List], List], max_batch_size: int = 32, window_seconds: float = 0.01,
+                 queue_limit: int = 1000, name: str = 'micro-batcher', lock: threading.Lock = None):
+        self.logger = logging.getLogger(__name__)
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.window_seconds = window_seconds
+        self.name = name
+        self.lock = lock or threading.Lock()  # Shared by batchers that call the same classifier
+        self._queue = queue.Queue(maxsize=queue_limit)
+        self._thread = None
+        # Updated by request threads (rejected) and the worker; read through get_stats()
+        self.stats = {'requests': 0, 'batches': 0, 'rejected': 0, 'abandoned': 0, 'errors': 0}
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Handle what is already queued, then stop the worker"""
+        if self._thread:
+            self._queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, item) -> _Pending:
+        pending = _Pending(item)
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            self._count(rejected=1)
+            raise
+        return pending
+
+    def _count(self, **increments: int):
+        with self._stats_lock:
+            for name, increment in increments.items():
+                self.stats[name] += increment
+
+    def get_stats(self) -> Dict[str, int]:
+        """A consistent copy of the counters"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is self._STOP:
+                return
+            batch, stopping = [first], False
+            deadline = time.time() + self.window_seconds
+            while len(batch) < self.max_batch_size:
+                try:
+                    pending = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if pending is self._STOP:
+                    stopping = True
+                    break
+                batch.append(pending)
+            self._handle(batch)
+            if stopping:
+                return
+
+    def _handle(self, batch: List[_Pending]):
+        live = [pending for pending in batch if not pending.cancelled]
+        if len(live) < len(batch):
+            self._count(abandoned=len(batch) - len(live))
+        batch = live
+        if not batch:
+            return
+        started_at = time.time()
+        try:
+            with self.lock:
+                results = self.handler([pending.item for pending in batch])
+            error = None
+        except Exception as e:
+            self.logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+            results, error = [None] * len(batch), str(e)
+        finished_at = time.time()
+
+        self._count(requests=len(batch), batches=1, errors=1 if error else 0)
+        for pending, result in zip(batch, results):
+            pending.started_at, pending.finished_at = started_at, finished_at
+            pending.batch_size = len(batch)
+            pending.result, pending.error = result, error
+            pending.done.set()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+class _ApiRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints: POST /classify, POST /classify_details, GET /metrics, GET /health"""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so busy clients do not reconnect for every request
+
+    def log_message(self, format, *args):
+        # Access logs would dominate at hundreds of requests per second
+        pass
+
+    def _send_json(self, status: int, body: Dict, headers: Dict[str, str] = None):
+        payload = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        api = self.server.api
+        if self.path == '/health':
+            self._send_json(200, {'ok': True})
+        elif self.path == '/metrics':
+            self._send_json(200, api.metrics())
+        else:
+            self._send_json(404, {'error': f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self):
+        api = self.server.api
+        received_at = time.time()
+        batcher = api.batchers.get(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        if batcher is None:
+            self.rfile.read(length)
+            self._send_json(404, {'error': f"Unknown endpoint: {self.path}"})
+            return
+        if length > api.max_request_bytes:
+            self.close_connection = True
+            self._send_json(413, {'error': f"Request body exceeds {api.max_request_bytes} bytes"})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+            content = request['content']
+            if not isinstance(content, str):
+                raise ValueError("'content' must be a string")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': f"Expected a JSON object with a 'content' string: {e}"})
+            return
+
+        try:
+            pending = batcher.submit((content, request.get('from_email')))
+        except queue.Full:
+            self._send_json(503, {'error': 'Classification queue is full, retry later'}, {'Retry-After': '1'})
+            return
+        if not pending.done.wait(api.request_timeout):
+            pending.cancel()
+            self._send_json(504, {'error': 'Classification timed out'})
+            return
+
+        finished_at = time.time()
+        api.latency.record(self.path, finished_at - received_at)
+        headers = {
+            'X-Queue-Time-Ms': f"{(pending.started_at - pending.enqueued_at) * 1000:.1f}",
+            'X-Classify-Time-Ms': f"{(pending.finished_at - pending.started_at) * 1000:.1f}",
+            'X-Response-Time-Ms': f"{(finished_at - received_at) * 1000:.1f}",
+            'X-Batch-Size': str(pending.batch_size)
+        }
+        if pending.error:
+            self._send_json(500, {'error': pending.error}, headers)
+        else:
+            self._send_json(200, pending.result, headers)
+
+class _ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Absorb connection bursts instead of refusing them
+
+class ClassificationApi:
+    """Local HTTP service in front of a UnifiedClassifier
+
+    /classify routes through classifier.route_batch, so requests share the
+    sender prior cache and classifier pool of the process that owns the
+    classifier; /classify_details runs every available classifier. Both go
+    through micro-batchers that take turns on the classifier. metrics returns
+    the owner's counters, which /metrics reports next to the API's own.
+
+    Batching only adds throughput when the classifier has a pool: without one,
+    route_batch classifies a batch one email at a time, so requests are served
+    at the rate of sequential single-email classification.
+    """
+
+    def __init__(self, classifier, host: str = '127.0.0.1', port: int = 8080, max_batch_size: int = 32,
+                 window_seconds: float = 0.01, queue_limit: int = 1000, request_timeout: float = 30,
+                 max_request_bytes: int = 1024 * 1024, metrics: Optional[Callable[[], Dict]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.classifier = classifier
+        self.address = (host, port)
+        self.request_timeout = request_timeout
+        self.max_request_bytes = max_request_bytes
+        self.owner_metrics = metrics
+        self.latency = LatencyHistogram()  # Response times per endpoint
+        lock = threading.Lock()
+        self.batchers = {
+            '/classify': MicroBatcher(self._classify, max_batch_size, window_seconds, queue_limit,
+                                      'api-classify', lock),
+            # Details run every classifier per email, so they gain nothing from larger batches
+            '/classify_details': MicroBatcher(self._classify_details, 1, 0, queue_limit,
+                                              'api-classify-details', lock)
+        }
+        self.server = None
+        self._thread = None
+
+    def _classify(self, items: List) -> List[Dict]:
+        contents = [content for content, _ in items]
+        from_emails = [from_email for _, from_email in items]
+        return self.classifier.route_batch(contents, from_emails)
+
+    def _classify_details(self, items: List) -> List[Dict]:
+        return [{'methods': self.classifier.get_classification_details(content)} for content, _ in items]
+
+    def metrics(self) -> Dict:
+        api = {}
+        for path, batcher in self.batchers.items():
+            stats = batcher.get_stats()
+            stats['queue_depth'] = batcher.queue_depth
+            stats['mean_batch_size'] = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+            api[path] = stats
+        metrics = {'api': api, 'latency_seconds': self.latency.summary()}
+        if self.owner_metrics:
+            metrics.update(self.owner_metrics())
+        return metrics
+
+    def start(self):
+        """Start the batchers and serve HTTP on a background thread"""
+        for batcher in self.batchers.values():
+            batcher.start()
+        self.server = _ApiServer(self.address, _ApiRequestHandler)
+        self.server.api = self
+        self._thread = threading.Thread(target=self.server.serve_forever, name='classification-api', daemon=True)
+        self._thread.start()
+        self.logger.info(f"Classification API listening on http://{self.address[0]}:{self.server.server_port}")
+
+    def stop(self):
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        for batcher in self.batchers.values():
+            batcher.stop()
+        self.logger.info("Classification API stopped")
@@ -0,0 +1,239 @@
+import atexit
+import gc
+import logging
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from typing import List, Optional
+from src.logging_setup import listeners_paused, setup_worker_logging, worker_log_queue
+
+# Set in the parent just before the pool host is forked, so the host and its workers inherit the loaded models
+_POOL_CLASSIFIER = None
+
+def _init_worker(log_queue):
+    """Prepare a forked worker: shutdown is driven by the host, and logs go to the parent's listener"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_worker_logging(log_queue)
+    if 'torch' in sys.modules:
+        # One thread per worker; the pool itself provides the parallelism
+        sys.modules['torch'].set_num_threads(1)
+
+def _classify_batch(texts: List[str]) -> List[str]:
+    return [_POOL_CLASSIFIER._classify_content(text) for text in texts]
+
+def _run_host(conn, parent_conn, workers: int, max_tasks: Optional[int], timeout: float, log_queue):
+    """Body of the pool host process: owns the worker Pool and classifies the batches sent over conn
+
+    Replies with one list of departments per batch, or None for a batch that
+    failed; any failure also replaces the Pool, forking the new workers from here.
+    """
+    # Drop the inherited parent end so recv() sees EOF if the parent dies
+    parent_conn.close()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_worker_logging(log_queue)
+    logger = logging.getLogger(__name__)
+    context = multiprocessing.get_context('fork')
+
+    def new_pool():
+        return context.Pool(workers, initializer=_init_worker, initargs=(log_queue,), maxtasksperchild=max_tasks)
+
+    pool = new_pool()
+    try:
+        while True:
+            try:
+                batches = conn.recv()
+            except EOFError:
+                return
+            if batches is None:
+                return
+
+            pending = [pool.apply_async(_classify_batch, (batch,)) for batch in batches]
+            deadline = time.time() + timeout
+            results, failure = [], None
+            for result in pending:
+                try:
+                    if failure:
+                        raise TimeoutError(failure)
+                    results.append(result.get(timeout=max(0.0, deadline - time.time())))
+                except Exception as e:
+                    failure = failure or str(e) or type(e).__name__
+                    results.append(None)
+            if failure:
+                # A hung or crashed worker may still hold tasks; start over with fresh workers
+                logger.warning(f"Classifier pool batch failed ({failure}); replacing the workers")
+                pool.terminate()
+                pool.join()
+                pool = new_pool()
+            conn.send(results)
+    finally:
+        pool.terminate()
+        pool.join()
+
+class ClassifierPool:
+    """Classifies batches of texts in forked worker processes
+
+    The classifier (with its heavy backends) is loaded once in the parent, and
+    start() forks a pool host from it, which forks the workers, so model weights
+    are shared copy-on-write rather than loaded per worker. Texts are split into
+    batches and results come back in input order.
+
+    The host is forked while the parent has no connections open and its logging
+    threads are paused, and it never opens any itself. Workers are recycled
+    after max_tasks batches, and replaced when one crashes, hangs or misses a
+    health check; the replacements are forked from the host, so they start
+    from the same clean state as the first ones instead of copying the parent's
+    sockets and locks. Failed batches are classified in the parent. After a
+    failure the parent keeps classifying in-process for restart_delay seconds,
+    doubling with each consecutive failure; after max_restarts consecutive
+    failures, or if the host itself stops answering, the pool is shut down for
+    good, since a new host could only be forked from the now-connected parent.
+
+    Requires the 'fork' start method (not available on Windows); is_available()
+    reports whether the pool can be used.
+    """
+
+    def __init__(self, classifier, workers: int = 4, batch_size: int = 16, max_tasks: int = 500,
+                 timeout: float = 120, health_interval: float = 60, max_restarts: int = 5,
+                 restart_delay: float = 30):
+        self.logger = logging.getLogger(__name__)
+        self.classifier = classifier
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+        self.max_tasks = max_tasks or None
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.max_restarts = max_restarts
+        self.restart_delay = restart_delay
+        self.host = None
+        self._conn = None
+        self._lock = threading.Lock()  # One request/reply exchange with the host at a time
+        self._last_health_check = 0.0
+        self._failures = 0  # Consecutive failed exchanges
+        self._retry_at = 0.0
+        self.stats = {'batches': 0, 'texts': 0, 'restarts': 0, 'fallbacks': 0}
+
+    @staticmethod
+    def is_available() -> bool:
+        return 'fork' in multiprocessing.get_all_start_methods()
+
+    @property
+    def active(self) -> bool:
+        """Whether batches currently go to the workers (not shut down or backing off)"""
+        return self.host is not None and time.time() >= self._retry_at
+
+    def start(self):
+        """Fork the pool host from the current (fully loaded, not yet connected) process"""
+        global _POOL_CLASSIFIER
+        _POOL_CLASSIFIER = self.classifier
+        context = multiprocessing.get_context('fork')
+        self._conn, host_conn = context.Pipe()
+        log_queue = worker_log_queue()
+        self.host = context.Process(
+            target=_run_host, args=(host_conn, self._conn, self.workers, self.max_tasks, self.timeout, log_queue),
+            name='classifier-pool-host'
+        )
+        # Move existing objects out of the collector's reach so the host and workers do not dirty shared pages
+        gc.collect()
+        gc.freeze()
+        try:
+            with listeners_paused():
+                self.host.start()
+        finally:
+            gc.unfreeze()
+        host_conn.close()
+        # The host forks its own workers, so it cannot be daemonic; make sure it is told to stop on exit
+        atexit.register(self.stop)
+        self._last_health_check = time.time()
+        self.logger.info(f"Classifier pool started with {self.workers} workers")
+
+    def stop(self):
+        if self.host is None:
+            return
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self.host.join(timeout=5)
+        if self.host.is_alive():
+            self.host.terminate()
+            self.host.join()
+        self._conn.close()
+        self.host = self._conn = None
+
+    def _exchange(self, batches: List[List[str]]) -> Optional[List]:
+        """Send batches to the host and wait for its reply; None if the host did not answer in time"""
+        with self._lock:
+            try:
+                self._conn.send(batches)
+                # The host gives up on its workers after timeout, so allow it time to reply
+                if self._conn.poll(self.timeout + 30):
+                    return self._conn.recv()
+            except (OSError, EOFError) as e:
+                self.logger.error(f"Lost the classifier pool host: {e}")
+        return None
+
+    def _record_outcome(self, failure: Optional[str]):
+        """Reset the backoff after a good exchange, or extend it (and eventually give up) after a failed one"""
+        if not failure:
+            self._failures = 0
+            return
+        self._failures += 1
+        self.stats['restarts'] += 1
+        if self._failures > self.max_restarts:
+            self.logger.error(f"Classifier pool failed {self._failures} times in a row ({failure}); classifying in-process")
+            self.stop()
+            return
+        delay = self.restart_delay * 2 ** (self._failures - 1)
+        self._retry_at = time.time() + delay
+        self.logger.warning(f"Classifier pool workers replaced ({failure}); classifying in-process for {delay:.0f} seconds")
+
+    def _host_lost(self):
+        # Forking a new host now would copy the parent's open sockets and running threads
+        self.logger.error("Classifier pool host stopped answering; classifying in-process from now on")
+        self.host.kill()
+        self.host.join()
+        self._conn.close()
+        self.host = self._conn = None
+
+    def check_health(self) -> bool:
+        """Ping the workers with an empty batch; failures replace them as a failed batch does"""
+        if not self.active:
+            return False
+        reply = self._exchange([[]])
+        if reply is None:
+            self._host_lost()
+            return False
+        self._last_health_check = time.time()
+        self._record_outcome(None if reply[0] is not None else 'health check failed')
+        return reply[0] is not None
+
+    def classify(self, texts: List[str]) -> List[str]:
+        """Classify texts in the workers, returning departments in input order"""
+        if not texts:
+            return []
+        if self.active and time.time() - self._last_health_check > self.health_interval:
+            self.check_health()
+        if not self.active:
+            self.stats['fallbacks'] += 1
+            return [self.classifier._classify_content(text) for text in texts]
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        reply = self._exchange(batches)
+        if reply is None:
+            self._host_lost()
+            reply = [None] * len(batches)
+        else:
+            self._record_outcome('batch failed' if None in reply else None)
+
+        results = []
+        for batch, departments in zip(batches, reply):
+            if departments is None:
+                # A hung or crashed worker must not stall the pipeline
+                self.stats['fallbacks'] += 1
+                departments = [self.classifier._classify_content(text) for text in batch]
+            results.extend(departments)
+        self.stats['batches'] += len(batches)
+        self.stats['texts'] += len(texts)
+        return results
@@ -0,0 +1,70 @@
+import zlib
+from collections.abc import ItemsView, ValuesView
+from typing import Callable, Dict, Optional
+from bson.binary import Binary
+
+# Text fields that are stored compressed once they exceed the size threshold
+COMPRESSED_FIELDS = ('raw_content', 'cleaned_content')
+
+def is_encoded(value) -> bool:
+    """Check whether a stored field value is a compressed or GridFS reference"""
+    return isinstance(value, dict) and value.get('codec') in ('zlib', 'gridfs')
+
+def compress_text(text: str, level: int = 6) -> Dict:
+    """Compress a text field into its stored zlib form"""
+    data = text.encode('utf-8')
+    return {'codec': 'zlib', 'size': len(data), 'data': Binary(zlib.compress(data, level))}
+
+def decompress_text(value: Dict, gridfs_reader: Optional[Callable] = None) -> str:
+    """Restore a text field from its zlib or GridFS stored form"""
+    if value.get('codec') == 'gridfs':
+        if gridfs_reader is None:
+            raise ValueError("GridFS reference found but no GridFS reader available")
+        return zlib.decompress(gridfs_reader(value['file_id'])).decode('utf-8')
+    return zlib.decompress(bytes(value['data'])).decode('utf-8')
+
+class LazyEmailDocument(dict):
+    """Email document that decompresses stored text fields on first access
+
+    Every way of reading values (items(), values(), copy(), dict(doc), {**doc},
+    json.dumps) goes through __getitem__, so compressed blobs never leak out.
+    """
+
+    def __init__(self, data: Dict, decoder: Callable):
+        super().__init__(data)
+        self._decoder = decoder
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if is_encoded(value):
+            value = self._decoder(value)
+            super().__setitem__(key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __iter__(self):
+        # A dict subclass with its own __iter__ is copied through keys() and __getitem__
+        # by dict(), update() and {**doc}, instead of by reading the raw values
+        return super().__iter__()
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            super().pop(key)
+            return value
+        return super().pop(key, *default)
+
+    def copy(self) -> 'LazyEmailDocument':
+        return LazyEmailDocument(super().copy(), self._decoder)
+
+    def decoded(self) -> Dict:
+        """Return a plain dict with every field decompressed"""
+        return {key: self[key] for key in self}
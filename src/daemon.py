@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from typing import Callable, Dict, Tuple, Union
+from config.settings import Config
+
+# Only the standard library and config are imported here, so the client starts in milliseconds
+
+def daemon_address() -> Union[str, Tuple[str, int]]:
+    """The daemon's Unix socket path, or a loopback TCP address where Unix sockets are unavailable"""
+    if hasattr(socket, 'AF_UNIX'):
+        return Config.DAEMON_SOCKET
+    return ('127.0.0.1', Config.DAEMON_PORT)
+
+def send_command(command: str, timeout: float = None, **params) -> Dict:
+    """Send one command to the daemon and return its JSON response"""
+    address = daemon_address()
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout or Config.DAEMON_CLIENT_TIMEOUT)
+        sock.connect(address)
+        sock.sendall(json.dumps({'command': command, **params}).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("Daemon closed the connection without a response")
+    return json.loads(line)
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads one JSON request line and writes one JSON response line"""
+
+    def handle(self):
+        line = self.rfile.readline(Config.DAEMON_MAX_REQUEST_BYTES)
+        try:
+            request = json.loads(line)
+            handler = self.server.handlers.get(request.get('command'))
+            if handler is None:
+                response = {'ok': False, 'error': f"Unknown command: {request.get('command')}"}
+            else:
+                response = {'ok': True, **handler(request)}
+        except Exception as e:
+            self.server.logger.error(f"Daemon request failed: {e}")
+            response = {'ok': False, 'error': str(e)}
+        self.wfile.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+
+class DaemonServer:
+    """Serves commands to a warm EmailSegregationSystem over a local socket
+
+    handlers maps command names to callables taking the request dict and returning
+    a JSON-serializable dict. Each connection is handled on its own thread, so
+    handlers must do their own locking.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[Dict], Dict]], address: Union[str, Tuple[str, int]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.handlers = handlers
+        self.address = address or daemon_address()
+        self.server = None
+        self._thread = None
+
+    def start(self):
+        """Bind the socket and serve requests on a background thread"""
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                # A socket left behind by a daemon that did not shut down cleanly
+                os.remove(self.address)
+            self.server = socketserver.ThreadingUnixStreamServer(self.address, _RequestHandler)
+            # Only the owning user may talk to the daemon
+            os.chmod(self.address, 0o600)
+        else:
+            self.server = socketserver.ThreadingTCPServer(self.address, _RequestHandler)
+        self.server.daemon_threads = True
+        self.server.handlers = self.handlers
+        self.server.logger = self.logger
+        self._thread = threading.Thread(target=self.server.serve_forever, name='daemon-server', daemon=True)
+        self._thread.start()
+        self.logger.info(f"Daemon listening on {self.address}")
+
+    def stop(self):
+        """Stop serving and remove the socket file"""
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+        self.server = None
+        self.logger.info("Daemon stopped")
@@ -1,9 +1,21 @@
 import logging
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, PyMongoError
-from datetime import datetime
-from typing import Dict, List, Optional
+import os
+import socket
+import threading
+import uuid
+import base64
+import gridfs
+import hashlib
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, PyMongoError
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from config.settings import Config
+from src.logging_setup import HOT_PATH
+from src.sender_prior import sender_keys
+from src.email_record import EmailRecord
+from src.compression import COMPRESSED_FIELDS, LazyEmailDocument, compress_text, decompress_text, is_encoded
 
 class DatabaseManager:
     """Handles all MongoDB operations for the email segregation system"""
@@ -12,8 +24,23 @@ class DatabaseManager:
         self.client = None
         self.db = None
         self.collection = None
+        self.leases = None
+        self.fs = None
+        self.archive = None
+        self.tombstones = None
+        self.skipped_uids = None
+        self.threads = None
+        self.sender_stats = None
+        self.checkpoints = None
+        self.digest_queue = None
+        self.auto_replies = None
         self.logger = logging.getLogger(__name__)
         
+        # Identifies this process as a lease owner
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lease_heartbeat = None
+        self._lease_heartbeat_stop = threading.Event()
+        
     def connect(self):
         """Establish connection to MongoDB"""
         try:
@@ -22,6 +49,23 @@ class DatabaseManager:
             self.client.admin.command('ping')
             self.db = self.client[Config.MONGODB_DATABASE]
             self.collection = self.db.emails
+            self.leases = self.db.email_leases
+            # Compressed content too large for a document goes to GridFS
+            self.fs = gridfs.GridFS(self.db, collection='email_content')
+            # Archived emails and the key-only records that keep them deduplicated
+            self.archive = self.db.emails_archive
+            self.tombstones = self.db.email_tombstones
+            # UIDs of messages another mailbox already stored (e.g. CC'd to two monitored addresses)
+            self.skipped_uids = self.db.email_skipped_uids
+            # Message-ID -> thread root and department, keyed by _id
+            self.threads = self.db.email_threads
+            # Department histograms per sender address and domain, keyed by _id
+            self.sender_stats = self.db.sender_stats
+            self.checkpoints = self.db.backfill_checkpoints
+            # Forwards waiting to be sent as a department digest
+            self.digest_queue = self.db.digest_queue
+            # Senders auto-replied to within the suppression window, keyed by _id
+            self.auto_replies = self.db.auto_reply_log
             
             # Create indexes for better performance
             self._create_indexes()
@@ -38,27 +82,179 @@ class DatabaseManager:
     def _create_indexes(self):
         """Create indexes for the emails collection to improve query performance"""
         try:
-            # Create index on uid (unique to prevent duplicates)
-            self.collection.create_index('uid', unique=True, background=True)
+            # UIDs are only unique within one mailbox, so the unique key is (account, folder, uid)
+            self._drop_legacy_uid_index()
+            self.collection.create_index([('account', 1), ('folder', 1), ('uid', 1)], unique=True, background=True)
             # Create index on message_id (unique, sparse to allow null values)
             self.collection.create_index('message_id', unique=True, sparse=True, background=True)
             # Create compound index for fallback duplicate detection
             self.collection.create_index([('date', 1), ('from_email', 1), ('subject', 1)], background=True)
+            # Department listings (newest first, keyset-paginated) and per-department counts
+            self.collection.create_index([('department', ASCENDING), ('processed_at', DESCENDING), ('_id', DESCENDING)], background=True)
+            # Status filters and processed_at ranges (archival, exports)
+            self.collection.create_index('status', background=True)
+            self.collection.create_index('processed_at', background=True)
+            self.collection.create_index('deferred_actions', sparse=True, background=True)
+            # Expired leases are removed by MongoDB; claims also treat them as free before that
+            self.leases.create_index('expires_at', expireAfterSeconds=Config.LEASE_TTL_SECONDS, background=True)
+            self.leases.create_index('owner', background=True)
+            # Tombstones answer the same duplicate checks for archived emails
+            self.tombstones.create_index([('account', 1), ('folder', 1), ('uid', 1)], unique=True, background=True)
+            self.tombstones.create_index('message_id', sparse=True, background=True)
+            self.tombstones.create_index('dedupe_key', background=True)
+            self.skipped_uids.create_index([('account', 1), ('folder', 1), ('uid', 1)], unique=True, background=True)
+            self.archive.create_index('processed_at', background=True)
+            self.digest_queue.create_index([('department', 1), ('batch_id', 1), ('queued_at', 1)], background=True)
+            # Suppression windows are removed by MongoDB once they end
+            self.auto_replies.create_index('expires_at', expireAfterSeconds=0, background=True)
             self.logger.info("Database indexes created successfully")
         except PyMongoError as e:
             self.logger.warning(f"Could not create indexes (they may already exist): {e}")
     
+    def _drop_legacy_uid_index(self):
+        """Drop the single-field unique uid index, which rejects equal UIDs from different mailboxes"""
+        try:
+            index_info = self.collection.index_information()
+            if index_info.get('uid_1', {}).get('unique'):
+                self.collection.drop_index('uid_1')
+                self.logger.info("Dropped legacy unique index on uid")
+        except PyMongoError as e:
+            self.logger.warning(f"Could not drop legacy uid index: {e}")
+    
+    def _mailbox_query(self, account: Optional[str], folder: Optional[str]) -> Dict:
+        """Build a query matching documents from one mailbox"""
+        account = account or Config.EMAIL_USERNAME
+        folder = folder or 'inbox'
+        query = {'account': account, 'folder': folder}
+        if account == Config.EMAIL_USERNAME and folder == 'inbox':
+            # Documents stored before multi-account support belong to the primary inbox
+            return {'$or': [query, {'account': {'$exists': False}}]}
+        return query
+    
     def disconnect(self):
         """Close MongoDB connection"""
+        self.stop_lease_heartbeat()
         if self.client:
             self.client.close()
             self.logger.info("Disconnected from MongoDB")
     
+    def _lease_key(self, account: Optional[str], folder: Optional[str], uid: str) -> str:
+        """Build the lease identifier of a message"""
+        return f"{account or Config.EMAIL_USERNAME}/{folder or 'inbox'}/{uid}"
+    
+    def _claim_lease(self, key: str) -> bool:
+        """Atomically claim a lease that is free, expired or already ours"""
+        now = datetime.now(timezone.utc)
+        try:
+            lease = self.leases.find_one_and_update(
+                {'_id': key, '$or': [{'expires_at': {'$lt': now}}, {'owner': self.instance_id}]},
+                {'$set': {
+                    'owner': self.instance_id,
+                    'claimed_at': now,
+                    'expires_at': now + timedelta(seconds=Config.LEASE_TTL_SECONDS)
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return lease is not None and lease.get('owner') == self.instance_id
+        except DuplicateKeyError:
+            # The filter did not match an existing lease, so another live instance holds it
+            return False
+        except PyMongoError as e:
+            self.logger.error(f"Error claiming lease {key}: {e}")
+            return False
+    
+    def claim_auto_reply(self, sender: str, window_seconds: int) -> Optional[bool]:
+        """Atomically open an auto-reply window for a sender
+        
+        Returns True if no window was open (the caller should reply), False if the
+        sender was already replied to within the window, and None on errors.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            self.auto_replies.find_one_and_update(
+                {'_id': sender, 'expires_at': {'$lt': now}},
+                {'$set': {'sent_at': now, 'expires_at': now + timedelta(seconds=window_seconds)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The filter did not match an existing window, so it is still open
+            return False
+        except PyMongoError as e:
+            self.logger.error(f"Error checking auto-reply window for {sender}: {e}")
+            return None
+    
+    def release_auto_reply(self, sender: str) -> bool:
+        """Close a sender's auto-reply window (e.g. when the reply could not be sent)"""
+        try:
+            self.auto_replies.delete_one({'_id': sender})
+            return True
+        except PyMongoError as e:
+            self.logger.error(f"Error releasing auto-reply window for {sender}: {e}")
+            return False
+    
+    def claim_email_uids(self, account: Optional[str], folder: Optional[str], uids: List[str], limit: int = 0) -> List[str]:
+        """Claim leases on message UIDs, returning the ones this instance may process"""
+        claimed = []
+        for uid in uids:
+            if limit and len(claimed) >= limit:
+                break
+            if self._claim_lease(self._lease_key(account, folder, uid)):
+                claimed.append(uid)
+        
+        if len(claimed) < len(uids):
+            self.logger.info(f"Claimed {len(claimed)} of {len(uids)} new emails, the rest are leased elsewhere or deferred")
+        return claimed
+    
+    def release_email_uids(self, account: Optional[str], folder: Optional[str], uids: List[str]) -> int:
+        """Release leases held by this instance"""
+        if not uids:
+            return 0
+        try:
+            keys = [self._lease_key(account, folder, uid) for uid in uids]
+            result = self.leases.delete_many({'_id': {'$in': keys}, 'owner': self.instance_id})
+            return result.deleted_count
+        except PyMongoError as e:
+            self.logger.error(f"Error releasing leases: {e}")
+            return 0
+    
+    def renew_leases(self) -> int:
+        """Extend the expiry of every lease held by this instance"""
+        try:
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=Config.LEASE_TTL_SECONDS)
+            result = self.leases.update_many({'owner': self.instance_id}, {'$set': {'expires_at': expires_at}})
+            return result.modified_count
+        except PyMongoError as e:
+            self.logger.error(f"Error renewing leases: {e}")
+            return 0
+    
+    def start_lease_heartbeat(self):
+        """Renew this instance's leases in the background while work is in flight"""
+        if self._lease_heartbeat and self._lease_heartbeat.is_alive():
+            return
+        
+        def heartbeat():
+            while not self._lease_heartbeat_stop.wait(Config.LEASE_RENEW_INTERVAL):
+                self.renew_leases()
+        
+        self._lease_heartbeat_stop.clear()
+        self._lease_heartbeat = threading.Thread(target=heartbeat, name='lease-heartbeat', daemon=True)
+        self._lease_heartbeat.start()
+    
+    def stop_lease_heartbeat(self):
+        """Stop renewing leases"""
+        if self._lease_heartbeat:
+            self._lease_heartbeat_stop.set()
+            self._lease_heartbeat.join(timeout=5)
+            self._lease_heartbeat = None
+    
     def email_exists(self, email_data: Dict) -> bool:
         """Check if email already exists in database using unique identifiers"""
         try:
-            # Primary check: UID (most reliable)
-            uid_query = {'uid': email_data.get('uid')}
+            # Primary check: UID within the same mailbox (most reliable)
+            uid_query = self._mailbox_query(email_data.get('account'), email_data.get('folder'))
+            uid_query = {'$and': [uid_query, {'uid': email_data.get('uid')}]}
             if self.collection.find_one(uid_query):
                 return True
             
@@ -75,44 +271,442 @@ class DatabaseManager:
                 'from_email': email_data.get('from_email'),
                 'subject': email_data.get('subject')
             }
-            return self.collection.find_one(fallback_query) is not None
+            if self.collection.find_one(fallback_query):
+                return True
+            
+            # Archived emails: same checks against their tombstones
+            return self._tombstone_exists(email_data)
             
         except PyMongoError as e:
             self.logger.error(f"Error checking email existence: {e}")
             return False
     
+    def record_skipped_uid(self, email_data: Dict, reason: str = 'duplicate') -> bool:
+        """Remember a UID that will not be stored, so its mailbox does not fetch it again"""
+        key = {
+            'account': email_data.get('account') or Config.EMAIL_USERNAME,
+            'folder': email_data.get('folder') or 'inbox',
+            'uid': email_data.get('uid')
+        }
+        try:
+            self.skipped_uids.update_one(
+                key,
+                {'$setOnInsert': {'message_id': email_data.get('message_id'), 'reason': reason, 'skipped_at': datetime.now()}},
+                upsert=True
+            )
+            return True
+        except PyMongoError as e:
+            self.logger.error(f"Error recording skipped UID {key['uid']}: {e}")
+            return False
+    
+    def _dedupe_key(self, email_data: Dict) -> str:
+        """Hash of the fallback duplicate-detection fields (date, sender, subject)"""
+        fields = [email_data.get('date') or '', email_data.get('from_email') or '', email_data.get('subject') or '']
+        return hashlib.sha1('\x1f'.join(fields).encode('utf-8')).hexdigest()
+    
+    def _tombstone_exists(self, email_data: Dict) -> bool:
+        """Check whether an email matches the tombstone of an archived email"""
+        account = email_data.get('account') or Config.EMAIL_USERNAME
+        folder = email_data.get('folder') or 'inbox'
+        if self.tombstones.find_one({'account': account, 'folder': folder, 'uid': email_data.get('uid')}):
+            return True
+        
+        message_id = email_data.get('message_id')
+        if message_id and self.tombstones.find_one({'message_id': message_id}):
+            return True
+        
+        return self.tombstones.find_one({'dedupe_key': self._dedupe_key(email_data)}) is not None
+    
+    def _encode_document(self, email_data: Dict, min_bytes: int = None) -> Dict:
+        """Build the stored form of an email, compressing large text fields"""
+        document = email_data.to_document() if isinstance(email_data, EmailRecord) else dict(email_data)
+        if not Config.COMPRESS_CONTENT:
+            return document
+        
+        min_bytes = Config.COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes
+        for field in COMPRESSED_FIELDS:
+            value = document.get(field)
+            if not isinstance(value, str) or len(value) < min_bytes:
+                continue
+            
+            compressed = compress_text(value, Config.COMPRESSION_LEVEL)
+            if len(compressed['data']) >= Config.GRIDFS_MIN_BYTES:
+                file_id = self.fs.put(bytes(compressed['data']), field=field)
+                compressed = {'codec': 'gridfs', 'size': compressed['size'], 'file_id': file_id}
+            document[field] = compressed
+        return document
+    
+    def _decode_field(self, value: Dict) -> str:
+        """Decompress a stored text field"""
+        return decompress_text(value, lambda file_id: self.fs.get(file_id).read())
+    
+    def _delete_gridfs_content(self, document: Dict):
+        """Remove GridFS files referenced by a stored document"""
+        for field in COMPRESSED_FIELDS:
+            value = document.get(field)
+            if is_encoded(value) and value['codec'] == 'gridfs':
+                try:
+                    self.fs.delete(value['file_id'])
+                except PyMongoError as e:
+                    self.logger.warning(f"Could not delete GridFS content {value['file_id']}: {e}")
+    
     def insert_email(self, email_data: Dict) -> bool:
         """Insert new email into database"""
+        document = None
         try:
             # Add timestamp for when email was processed
             email_data['processed_at'] = datetime.now()
             
-            result = self.collection.insert_one(email_data)
+            document = self._encode_document(email_data)
+            result = self.collection.insert_one(document)
             if result.inserted_id:
-                self.logger.info(f"Email inserted with ID: {result.inserted_id}")
+                email_data['_id'] = result.inserted_id
+                self._update_sender_histograms(email_data)
+                self.logger.info(f"Email inserted with ID: {result.inserted_id}", extra=HOT_PATH)
                 return True
             return False
         except PyMongoError as e:
+            if document:
+                self._delete_gridfs_content(document)
             self.logger.error(f"Error inserting email: {e}")
             return False
     
-    def get_all_emails(self) -> List[Dict]:
-        """Retrieve all emails from database"""
+    def _update_sender_histograms(self, email_data: Dict):
+        """Count a stored email in its sender's and domain's department histograms
+        
+        Only classifier decisions count; emails routed by the sender prior itself,
+        their thread or a near-duplicate would only reinforce earlier routing.
+        """
+        if email_data.get('routed_by') == 'classifier':
+            self.record_sender_department(email_data.get('from_email', ''), email_data.get('department'))
+    
+    def record_sender_department(self, from_email: str, department: str):
+        """Add one email to a sender's and domain's department histograms"""
+        keys = sender_keys(from_email)
+        if not department or not keys:
+            return
         try:
-            emails = list(self.collection.find())
-            return emails
+            self.sender_stats.bulk_write([
+                UpdateOne({'_id': key}, {'$inc': {f"counts.{department}": 1}}, upsert=True) for key in keys
+            ], ordered=False)
         except PyMongoError as e:
-            self.logger.error(f"Error retrieving emails: {e}")
+            self.logger.warning(f"Could not update sender histograms: {e}")
+    
+    def get_sender_histograms(self, keys: List[str]) -> Dict[str, Dict[str, int]]:
+        """Get the department histograms of several sender keys"""
+        try:
+            return {doc['_id']: doc.get('counts', {}) for doc in self.sender_stats.find({'_id': {'$in': keys}})}
+        except PyMongoError as e:
+            self.logger.error(f"Error retrieving sender histograms: {e}")
+            return {}
+    
+    def insert_emails(self, emails: List[Dict]) -> List[Dict]:
+        """Insert several emails in one unordered bulk write, returning the ones actually inserted
+        
+        Emails rejected as duplicates by the unique indexes are left out of the result,
+        so callers can send replies and forwards for exactly the inserted ones.
+        """
+        if not emails:
+            return []
+        
+        now = datetime.now()
+        documents = []
+        for email_data in emails:
+            email_data['processed_at'] = now
+            documents.append(self._encode_document(email_data))
+        
+        failed = set()
+        try:
+            self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                failed.add(error['index'])
+                if error.get('code') != 11000:
+                    self.logger.error(f"Error inserting email {emails[error['index']].get('uid')}: {error.get('errmsg')}")
+        except PyMongoError as e:
+            self.logger.error(f"Error bulk inserting emails: {e}")
             return []
+        
+        inserted = []
+        for index, (email_data, document) in enumerate(zip(emails, documents)):
+            if index in failed:
+                self._delete_gridfs_content(document)
+                continue
+            email_data['_id'] = document['_id']
+            inserted.append(email_data)
+        
+        try:
+            # One bulk update for every sender key touched by the batch
+            increments = {}
+            for email_data in inserted:
+                if email_data.get('routed_by') != 'classifier':
+                    continue
+                for key in sender_keys(email_data.get('from_email', '')):
+                    counts = increments.setdefault(key, {})
+                    counts[email_data['department']] = counts.get(email_data['department'], 0) + 1
+            if increments:
+                self.sender_stats.bulk_write([
+                    UpdateOne({'_id': key}, {'$inc': {f"counts.{department}": count for department, count in counts.items()}}, upsert=True)
+                    for key, counts in increments.items()
+                ], ordered=False)
+        except PyMongoError as e:
+            self.logger.warning(f"Could not update sender histograms: {e}")
+        
+        self.logger.info(f"Bulk inserted {len(inserted)} of {len(emails)} emails")
+        return inserted
+    
+    def get_backfill_checkpoint(self, job_id: str) -> Optional[Dict]:
+        """Get the saved progress of a backfill job"""
+        try:
+            return self.checkpoints.find_one({'_id': job_id})
+        except PyMongoError as e:
+            self.logger.error(f"Error reading backfill checkpoint {job_id}: {e}")
+            return None
     
-    def get_emails_by_department(self, department: str) -> List[Dict]:
+    def save_backfill_checkpoint(self, job_id: str, last_uid: str, counters: Dict, status: str = 'running') -> bool:
+        """Save the last completed UID and counters of a backfill job"""
+        try:
+            self.checkpoints.update_one(
+                {'_id': job_id},
+                {
+                    '$set': {'last_uid': last_uid, 'status': status, 'updated_at': datetime.now(), **counters},
+                    '$setOnInsert': {'started_at': datetime.now()}
+                },
+                upsert=True
+            )
+            return True
+        except PyMongoError as e:
+            self.logger.error(f"Error saving backfill checkpoint {job_id}: {e}")
+            return False
+    
+    def get_deferred_emails(self, batch_size: int = None) -> Iterator[Dict]:
+        """Stream emails whose auto-reply or forward was deferred"""
+        return self.iter_emails({'deferred_actions': {'$exists': True, '$ne': []}}, None, batch_size)
+    
+    def complete_deferred_action(self, email_id, action: str) -> bool:
+        """Remove a deferred action once it has been carried out"""
+        try:
+            result = self.collection.update_one({'_id': email_id}, {'$pull': {'deferred_actions': action}})
+            return result.modified_count > 0
+        except PyMongoError as e:
+            self.logger.error(f"Error completing deferred {action} for {email_id}: {e}")
+            return False
+    
+    def iter_emails(self, query: Dict = None, projection: Dict = None, batch_size: int = None) -> Iterator[Dict]:
+        """Stream emails matching a query through a batched cursor
+        
+        Compressed text fields are decompressed lazily, when first accessed. Errors
+        are raised rather than ending the stream early, so callers never mistake a
+        partial result for a complete one.
+        """
+        try:
+            cursor = self.collection.find(query or {}, projection, batch_size=batch_size or Config.MONGODB_BATCH_SIZE)
+            for document in cursor:
+                yield LazyEmailDocument(document, self._decode_field)
+        except PyMongoError as e:
+            self.logger.error(f"Error retrieving emails: {e}")
+            raise
+    
+    def get_all_emails(self, projection: Dict = None, batch_size: int = None) -> Iterator[Dict]:
+        """Retrieve all emails from database"""
+        return self.iter_emails({}, projection, batch_size)
+    
+    def get_emails_by_department(self, department: str, projection: Dict = None, batch_size: int = None) -> Iterator[Dict]:
         """Retrieve emails for a specific department"""
+        return self.iter_emails({'department': department}, projection, batch_size)
+    
+    def _encode_page_cursor(self, document: Dict) -> str:
+        """Encode the sort key of the last document on a page as an opaque cursor"""
+        processed_at = document['processed_at'].isoformat()
+        raw = f"{processed_at}|{document['_id']}".encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+    
+    def _decode_page_cursor(self, cursor: str):
+        """Decode a page cursor into its (processed_at, _id) sort key"""
+        processed_at, object_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(processed_at), ObjectId(object_id)
+    
+    @staticmethod
+    def _with_sort_key(projection: Optional[Dict]) -> Tuple[Optional[Dict], List[str]]:
+        """Make a projection return _id and processed_at, listing those the caller did not ask for"""
+        if not projection:
+            return projection, []
+        projection, hidden = dict(projection), []
+        for field in ('_id', 'processed_at'):
+            if field in projection and not projection[field]:
+                del projection[field]
+                hidden.append(field)
+        # An inclusion projection (any field but _id set) only returns processed_at when asked to
+        if 'processed_at' not in projection and any(value for key, value in projection.items() if key != '_id'):
+            projection['processed_at'] = 1
+            hidden.append('processed_at')
+        return projection, hidden
+    
+    def get_emails_by_department_page(self, department: str, page_size: int = None, after: Optional[str] = None,
+                                      projection: Dict = None) -> Dict[str, Any]:
+        """Get one page of a department's emails, newest first
+        
+        Pass the returned next_cursor as after to get the following page. Pages are
+        keyset-paginated on (processed_at, _id), so each page is a bounded index scan.
+        """
+        page_size = page_size or Config.MONGODB_PAGE_SIZE
+        query = {'department': department}
+        try:
+            if after:
+                processed_at, object_id = self._decode_page_cursor(after)
+                query['$or'] = [
+                    {'processed_at': {'$lt': processed_at}},
+                    {'processed_at': processed_at, '_id': {'$lt': object_id}}
+                ]
+            
+            # The cursor needs the sort key of the last document, even if the caller left it out
+            projection, hidden = self._with_sort_key(projection)
+            cursor = self.collection.find(query, projection).sort(
+                [('processed_at', DESCENDING), ('_id', DESCENDING)]
+            ).limit(page_size)
+            emails = [LazyEmailDocument(document, self._decode_field) for document in cursor]
+            
+            next_cursor = None
+            if len(emails) == page_size and isinstance(emails[-1].get('processed_at'), datetime):
+                next_cursor = self._encode_page_cursor(emails[-1])
+            for document in emails:
+                for field in hidden:
+                    document.pop(field, None)
+            return {'emails': emails, 'next_cursor': next_cursor}
+        except (PyMongoError, ValueError) as e:
+            self.logger.error(f"Error retrieving page of emails for department {department}: {e}")
+            return {'emails': [], 'next_cursor': None}
+    
+    def compress_existing_emails(self, batch_size: int = None) -> int:
+        """Compress the text fields of documents stored before compression was enabled"""
+        batch_size = batch_size or Config.MONGODB_BATCH_SIZE
+        # Uncompressed fields are plain strings (BSON type 2)
+        query = {'$or': [{field: {'$type': 'string'}} for field in COMPRESSED_FIELDS]}
+        projection = {field: 1 for field in COMPRESSED_FIELDS}
+        
+        compressed_count = 0
         try:
-            emails = list(self.collection.find({'department': department}))
-            return emails
+            operations = []
+            for document in self.collection.find(query, projection, batch_size=batch_size):
+                encoded = self._encode_document(document)
+                changes = {field: encoded[field] for field in COMPRESSED_FIELDS
+                           if field in encoded and encoded[field] is not document.get(field)}
+                if changes:
+                    operations.append(UpdateOne({'_id': document['_id']}, {'$set': changes}))
+                
+                if len(operations) >= batch_size:
+                    compressed_count += self.collection.bulk_write(operations, ordered=False).modified_count
+                    operations = []
+            
+            if operations:
+                compressed_count += self.collection.bulk_write(operations, ordered=False).modified_count
+            
+            self.logger.info(f"Compressed content of {compressed_count} existing emails")
+            return compressed_count
         except PyMongoError as e:
-            self.logger.error(f"Error retrieving emails for department {department}: {e}")
-            return []
+            self.logger.error(f"Error compressing existing emails: {e}")
+            return compressed_count
+    
+    def get_recent_fingerprints(self, since: datetime) -> Iterator[Dict]:
+        """Stream fingerprints of emails processed since a given time, oldest first"""
+        try:
+            cursor = self.collection.find(
+                {'processed_at': {'$gte': since}, 'fingerprint': {'$type': 'string'}},
+                {'_id': 0, 'uid': 1, 'fingerprint': 1, 'department': 1, 'from_email': 1, 'processed_at': 1}
+            ).sort('processed_at', ASCENDING)
+            for document in cursor:
+                yield document
+        except PyMongoError as e:
+            self.logger.error(f"Error retrieving recent fingerprints: {e}")
+    
+    def get_threads(self, message_ids: List[str]) -> Dict[str, Dict]:
+        """Look up the thread root and department of several Message-IDs"""
+        try:
+            threads = {}
+            for thread in self.threads.find({'_id': {'$in': message_ids}}):
+                threads[thread['_id']] = {'root': thread['root'], 'department': thread['department']}
+            return threads
+        except PyMongoError as e:
+            self.logger.error(f"Error looking up threads: {e}")
+            return {}
+    
+    def save_thread(self, message_id: str, root: str, department: str) -> bool:
+        """Record the thread root and department of a Message-ID"""
+        try:
+            self.threads.update_one(
+                {'_id': message_id},
+                {'$set': {'root': root, 'department': department, 'updated_at': datetime.now()}},
+                upsert=True
+            )
+            return True
+        except PyMongoError as e:
+            self.logger.error(f"Error saving thread for {message_id}: {e}")
+            return False
+    
+    def queue_digest_item(self, item: Dict) -> Optional[int]:
+        """Queue a forward for a department digest, returning the department's unsent count"""
+        try:
+            self.digest_queue.insert_one({**item, 'batch_id': None, 'queued_at': datetime.now()})
+            return self.digest_queue.count_documents({'department': item['department'], 'batch_id': None})
+        except PyMongoError as e:
+            self.logger.error(f"Error queueing digest item for {item.get('department')}: {e}")
+            return None
+    
+    def get_digest_backlog(self) -> Dict[str, Dict]:
+        """Get the unsent digest count and oldest queue time per department"""
+        try:
+            pipeline = [
+                {'$match': {'batch_id': None}},
+                {'$group': {'_id': '$department', 'count': {'$sum': 1}, 'oldest': {'$min': '$queued_at'}}}
+            ]
+            return {row['_id']: {'count': row['count'], 'oldest': row['oldest']}
+                    for row in self.digest_queue.aggregate(pipeline)}
+        except PyMongoError as e:
+            self.logger.error(f"Error reading digest backlog: {e}")
+            return {}
+    
+    def claim_digest_items(self, department: str, limit: int, stale_seconds: int = 600) -> Tuple[str, List[Dict]]:
+        """Claim up to limit queued items of a department for one digest, oldest first
+        
+        Items claimed by a flush that never completed become claimable again after
+        stale_seconds. Returns (batch_id, items).
+        """
+        batch_id = uuid.uuid4().hex
+        claimable = {'department': department, '$or': [
+            {'batch_id': None},
+            {'claimed_at': {'$lt': datetime.now() - timedelta(seconds=stale_seconds)}}
+        ]}
+        try:
+            ids = [item['_id'] for item in self.digest_queue.find(claimable, {'_id': 1}).sort('queued_at', ASCENDING).limit(limit)]
+            if not ids:
+                return batch_id, []
+            # Re-check the claim condition so concurrent flushes never share an item
+            self.digest_queue.update_many(
+                {**claimable, '_id': {'$in': ids}},
+                {'$set': {'batch_id': batch_id, 'claimed_at': datetime.now()}}
+            )
+            return batch_id, list(self.digest_queue.find({'batch_id': batch_id}).sort('queued_at', ASCENDING))
+        except PyMongoError as e:
+            self.logger.error(f"Error claiming digest items for {department}: {e}")
+            return batch_id, []
+    
+    def complete_digest_items(self, batch_id: str) -> bool:
+        """Remove the items of a sent digest"""
+        try:
+            self.digest_queue.delete_many({'batch_id': batch_id})
+            return True
+        except PyMongoError as e:
+            self.logger.error(f"Error completing digest {batch_id}: {e}")
+            return False
+    
+    def release_digest_items(self, batch_id: str) -> bool:
+        """Return the items of a digest that could not be sent to the queue"""
+        try:
+            self.digest_queue.update_many({'batch_id': batch_id}, {'$set': {'batch_id': None}, '$unset': {'claimed_at': ''}})
+            return True
+        except PyMongoError as e:
+            self.logger.error(f"Error releasing digest {batch_id}: {e}")
+            return False
     
     def update_email_status(self, email_id: str, status: str) -> bool:
         """Update email processing status"""
@@ -126,18 +720,79 @@ class DatabaseManager:
             self.logger.error(f"Error updating email status: {e}")
             return False
     
-    def get_processed_uids(self) -> List[str]:
-        """Get list of all processed email UIDs"""
+    def get_processed_uids(self, account: Optional[str] = None, folder: Optional[str] = None) -> List[str]:
+        """Get list of all processed email UIDs for a mailbox (the primary inbox by default)"""
         try:
             # Only get the uid field to minimize data transfer
-            processed_emails = self.collection.find({}, {'uid': 1, '_id': 0})
+            processed_emails = self.collection.find(self._mailbox_query(account, folder), {'uid': 1, '_id': 0})
             uids = [email.get('uid') for email in processed_emails if email.get('uid')]
+            
+            # Archived emails stay processed through their tombstones
+            tombstone_query = {'account': account or Config.EMAIL_USERNAME, 'folder': folder or 'inbox'}
+            uids += [tombstone['uid'] for tombstone in self.tombstones.find(tombstone_query, {'uid': 1, '_id': 0})]
+            # So do duplicates of messages stored from another mailbox
+            uids += [skipped['uid'] for skipped in self.skipped_uids.find(tombstone_query, {'uid': 1, '_id': 0})]
             self.logger.info(f"Found {len(uids)} processed email UIDs")
             return uids
         except PyMongoError as e:
             self.logger.error(f"Error getting processed UIDs: {e}")
             return []
     
+    def archive_emails(self, older_than_days: int = None, batch_size: int = None, compress: bool = None) -> int:
+        """Move emails processed more than older_than_days ago to the archive collection
+        
+        Each batch is copied to the archive, recorded as tombstones and only then
+        deleted from the hot collection, so an interrupted run can simply be restarted.
+        """
+        older_than_days = Config.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+        batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+        compress = Config.ARCHIVE_COMPRESS if compress is None else compress
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+        
+        self.logger.info(f"Archiving emails processed before {cutoff.strftime('%Y-%m-%d %H:%M:%S')}")
+        archived_count = 0
+        try:
+            while True:
+                batch = list(self.collection.find({'processed_at': {'$lt': cutoff}}).sort('processed_at', ASCENDING).limit(batch_size))
+                if not batch:
+                    break
+                
+                # Archived content is compressed regardless of size
+                documents = [self._encode_document(document, min_bytes=0) if compress else document for document in batch]
+                try:
+                    self.archive.insert_many(documents, ordered=False)
+                except BulkWriteError as e:
+                    # Documents copied by an interrupted run are already archived
+                    if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+                        raise
+                
+                self.tombstones.bulk_write([
+                    UpdateOne(
+                        {
+                            'account': document.get('account') or Config.EMAIL_USERNAME,
+                            'folder': document.get('folder') or 'inbox',
+                            'uid': document.get('uid')
+                        },
+                        {'$set': {
+                            'message_id': document.get('message_id') or None,
+                            'dedupe_key': self._dedupe_key(document),
+                            'archived_at': datetime.now()
+                        }},
+                        upsert=True
+                    )
+                    for document in batch
+                ], ordered=False)
+                
+                result = self.collection.delete_many({'_id': {'$in': [document['_id'] for document in batch]}})
+                archived_count += result.deleted_count
+                self.logger.info(f"Archived {archived_count} emails so far")
+            
+            self.logger.info(f"Archival complete: {archived_count} emails moved to the archive")
+            return archived_count
+        except PyMongoError as e:
+            self.logger.error(f"Error archiving emails (safe to rerun): {e}")
+            return archived_count
+    
     def get_database_stats(self) -> Dict:
         """Get database statistics"""
         try:
@@ -147,9 +802,88 @@ class DatabaseManager:
                 'software_emails': self.collection.count_documents({'department': 'software'}),
                 'order_emails': self.collection.count_documents({'department': 'order'}),
                 'payment_emails': self.collection.count_documents({'department': 'payment'}),
-                'general_emails': self.collection.count_documents({'department': 'general'})
+                'general_emails': self.collection.count_documents({'department': 'general'}),
+                'archived_emails': self.archive.estimated_document_count()
             }
             return stats
         except PyMongoError as e:
             self.logger.error(f"Error getting database stats: {e}")
             return {}
+    
+    def _plan_summary(self, plan: Dict) -> Dict[str, Any]:
+        """Collect the stages and index names used by a query plan"""
+        stages, indexes = [], []
+        pending = [plan]
+        while pending:
+            node = pending.pop()
+            if isinstance(node, dict):
+                if 'stage' in node:
+                    stages.append(node['stage'])
+                if 'indexName' in node:
+                    indexes.append(node['indexName'])
+                pending.extend(node.values())
+            elif isinstance(node, list):
+                pending.extend(node)
+        
+        indexed = bool(indexes) or any(stage in ('IDHACK', 'EXPRESS_IXSCAN', 'COUNT_SCAN') for stage in stages)
+        return {
+            'indexed': indexed and 'COLLSCAN' not in stages,
+            'covered': indexed and 'FETCH' not in stages and 'COLLSCAN' not in stages,
+            'indexes': sorted(set(indexes)),
+            'stages': stages
+        }
+    
+    def explain_queries(self) -> Dict[str, Dict[str, Any]]:
+        """Explain every built-in query and report whether it is served by an index"""
+        sample_id = ObjectId()
+        mailbox = self._mailbox_query(None, None)
+        queries = {
+            'email_exists (uid)': (self.collection, {'$and': [mailbox, {'uid': '1'}]}, None, None),
+            'email_exists (message_id)': (self.collection, {'message_id': '<sample@example.com>'}, None, None),
+            'email_exists (fallback)': (self.collection, {'date': '', 'from_email': '', 'subject': ''}, None, None),
+            'get_processed_uids': (self.collection, mailbox, {'uid': 1, '_id': 0}, None),
+            'get_emails_by_department': (self.collection, {'department': 'general'}, None, None),
+            'get_emails_by_department_page': (
+                self.collection,
+                {'department': 'general', '$or': [{'processed_at': {'$lt': datetime.now()}},
+                                                  {'processed_at': datetime.now(), '_id': {'$lt': sample_id}}]},
+                None,
+                [('processed_at', DESCENDING), ('_id', DESCENDING)]
+            ),
+            'get_database_stats (department count)': (self.collection, {'department': 'general'}, {'_id': 0, 'department': 1}, None),
+            'update_email_status': (self.collection, {'_id': sample_id}, None, None),
+            'status filter': (self.collection, {'status': 'unprocessed'}, None, None),
+            'archive_emails': (self.collection, {'processed_at': {'$lt': datetime.now()}}, None, [('processed_at', ASCENDING)]),
+            'tombstone (uid)': (self.tombstones, {'account': Config.EMAIL_USERNAME, 'folder': 'inbox', 'uid': '1'}, None, None),
+            'tombstone (message_id)': (self.tombstones, {'message_id': '<sample@example.com>'}, None, None),
+            'tombstone (fallback)': (self.tombstones, {'dedupe_key': ''}, None, None),
+            'get_processed_uids (skipped)': (self.skipped_uids, {'account': Config.EMAIL_USERNAME, 'folder': 'inbox'}, {'uid': 1, '_id': 0}, None),
+            'renew_leases': (self.leases, {'owner': self.instance_id}, None, None)
+        }
+        
+        report = {}
+        for name, (collection, query, projection, sort) in queries.items():
+            try:
+                cursor = collection.find(query, projection)
+                if sort:
+                    cursor = cursor.sort(sort)
+                plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+                report[name] = self._plan_summary(plan)
+            except PyMongoError as e:
+                report[name] = {'indexed': False, 'covered': False, 'indexes': [], 'stages': [], 'error': str(e)}
+        return report
+    
+    def get_mailbox_stats(self) -> Dict[str, int]:
+        """Get the number of processed emails per account/folder"""
+        try:
+            pipeline = [{'$group': {'_id': {'account': '$account', 'folder': '$folder'}, 'count': {'$sum': 1}}}]
+            stats = {}
+            for row in self.collection.aggregate(pipeline):
+                account = row['_id'].get('account') or Config.EMAIL_USERNAME
+                folder = row['_id'].get('folder') or 'inbox'
+                key = f"{account}/{folder}"
+                stats[key] = stats.get(key, 0) + row['count']
+            return stats
+        except PyMongoError as e:
+            self.logger.error(f"Error getting mailbox stats: {e}")
+            return {}
@@ -0,0 +1,85 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from config.settings import Config
+
+class DigestBuffer:
+    """Durable per-department buffer of forwards that are sent as one digest message
+
+    Items live in the digest_queue collection until a digest containing them has
+    been sent, so nothing is lost if the process stops between flushes. A
+    department is due once it holds max_emails items or its oldest item is older
+    than max_age_seconds.
+    """
+
+    def __init__(self, db_manager, max_emails: int = 50, max_age_seconds: int = 1800):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.max_emails = max(1, max_emails)
+        self.max_age_seconds = max_age_seconds
+
+    def add(self, department: str, from_email: str, subject: str, date: str, content: str,
+            first_seen_at: Optional[float] = None) -> Optional[int]:
+        """Queue a forward, returning the department's unsent count (None if it could not be queued)"""
+        return self.db_manager.queue_digest_item({
+            'department': department,
+            'from_email': from_email,
+            'subject': subject,
+            'date': date,
+            'content': content,
+            'first_seen_at': first_seen_at
+        })
+
+    def due_departments(self, now: datetime = None) -> List[str]:
+        """Departments whose buffer reached the size or age threshold"""
+        now = now or datetime.now()
+        due = []
+        for department, backlog in self.db_manager.get_digest_backlog().items():
+            if backlog['count'] >= self.max_emails or (now - backlog['oldest']).total_seconds() >= self.max_age_seconds:
+                due.append(department)
+        return due
+
+    def claim(self, department: str) -> Tuple[str, List[Dict]]:
+        """Claim the oldest items of a department for one digest"""
+        # A flush that has not finished after twice the age threshold is treated as lost
+        return self.db_manager.claim_digest_items(department, self.max_emails, max(self.max_age_seconds * 2, 600))
+
+    def complete(self, batch_id: str):
+        self.db_manager.complete_digest_items(batch_id)
+
+    def release(self, batch_id: str):
+        self.db_manager.release_digest_items(batch_id)
+
+    @staticmethod
+    def format_digest(department: str, items: List[Dict]) -> Tuple[str, str]:
+        """Build the subject and body of a digest: an index of senders and subjects, then each message"""
+        subject = f"{Config.FORWARD_SUBJECT} - {department.title()} Department Digest ({len(items)} emails)"
+
+        index = '\n'.join(
+            f"{number}. {item.get('from_email', '')} - {item.get('subject') or 'No subject'}"
+            f" ({item.get('date') or 'Not specified'})"
+            for number, item in enumerate(items, 1)
+        )
+        messages = '\n'.join(
+            f"""--- MESSAGE {number} of {len(items)} ---
+From: {item.get('from_email', '')}
+Date: {item.get('date') or 'Not specified'}
+Subject: {item.get('subject') or 'No subject'}
+
+{item.get('content', '')}
+"""
+            for number, item in enumerate(items, 1)
+        )
+
+        body = f"""This digest contains {len(items)} emails automatically classified and forwarded to the {department.title()} Department.
+
+=== INDEX ===
+{index}
+
+{messages}
+--- END OF DIGEST ---
+
+This message was processed by the Email Segregation System.
+Please respond to each original sender at the address shown with their message.
+"""
+        return subject, body
@@ -2,25 +2,45 @@ import email
 import imaplib
 import logging
 import os
+import re
 from bs4 import BeautifulSoup
 # from cleantext import clean  # Optional dependency
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Set
 from config.settings import Config
+from src.email_record import EmailRecord
+from src.html_text_extractor import html_to_text
+from src.near_duplicate import simhash
+from src.parallel_fetcher import ParallelFetcher
+from src.imap_bodystructure import (
+    collect_attachments, decode_section, parse_bodystructure, parse_fetch_response, select_text_parts
+)
 
 class EmailProcessor:
     """Handles email fetching and processing operations"""
     
-    def __init__(self):
+    def __init__(self, username: str = None, password: str = None, imap_server: str = None, folder: str = 'inbox'):
         self.mail = None
         self.logger = logging.getLogger(__name__)
         
+        # Mailbox to read from (defaults to the primary account's inbox)
+        self.username = username or Config.EMAIL_USERNAME
+        self.password = password or Config.EMAIL_PASSWORD
+        self.imap_server = imap_server or Config.EMAIL_IMAP_SERVER
+        self.folder = folder
+        
+        # New emails left on the server by the last fetch (batch cap)
+        self.pending_count = 0
+        # New emails first seen by the last fetch, and the UIDs it saw (backlog is not counted twice)
+        self.arrival_count = 0
+        self._seen_uids: Set[bytes] = set()
+        
     def connect_to_email(self) -> bool:
         """Connect to email server using IMAP"""
         try:
-            self.mail = imaplib.IMAP4_SSL(Config.EMAIL_IMAP_SERVER)
-            self.mail.login(Config.EMAIL_USERNAME, Config.EMAIL_PASSWORD)
-            self.mail.select("inbox")
-            self.logger.info("Successfully connected to email server")
+            self.mail = imaplib.IMAP4_SSL(self.imap_server)
+            self.mail.login(self.username, self.password)
+            self.mail.select(self.folder)
+            self.logger.info(f"Successfully connected to email server ({self.username}/{self.folder})")
             return True
         except Exception as e:
             self.logger.error(f"Failed to connect to email server: {e}")
@@ -43,17 +63,39 @@ class EmailProcessor:
             self.disconnect_from_email()
             
             # Establish new connection
-            self.mail = imaplib.IMAP4_SSL(Config.EMAIL_IMAP_SERVER)
-            self.mail.login(Config.EMAIL_USERNAME, Config.EMAIL_PASSWORD)
-            self.mail.select("inbox")
+            self.mail = imaplib.IMAP4_SSL(self.imap_server)
+            self.mail.login(self.username, self.password)
+            self.mail.select(self.folder)
             self.logger.info("Successfully reconnected to email server")
             return True
         except Exception as e:
             self.logger.error(f"Failed to reconnect to email server: {e}")
             return False
     
-    def fetch_emails(self, processed_uids: List[str] = None) -> List[Dict]:
-        """Fetch only new emails from inbox that haven't been processed"""
+    def ensure_connected(self) -> bool:
+        """Check the connection with NOOP, reconnecting if the server dropped it"""
+        try:
+            if self.mail and self.mail.noop()[0] == 'OK':
+                return True
+        except Exception as e:
+            self.logger.warning(f"Email server connection lost: {e}")
+        return self._reconnect()
+    
+    def fetch_emails(self, processed_uids: List[str] = None, claim_uids: Callable[[List[str], int], List[str]] = None,
+                     max_emails: int = 0, rank_uids: Callable[[List[bytes]], List[bytes]] = None) -> List[EmailRecord]:
+        """Fetch only new emails from inbox that haven't been processed
+        
+        At most max_emails (if non-zero) are fetched; new emails left for a later
+        cycle are counted in pending_count, and new emails not seen by the previous
+        fetch in arrival_count. When the cap applies, rank_uids (if
+        given) reorders the new UIDs first so the most urgent are fetched in this
+        cycle. If claim_uids is given, it is called with all new UIDs (in order) and
+        the cap, and only the UIDs it returns are fetched, so several instances can
+        share one mailbox; claiming before capping keeps an instance from stopping
+        at UIDs another one already holds.
+        """
+        self.pending_count = 0
+        self.arrival_count = 0
         if not self.mail:
             self.logger.error("No email connection established")
             return []
@@ -61,7 +103,7 @@ class EmailProcessor:
         try:
             # Refresh the mailbox to ensure we see the latest emails
             try:
-                self.mail.select("inbox")
+                self.mail.select(self.folder)
             except Exception as e:
                 self.logger.warning(f"Failed to refresh inbox, attempting reconnection: {e}")
                 # Attempt to reconnect if refresh fails
@@ -78,18 +120,34 @@ class EmailProcessor:
             processed_uids = processed_uids or []
             
             # Convert processed UIDs to bytes for comparison
-            processed_uids_bytes = [uid.encode('utf-8') if isinstance(uid, str) else uid for uid in processed_uids]
+            processed_uids_bytes = {uid.encode('utf-8') if isinstance(uid, str) else uid for uid in processed_uids}
             
             # Filter out already processed emails
             new_email_uids = [uid for uid in all_email_uids if uid not in processed_uids_bytes]
             
             self.logger.info(f"Found {len(all_email_uids)} total emails, {len(new_email_uids)} new emails to process")
+            seen_uids = set(new_email_uids)
+            self.arrival_count = len(seen_uids - self._seen_uids)
+            self._seen_uids = seen_uids
+            
+            if max_emails and len(new_email_uids) > max_emails and rank_uids:
+                new_email_uids = rank_uids(new_email_uids)
+            
+            if claim_uids and new_email_uids:
+                claimed = set(claim_uids([uid.decode('utf-8') for uid in new_email_uids], max_emails))
+                positions = [index for index, uid in enumerate(new_email_uids) if uid.decode('utf-8') in claimed]
+                # Claiming stops at the cap, leaving the UIDs after the last claimed one untried. Below
+                # the cap every UID was tried, and the unclaimed ones belong to other instances
+                attempted = positions[-1] + 1 if max_emails and len(positions) >= max_emails else len(new_email_uids)
+                new_email_uids = [new_email_uids[index] for index in positions]
+            else:
+                attempted = min(len(new_email_uids), max_emails) if max_emails else len(new_email_uids)
+                new_email_uids = new_email_uids[:attempted]
+            self.pending_count = len(seen_uids) - attempted
+            if self.pending_count:
+                self.logger.info(f"Batch cap reached, {self.pending_count} emails left for the next cycle")
             
-            emails = []
-            for uid in new_email_uids:
-                email_data = self._process_single_email(uid)
-                if email_data:
-                    emails.append(email_data)
+            emails = self.fetch_uids(new_email_uids)
             
             self.logger.info(f"Successfully fetched {len(emails)} new emails")
             return emails
@@ -98,8 +156,86 @@ class EmailProcessor:
             self.logger.error(f"Error fetching emails: {e}")
             return []
     
-    def _process_single_email(self, uid: bytes) -> Optional[Dict]:
+    def search_uids(self, criteria: str = "ALL") -> List[bytes]:
+        """Search the folder and return matching UIDs in ascending order"""
+        if not self.mail:
+            self.logger.error("No email connection established")
+            return []
+        
+        try:
+            self.mail.select(self.folder)
+            result, data = self.mail.uid('search', None, criteria)
+            if result != 'OK':
+                self.logger.error(f"Failed to search emails with criteria {criteria}")
+                return []
+            return sorted(data[0].split(), key=int)
+        except Exception as e:
+            self.logger.error(f"Error searching emails: {e}")
+            return []
+    
+    def fetch_priority_headers(self, uids: List[bytes], chunk_size: int = 500) -> Dict[bytes, Dict]:
+        """Fetch only the headers used for priority scoring, many messages per command
+        
+        Returns {uid: {'subject', 'from_email', 'date', 'x_priority', 'importance'}}.
+        """
+        headers = {}
+        for start in range(0, len(uids), chunk_size):
+            chunk = b','.join(uids[start:start + chunk_size]).decode('ascii')
+            try:
+                result, data = self.mail.uid(
+                    'fetch', chunk, '(UID BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE X-PRIORITY IMPORTANCE)])'
+                )
+            except Exception as e:
+                self.logger.warning(f"Failed to fetch priority headers: {e}")
+                continue
+            if result != 'OK':
+                continue
+            for item in data:
+                if not isinstance(item, tuple):
+                    continue
+                match = re.search(rb'UID (\d+)', item[0])
+                if not match:
+                    continue
+                message = email.message_from_bytes(item[1])
+                headers[match.group(1)] = {
+                    'subject': message.get('Subject', ''),
+                    'from_email': self._extract_email_address(message.get('From', '')),
+                    'date': message.get('Date', ''),
+                    'x_priority': message.get('X-Priority', ''),
+                    'importance': message.get('Importance', '')
+                }
+        return headers
+    
+    def fetch_uids(self, uids: List[bytes]) -> List[EmailRecord]:
+        """Fetch and parse the given UIDs, in order"""
+        if len(uids) >= Config.PARALLEL_FETCH_MIN_EMAILS and self._parallel_connections() > 1:
+            # Catching up on a backlog: spread the round trips over several connections
+            fetcher = ParallelFetcher(self._clone, self._parallel_connections())
+            return fetcher.fetch(uids, self._process_single_email)
+        
+        emails = []
+        for uid in uids:
+            email_data = self._process_single_email(uid)
+            if email_data:
+                emails.append(email_data)
+        return emails
+    
+    def _parallel_connections(self) -> int:
+        """Number of extra fetch connections allowed next to this one"""
+        return max(0, min(Config.IMAP_FETCH_CONNECTIONS, Config.IMAP_MAX_CONNECTIONS - 1))
+    
+    def _clone(self) -> 'EmailProcessor':
+        """Create an unconnected processor for the same mailbox"""
+        return EmailProcessor(self.username, self.password, self.imap_server, self.folder)
+    
+    def _process_single_email(self, uid: bytes) -> Optional[EmailRecord]:
         """Process a single email and extract relevant information"""
+        if Config.IMAP_FETCH_MODE == 'bodystructure':
+            email_info = self._process_single_email_partial(uid)
+            if email_info:
+                return email_info
+            self.logger.warning(f"Partial fetch failed for email {uid}, falling back to RFC822")
+        
         try:
             result, email_data = self.mail.uid('fetch', uid, '(RFC822)')
             if result != 'OK':
@@ -108,39 +244,112 @@ class EmailProcessor:
             raw_email = email_data[0][1].decode("utf-8")
             email_message = email.message_from_string(raw_email)
             
-            # Extract email metadata
-            from_header = email_message.get('From', '')
-            to_header = email_message.get('To', '')
-            subject = email_message.get('Subject', '')
-            date = email_message.get('Date', '')
-            message_id = email_message.get('Message-ID', '')
-            
-            # Extract sender email address
-            from_email = self._extract_email_address(from_header)
-            
             # Extract and clean email content
             email_content = self._extract_email_content(email_message)
-            cleaned_content = self._clean_text(email_content)
-            
-            email_info = {
-                'uid': uid.decode('utf-8'),
-                'message_id': message_id,
-                'from_header': from_header,
-                'from_email': from_email,
-                'to_header': to_header,
-                'subject': subject,
-                'date': date,
-                'raw_content': email_content,
-                'cleaned_content': cleaned_content,
-                'status': 'unprocessed'
-            }
-            
-            return email_info
+            attachments = self._collect_attachment_metadata(email_message)
+            
+            return self._build_email_info(uid, email_message, email_content, attachments)
             
         except Exception as e:
             self.logger.error(f"Error processing email {uid}: {e}")
             return None
     
+    def _process_single_email_partial(self, uid: bytes) -> Optional[EmailRecord]:
+        """Fetch only the headers and text sections of an email, guided by its BODYSTRUCTURE"""
+        try:
+            result, structure_data = self.mail.uid('fetch', uid, '(BODYSTRUCTURE)')
+            if result != 'OK':
+                return None
+            
+            structure = parse_fetch_response(structure_data).get('BODYSTRUCTURE')
+            if not isinstance(structure, list):
+                return None
+            body = parse_bodystructure(structure)
+            text_parts = select_text_parts(body)
+            
+            # Fetch the header block plus a capped prefix of every text section in one round trip
+            max_bytes = Config.IMAP_SECTION_MAX_BYTES
+            fetch_items = ['BODY.PEEK[HEADER]']
+            fetch_items += [f"BODY.PEEK[{part['section']}]<0.{max_bytes}>" for part in text_parts]
+            result, section_data = self.mail.uid('fetch', uid, f"({' '.join(fetch_items)})")
+            if result != 'OK':
+                return None
+            
+            sections = parse_fetch_response(section_data)
+            header_bytes = sections.get('BODY[HEADER]')
+            if not isinstance(header_bytes, bytes):
+                return None
+            email_message = email.message_from_bytes(header_bytes)
+            
+            texts = []
+            for part in text_parts:
+                payload = sections.get(f"BODY[{part['section']}]")
+                text = decode_section(payload if isinstance(payload, bytes) else None, part)
+                if part['content_type'] == "text/html":
+                    text = html_to_text(text, max_chars=Config.HTML_TEXT_MAX_CHARS)
+                if text.strip():
+                    texts.append(text)
+            
+            return self._build_email_info(uid, email_message, "\n".join(texts), collect_attachments(body))
+            
+        except Exception as e:
+            self.logger.error(f"Error partially fetching email {uid}: {e}")
+            return None
+    
+    def _build_email_info(self, uid: bytes, email_message, email_content: str, attachments: List[Dict]) -> EmailRecord:
+        """Build the email record from parsed headers and extracted content"""
+        # Extract email metadata
+        from_header = email_message.get('From', '')
+        to_header = email_message.get('To', '')
+        subject = email_message.get('Subject', '')
+        date = email_message.get('Date', '')
+        message_id = email_message.get('Message-ID', '')
+        in_reply_to = email_message.get('In-Reply-To', '')
+        references = email_message.get('References', '')
+        
+        # Extract sender email address
+        from_email = self._extract_email_address(from_header)
+        
+        cleaned_content = self._clean_text(email_content)
+        fingerprint = self._fingerprint(subject, cleaned_content)
+        
+        # The unparsed text is only carried along when it is going to be stored
+        return EmailRecord(
+            uid=uid.decode('utf-8'),
+            account=self.username,
+            folder=self.folder,
+            message_id=message_id,
+            from_header=from_header,
+            from_email=from_email,
+            to_header=to_header,
+            subject=subject,
+            date=date,
+            in_reply_to=in_reply_to,
+            references=references,
+            raw_content=email_content if Config.STORE_RAW_CONTENT else None,
+            cleaned_content=cleaned_content,
+            fingerprint=fingerprint,
+            attachments=attachments,
+            x_priority=email_message.get('X-Priority', ''),
+            importance=email_message.get('Importance', '')
+        )
+    
+    def _collect_attachment_metadata(self, email_message) -> List[Dict]:
+        """Record name, type and decoded size of each attachment in a fully fetched message"""
+        attachments = []
+        for part in email_message.walk():
+            if part.is_multipart():
+                continue
+            content_type = part.get_content_type()
+            if part.get_content_disposition() == 'attachment' or not content_type.startswith('text/'):
+                payload = part.get_payload(decode=True) or b''
+                attachments.append({
+                    'filename': part.get_filename() or '',
+                    'content_type': content_type,
+                    'size': len(payload)
+                })
+        return attachments
+    
     def _extract_email_address(self, from_header: str) -> str:
         """Extract email address from From header"""
         try:
@@ -156,6 +365,65 @@ class EmailProcessor:
     
     def _extract_email_content(self, email_message) -> str:
         """Extract text content from email message"""
+        if Config.EMAIL_CONTENT_MODE == 'legacy':
+            return self._extract_email_content_legacy(email_message)
+        
+        content = ""
+        
+        try:
+            texts = []
+            for part in self._select_text_parts(email_message):
+                text = self._decode_part(part)
+                if part.get_content_type() == "text/html":
+                    # Stream the HTML through the stdlib parser instead of building a full tree
+                    text = html_to_text(text, max_chars=Config.HTML_TEXT_MAX_CHARS)
+                if text.strip():
+                    texts.append(text)
+            content = "\n".join(texts)
+        except Exception as e:
+            self.logger.error(f"Error extracting email content: {e}")
+        
+        return content
+    
+    def _select_text_parts(self, part) -> List:
+        """Select the body parts to read, keeping one rendering per multipart/alternative"""
+        if part.is_multipart():
+            subparts = part.get_payload()
+            if part.get_content_subtype() == 'alternative':
+                # Prefer text/plain, otherwise take the last (richest) alternative that has text
+                for subpart in subparts:
+                    if subpart.get_content_type() == "text/plain" and self._decode_part(subpart).strip():
+                        return [subpart]
+                for subpart in reversed(subparts):
+                    selected = self._select_text_parts(subpart)
+                    if selected:
+                        return selected
+                return []
+            
+            selected = []
+            for subpart in subparts:
+                selected.extend(self._select_text_parts(subpart))
+            return selected
+        
+        if part.get_content_disposition() == 'attachment':
+            return []
+        if part.get_content_type() in ("text/plain", "text/html") and self._decode_part(part).strip():
+            return [part]
+        return []
+    
+    def _decode_part(self, part) -> str:
+        """Decode a non-multipart body part using its declared charset"""
+        payload = part.get_payload(decode=True)
+        if not payload:
+            return ""
+        charset = part.get_content_charset() or 'utf-8'
+        try:
+            return payload.decode(charset, errors='ignore')
+        except LookupError:
+            return payload.decode('utf-8', errors='ignore')
+    
+    def _extract_email_content_legacy(self, email_message) -> str:
+        """Extract text content by concatenating every text part (BeautifulSoup path)"""
         content = ""
         
         try:
@@ -202,6 +470,14 @@ class EmailProcessor:
             self.logger.error(f"Error cleaning text: {e}")
             return text
     
+    def _fingerprint(self, subject: str, cleaned_content: str) -> Optional[str]:
+        """Compute the SimHash fingerprint used for near-duplicate detection"""
+        if not Config.NEAR_DUPLICATE_DETECTION:
+            return None
+        signature = simhash(f"{subject} {cleaned_content}", min_tokens=Config.NEAR_DUPLICATE_MIN_TOKENS)
+        # Stored as hex because MongoDB integers are signed 64-bit
+        return format(signature, '016x') if signature is not None else None
+    
     def save_email_to_file(self, email_data: Dict, filename: str) -> bool:
         """Save email content to file (for debugging/backup)"""
         try:
@@ -0,0 +1,78 @@
+from typing import Any, Dict, List, Optional
+
+class EmailRecord:
+    """A fetched email as it moves through the pipeline
+
+    Uses __slots__ instead of a per-instance dict, which keeps thousands of
+    in-flight emails small during catch-up. Item access (record['subject'],
+    record.get('department'), 'thread_root' in record) works as it does for the
+    plain dicts the rest of the pipeline handles; fields never set are absent,
+    and unknown field names raise KeyError. to_document() builds the MongoDB
+    document at the persistence boundary.
+    """
+
+    __slots__ = (
+        # Parsed from the message
+        'uid', 'account', 'folder', 'message_id', 'from_header', 'from_email', 'to_header',
+        'subject', 'date', 'in_reply_to', 'references', 'raw_content', 'cleaned_content',
+        'fingerprint', 'attachments', 'status', 'x_priority', 'importance',
+        # Set by routing and persistence
+        'department', 'routed_by', 'thread_root', 'near_duplicate_of', 'deferred_actions',
+        'processed_at', '_id'
+    )
+    _FIELDS = frozenset(__slots__)
+
+    def __init__(self, uid: str, account: str, folder: str, message_id: str, from_header: str, from_email: str,
+                 to_header: str, subject: str, date: str, in_reply_to: str, references: str,
+                 cleaned_content: str, fingerprint: Optional[str], attachments: List[Dict],
+                 raw_content: Optional[str] = None, status: str = 'unprocessed', x_priority: str = '',
+                 importance: str = ''):
+        self.uid = uid
+        self.account = account
+        self.folder = folder
+        self.message_id = message_id
+        self.from_header = from_header
+        self.from_email = from_email
+        self.to_header = to_header
+        self.subject = subject
+        self.date = date
+        self.in_reply_to = in_reply_to
+        self.references = references
+        # Only kept when raw content is stored
+        if raw_content is not None:
+            self.raw_content = raw_content
+        self.cleaned_content = cleaned_content
+        self.fingerprint = fingerprint
+        self.attachments = attachments
+        self.status = status
+        self.x_priority = x_priority
+        self.importance = importance
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._FIELDS:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self._FIELDS:
+            raise KeyError(f"EmailRecord has no field {key!r}")
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._FIELDS and hasattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self._FIELDS else default
+
+    def keys(self) -> List[str]:
+        return [field for field in self.__slots__ if hasattr(self, field)]
+
+    def to_document(self) -> Dict:
+        """Build the MongoDB document of this email"""
+        return {field: getattr(self, field) for field in self.keys()}
+
+    def __repr__(self) -> str:
+        return f"EmailRecord(uid={self.get('uid')!r}, from_email={self.get('from_email')!r}, subject={self.get('subject')!r})"
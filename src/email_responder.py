@@ -1,14 +1,23 @@
 import smtplib
 import logging
+from typing import Optional
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from config.settings import Config
+from src.logging_setup import HOT_PATH
 
 class EmailResponder:
     """Handles email response and forwarding operations"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
+        self.digest = None  # DigestBuffer used by departments with digest delivery
+        # Called with (department, first_seen_at) for each forward actually sent, digests included
+        self.on_forwarded = None
+    
+    def set_digest_buffer(self, digest):
+        """Enable digest delivery for departments configured with it"""
+        self.digest = digest
     
     def send_auto_reply(self, to_email: str, department: str) -> bool:
         """Send an automatic reply to the sender based on the department"""
@@ -33,14 +42,28 @@ class EmailResponder:
             # Send email
             self._send_email(msg, to_email)
             
-            self.logger.info(f"Auto-reply sent to {to_email} for {department} department")
+            self.logger.info(f"Auto-reply sent to {to_email} for {department} department", extra=HOT_PATH)
             return True
         except Exception as e:
             self.logger.error(f"Failed to send auto-reply to {to_email}: {e}")
             return False
     
-    def forward_email(self, from_email: str, department: str, email_content: str, original_subject: str = "", date: str = "") -> bool:
-        """Forward an email to the appropriate department"""
+    def forward_email(self, from_email: str, department: str, email_content: str, original_subject: str = "", date: str = "",
+                      first_seen_at: Optional[float] = None) -> bool:
+        """Forward an email to the appropriate department (or queue it for the department's digest)
+        
+        first_seen_at (when the email was found) is passed to on_forwarded once the email is sent.
+        """
+        if self.digest and Config.DEPARTMENT_DELIVERY.get(department) == 'digest':
+            queued = self.digest.add(department, from_email, original_subject, date, email_content, first_seen_at)
+            if queued is not None:
+                self.logger.info(f"Email from {from_email} queued for the {department} digest ({queued} pending)", extra=HOT_PATH)
+                if queued >= self.digest.max_emails:
+                    self.flush_digest(department)
+                return True
+            # The buffer is unavailable; deliver immediately rather than lose the forward
+            self.logger.warning(f"Could not queue {department} digest item, forwarding immediately")
+        
         try:
             department_mapping = Config.DEPARTMENT_EMAILS
             to_email = department_mapping.get(department, Config.DEPARTMENT_EMAILS['general'])
@@ -73,12 +96,60 @@ Please respond to the original sender at: {from_email}
             # Send email
             self._send_email(msg, to_email)
             
-            self.logger.info(f"Email forwarded to {to_email} for department: {department}")
+            self.logger.info(f"Email forwarded to {to_email} for department: {department}", extra=HOT_PATH)
+            self._forwarded(department, first_seen_at)
             return True
         except Exception as e:
             self.logger.error(f"Failed to forward email to {department} department: {e}")
             return False
     
+    def _forwarded(self, department: str, first_seen_at: Optional[float]):
+        if self.on_forwarded and first_seen_at is not None:
+            try:
+                self.on_forwarded(department, first_seen_at)
+            except Exception as e:
+                self.logger.error(f"Error recording forward of {department} email: {e}")
+    
+    def flush_digest(self, department: str) -> int:
+        """Send the queued forwards of a department as digests, returning the number of emails sent"""
+        sent = 0
+        to_email = Config.DEPARTMENT_EMAILS.get(department, Config.DEPARTMENT_EMAILS['general'])
+        while True:
+            batch_id, items = self.digest.claim(department)
+            if not items:
+                return sent
+            
+            subject, body = self.digest.format_digest(department, items)
+            msg = self._construct_email_message(to_email, Config.EMAIL_USERNAME, subject, body)
+            if not self._send_email(msg, to_email):
+                # Keep the items queued for the next flush
+                self.digest.release(batch_id)
+                self.logger.error(f"Failed to send {department} digest of {len(items)} emails")
+                return sent
+            
+            self.digest.complete(batch_id)
+            for item in items:
+                self._forwarded(department, item.get('first_seen_at'))
+            sent += len(items)
+            self.logger.info(f"Digest of {len(items)} emails sent to {to_email} for department: {department}")
+            if len(items) < self.digest.max_emails:
+                return sent
+    
+    def flush_digests(self, force: bool = False) -> int:
+        """Send the digests that are due (or every non-empty one if force), returning the number of emails sent"""
+        if not self.digest:
+            return 0
+        
+        try:
+            if force:
+                departments = [department for department, delivery in Config.DEPARTMENT_DELIVERY.items() if delivery == 'digest']
+            else:
+                departments = self.digest.due_departments()
+            return sum(self.flush_digest(department) for department in departments)
+        except Exception as e:
+            self.logger.error(f"Error flushing digests: {e}")
+            return 0
+    
     def _construct_email_message(self, to_email: str, from_email: str, subject: str, body: str) -> MIMEMultipart:
         """Construct email message with given parameters"""
         msg = MIMEMultipart()
@@ -102,7 +173,7 @@ Please respond to the original sender at: {from_email}
             server.send_message(msg, from_addr=Config.EMAIL_USERNAME, to_addrs=[to_email])
             server.quit()
             
-            self.logger.info(f"Email sent to {to_email}")
+            self.logger.info(f"Email sent to {to_email}", extra=HOT_PATH)
             return True
         except Exception as e:
             self.logger.error(f"Error sending email to {to_email}: {e}")
@@ -2,6 +2,7 @@ import logging
 import re
 from typing import Dict, List, Optional
 from collections import Counter
+from src.logging_setup import HOT_PATH
 
 class EnhancedKeywordClassifier:
     """Enhanced keyword-based email classifier with advanced features"""
@@ -121,7 +122,7 @@ class EnhancedKeywordClassifier:
             # Determine best category
             result = self._determine_category(final_scores)
             
-            self.logger.info(f"Email classified as: {result} (enhanced keyword)")
+            self.logger.info(f"Email classified as: {result} (enhanced keyword)", extra=HOT_PATH)
             return result
             
         except Exception as e:
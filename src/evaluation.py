@@ -0,0 +1,150 @@
+import csv
+import json
+import logging
+import math
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Optional, Tuple
+
+class ClassifierEvaluator:
+    """Measures accuracy against latency for every classification backend on a labeled corpus
+
+    Each backend loaded by UnifiedClassifier, plus its simple keyword fallback,
+    classifies the whole corpus with per-email timing. Memory is measured in a
+    separate pass over a sample so that tracemalloc does not distort the latency
+    figures.
+    """
+
+    FALLBACK = 'simple_fallback'
+
+    def __init__(self, classifier, memory_sample: int = 50):
+        self.logger = logging.getLogger(__name__)
+        self.classifier = classifier
+        self.memory_sample = memory_sample
+
+    @staticmethod
+    def load_corpus_file(path: str, text_field: str = 'text', label_field: str = 'label') -> List[Tuple[str, str]]:
+        """Load (text, label) pairs from a CSV file or a JSON Lines file"""
+        with open(path, newline='', encoding='utf-8') as f:
+            if path.endswith('.csv'):
+                rows = list(csv.DictReader(f))
+            else:
+                rows = [json.loads(line) for line in f if line.strip()]
+        return [(row[text_field], row[label_field].strip().lower()) for row in rows
+                if row.get(text_field) and row.get(label_field)]
+
+    @staticmethod
+    def load_corpus_mongo(db_manager, label_field: str = 'corrected_department', query: Dict = None,
+                          limit: int = 0) -> List[Tuple[str, str]]:
+        """Load (cleaned_content, label) pairs from stored emails with a human-assigned label"""
+        query = query or {label_field: {'$exists': True, '$ne': None}}
+        corpus = []
+        for document in db_manager.iter_emails(query, {'cleaned_content': 1, label_field: 1}):
+            if document.get('cleaned_content') and document.get(label_field):
+                corpus.append((document['cleaned_content'], document[label_field].strip().lower()))
+                if limit and len(corpus) >= limit:
+                    break
+        return corpus
+
+    def backends(self, methods: Optional[List[str]] = None) -> Dict:
+        """The classify functions to evaluate, by name"""
+        available = {name: backend.classify_email for name, backend in self.classifier.classifiers.items()}
+        available[self.FALLBACK] = self.classifier._simple_fallback
+        if methods:
+            missing = [method for method in methods if method not in available]
+            if missing:
+                self.logger.warning(f"Skipping unavailable methods: {', '.join(missing)}")
+            return {method: available[method] for method in methods if method in available}
+        return available
+
+    @staticmethod
+    def _percentile(sorted_values: List[float], fraction: float) -> float:
+        if not sorted_values:
+            return 0.0
+        return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+    def _measure_memory(self, classify, corpus: List[Tuple[str, str]]) -> int:
+        """Peak bytes allocated while classifying a sample of the corpus"""
+        tracemalloc.start()
+        try:
+            for text, _ in corpus[:self.memory_sample]:
+                try:
+                    classify(text)
+                except Exception:
+                    pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def evaluate_backend(self, classify, corpus: List[Tuple[str, str]]) -> Dict:
+        """Classify the corpus with one backend and summarize accuracy, latency and memory"""
+        latencies = []
+        confusion: Dict[str, Dict[str, int]] = {}
+        correct = errors = 0
+        started_at = time.perf_counter()
+        for text, label in corpus:
+            call_started_at = time.perf_counter()
+            try:
+                predicted = classify(text)
+            except Exception as e:
+                self.logger.debug(f"Classification error: {e}")
+                predicted = 'error'
+                errors += 1
+            latencies.append((time.perf_counter() - call_started_at) * 1000)
+            confusion.setdefault(label, {})
+            confusion[label][predicted] = confusion[label].get(predicted, 0) + 1
+            correct += predicted == label
+        elapsed = time.perf_counter() - started_at
+
+        latencies.sort()
+        per_department = {}
+        for label, row in confusion.items():
+            total = sum(row.values())
+            predicted_total = sum(other.get(label, 0) for other in confusion.values())
+            per_department[label] = {
+                'recall': row.get(label, 0) / total if total else 0.0,
+                'precision': row.get(label, 0) / predicted_total if predicted_total else 0.0,
+                'support': total
+            }
+
+        return {
+            'emails': len(corpus),
+            'accuracy': correct / len(corpus) if corpus else 0.0,
+            'errors': errors,
+            'throughput_per_second': len(corpus) / elapsed if elapsed > 0 else 0.0,
+            'mean_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+            'p50_ms': self._percentile(latencies, 0.50),
+            'p99_ms': self._percentile(latencies, 0.99),
+            'peak_memory_kb': round(self._measure_memory(classify, corpus) / 1024, 1),
+            'per_department': per_department,
+            'confusion': confusion
+        }
+
+    def evaluate(self, corpus: List[Tuple[str, str]], methods: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Evaluate every available backend (or the given ones) on the corpus"""
+        report = {}
+        for name, classify in self.backends(methods).items():
+            self.logger.info(f"Evaluating {name} on {len(corpus)} emails")
+            report[name] = self.evaluate_backend(classify, corpus)
+        return report
+
+    @staticmethod
+    def format_report(report: Dict[str, Dict]) -> Iterator[str]:
+        """Yield the lines of a human-readable report, backends ranked by accuracy"""
+        ranked = sorted(report.items(), key=lambda item: (-item[1]['accuracy'], item[1]['mean_ms']))
+        yield f"{'method':<18}{'accuracy':>10}{'errors':>8}{'emails/s':>11}{'mean ms':>10}{'p50 ms':>9}{'p99 ms':>9}{'peak KB':>10}"
+        for name, result in ranked:
+            yield (f"{name:<18}{result['accuracy']:>10.1%}{result['errors']:>8}{result['throughput_per_second']:>11.1f}"
+                   f"{result['mean_ms']:>10.2f}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['peak_memory_kb']:>10.1f}")
+
+        for name, result in ranked:
+            labels = sorted(result['confusion'])
+            predicted = sorted({p for row in result['confusion'].values() for p in row} | set(labels))
+            yield ''
+            yield f"{name}: confusion matrix (rows = true department, columns = predicted)"
+            yield f"{'':<12}" + ''.join(f"{label[:9]:>10}" for label in predicted) + f"{'recall':>10}{'precision':>11}"
+            for label in labels:
+                row = result['confusion'][label]
+                stats = result['per_department'][label]
+                yield (f"{label[:11]:<12}" + ''.join(f"{row.get(p, 0):>10}" for p in predicted)
+                       + f"{stats['recall']:>10.1%}{stats['precision']:>11.1%}")
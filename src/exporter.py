@@ -0,0 +1,158 @@
+import csv
+import json
+import logging
+import sys
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from config.settings import Config
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+class EmailExporter:
+    """Streams processed emails out of MongoDB as CSV, JSON Lines or Parquet"""
+
+    DEFAULT_FIELDS = ['uid', 'message_id', 'from_email', 'subject', 'date', 'department', 'status', 'processed_at']
+    FORMATS = ['csv', 'jsonl', 'parquet']
+
+    # Fields stored as datetimes, exported as timestamps in Parquet
+    TIMESTAMP_FIELDS = {'processed_at', 'updated_at'}
+
+    def __init__(self, db_manager):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+
+    def build_query(self, department: Optional[str] = None, since: Optional[datetime] = None,
+                    until: Optional[datetime] = None) -> Dict:
+        """Build the filter for a department and processed_at range"""
+        query = {}
+        if department:
+            query['department'] = department
+        if since or until:
+            query['processed_at'] = {}
+            if since:
+                query['processed_at']['$gte'] = since
+            if until:
+                query['processed_at']['$lt'] = until
+        return query
+
+    def export(self, output: str, fmt: str = 'csv', fields: List[str] = None, department: Optional[str] = None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None, batch_size: int = None,
+               show_progress: bool = True) -> int:
+        """Export matching emails to a file ('-' writes CSV/JSONL to stdout), returning the row count"""
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        if fmt == 'parquet' and not PYARROW_AVAILABLE:
+            raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+
+        fields = fields or self.DEFAULT_FIELDS
+        batch_size = batch_size or Config.MONGODB_BATCH_SIZE
+        query = self.build_query(department, since, until)
+        projection = {field: 1 for field in fields}
+        projection['_id'] = 1 if '_id' in fields else 0
+
+        total = self.db_manager.collection.count_documents(query)
+        self.logger.info(f"Exporting {total} emails as {fmt} to {output}")
+        rows = self.db_manager.iter_emails(query, projection, batch_size)
+
+        if fmt == 'parquet':
+            count = self._write_parquet(rows, output, fields, batch_size, total, show_progress)
+        else:
+            stream = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8', newline='')
+            try:
+                if fmt == 'csv':
+                    count = self._write_csv(rows, stream, fields, batch_size, total, show_progress)
+                else:
+                    count = self._write_jsonl(rows, stream, fields, batch_size, total, show_progress)
+            finally:
+                if stream is not sys.stdout:
+                    stream.close()
+
+        if show_progress:
+            sys.stderr.write("\n")
+        self.logger.info(f"Exported {count} emails to {output}")
+        return count
+
+    def _report_progress(self, count: int, total: int, show_progress: bool):
+        if not show_progress:
+            return
+        percent = (count / total * 100) if total else 100.0
+        sys.stderr.write(f"\rExported {count}/{total} emails ({percent:.1f}%)")
+        sys.stderr.flush()
+
+    def _format_value(self, value):
+        """Flatten a field value for text formats"""
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, default=str)
+        if value is None:
+            return ''
+        return str(value)
+
+    def _json_default(self, value):
+        """Serialize values JSON does not support natively (datetimes, ObjectIds)"""
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(value)
+
+    def _write_csv(self, rows: Iterator[Dict], stream, fields: List[str], batch_size: int,
+                   total: int, show_progress: bool) -> int:
+        writer = csv.writer(stream)
+        writer.writerow(fields)
+        count = 0
+        for row in rows:
+            writer.writerow([self._format_value(row.get(field)) for field in fields])
+            count += 1
+            if count % batch_size == 0:
+                self._report_progress(count, total, show_progress)
+        self._report_progress(count, total, show_progress)
+        return count
+
+    def _write_jsonl(self, rows: Iterator[Dict], stream, fields: List[str], batch_size: int,
+                     total: int, show_progress: bool) -> int:
+        count = 0
+        for row in rows:
+            record = {field: row.get(field) for field in fields}
+            stream.write(json.dumps(record, default=self._json_default, ensure_ascii=False) + "\n")
+            count += 1
+            if count % batch_size == 0:
+                self._report_progress(count, total, show_progress)
+        self._report_progress(count, total, show_progress)
+        return count
+
+    def _write_parquet(self, rows: Iterator[Dict], output: str, fields: List[str], batch_size: int,
+                       total: int, show_progress: bool) -> int:
+        schema = pa.schema([
+            (field, pa.timestamp('us') if field in self.TIMESTAMP_FIELDS else pa.string())
+            for field in fields
+        ])
+
+        def column_value(field, value):
+            if field in self.TIMESTAMP_FIELDS:
+                return value if isinstance(value, datetime) else None
+            return None if value is None else self._format_value(value)
+
+        count = 0
+        with pq.ParquetWriter(output, schema) as writer:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    count += self._write_parquet_batch(writer, schema, batch, fields, column_value)
+                    batch = []
+                    self._report_progress(count, total, show_progress)
+            if batch:
+                count += self._write_parquet_batch(writer, schema, batch, fields, column_value)
+        self._report_progress(count, total, show_progress)
+        return count
+
+    def _write_parquet_batch(self, writer, schema, batch: List[Dict], fields: List[str], column_value) -> int:
+        columns = [[column_value(field, row.get(field)) for row in batch] for field in fields]
+        writer.write_table(pa.Table.from_arrays([pa.array(column, type=schema.field(i).type)
+                                                 for i, column in enumerate(columns)], schema=schema))
+        return len(batch)
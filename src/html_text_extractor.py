@@ -0,0 +1,102 @@
+import re
+from html.parser import HTMLParser
+from typing import List, Tuple
+
+class HTMLTextExtractor(HTMLParser):
+    """Streaming HTML-to-text converter built on the standard library parser"""
+
+    # Elements whose content is never visible to the reader. <head> is not listed: its end tag is
+    # optional, and what it holds that matters (title, style, script) is skipped on its own
+    SKIP_TAGS = {'script', 'style', 'title', 'noscript', 'template', 'svg', 'object', 'iframe'}
+
+    # Elements that never have a closing tag
+    VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+    # Elements that start a new line of text
+    BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt',
+                  'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4',
+                  'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section',
+                  'table', 'tr', 'td', 'th', 'ul'}
+
+    HIDDEN_STYLE_PATTERN = re.compile(r'(display\s*:\s*none|visibility\s*:\s*hidden)', re.IGNORECASE)
+
+    def __init__(self, max_chars: int = 100000):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.truncated = False
+        self._parts: List[str] = []
+        self._length = 0
+        self._stack: List[Tuple[str, bool]] = []
+        self._skip_depth = 0
+
+    def _is_hidden(self, attrs) -> bool:
+        """Check whether an element's attributes hide it from the reader"""
+        for name, value in attrs:
+            if name == 'hidden':
+                return True
+            if name == 'aria-hidden' and (value or '').lower() == 'true':
+                return True
+            if name == 'style' and value and self.HIDDEN_STYLE_PATTERN.search(value):
+                return True
+        return False
+
+    def _append(self, text: str):
+        """Append text to the output, enforcing the size cap"""
+        if self.truncated:
+            return
+        remaining = self.max_chars - self._length
+        if len(text) >= remaining:
+            text = text[:remaining]
+            self.truncated = True
+        self._parts.append(text)
+        self._length += len(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.BLOCK_TAGS and not self._skip_depth:
+            self._append('\n')
+        if tag in self.VOID_TAGS:
+            return
+        skip = tag in self.SKIP_TAGS or self._is_hidden(attrs)
+        self._stack.append((tag, skip))
+        if skip:
+            self._skip_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing elements carry no content, so only the line break matters
+        if tag in self.BLOCK_TAGS and not self._skip_depth:
+            self._append('\n')
+
+    def handle_endtag(self, tag):
+        if not any(open_tag == tag for open_tag, _ in self._stack):
+            return
+        # Pop implicitly closed elements (e.g. unterminated <p> or <li>) as well
+        while self._stack:
+            open_tag, skip = self._stack.pop()
+            if skip:
+                self._skip_depth -= 1
+            if open_tag == tag:
+                break
+        if tag in self.BLOCK_TAGS and not self._skip_depth:
+            self._append('\n')
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        self._append(data)
+
+    def get_text(self) -> str:
+        """Return the extracted text with whitespace normalized per line"""
+        lines = (' '.join(line.split()) for line in ''.join(self._parts).split('\n'))
+        return '\n'.join(line for line in lines if line)
+
+def html_to_text(html: str, max_chars: int = 100000, chunk_size: int = 65536) -> str:
+    """Convert HTML to plain text, stopping once max_chars of text have been produced"""
+    extractor = HTMLTextExtractor(max_chars=max_chars)
+    for start in range(0, len(html), chunk_size):
+        extractor.feed(html[start:start + chunk_size])
+        if extractor.truncated:
+            break
+    else:
+        extractor.close()
+    return extractor.get_text()
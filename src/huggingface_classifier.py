@@ -1,5 +1,6 @@
 import logging
 from typing import Dict, List, Optional
+from src.logging_setup import HOT_PATH
 try:
     from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
     TRANSFORMERS_AVAILABLE = True
@@ -82,7 +83,7 @@ class HuggingFaceClassifier:
         
         if max(scores.values()) > 0:
             result = max(scores, key=scores.get)
-            self.logger.info(f"Email classified as: {result} (keyword-enhanced)")
+            self.logger.info(f"Email classified as: {result} (keyword-enhanced)", extra=HOT_PATH)
             return result
         
         return 'general'
@@ -111,10 +112,10 @@ class HuggingFaceClassifier:
         
         if max(scores.values()) > 0:
             result = max(scores, key=scores.get)
-            self.logger.info(f"Email classified as: {result} (fallback)")
+            self.logger.info(f"Email classified as: {result} (fallback)", extra=HOT_PATH)
             return result
         
-        self.logger.info("Email classified as: general (fallback)")
+        self.logger.info("Email classified as: general (fallback)", extra=HOT_PATH)
         return 'general'
     
     def train_custom_classifier(self, training_data: List[Dict]):
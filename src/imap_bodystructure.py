@@ -0,0 +1,213 @@
+import base64
+import binascii
+import quopri
+import re
+from email.header import decode_header, make_header
+from typing import Dict, List, Optional
+
+# IMAP response tokens: parentheses, quoted strings, literal markers and atoms
+_TOKEN_PATTERN = re.compile(rb'\(|\)|"(?:[^"\\]|\\.)*"|\{\d+\}|[^\s()"]+')
+
+_OPEN = object()
+_CLOSE = object()
+
+def _tokenize(data) -> List:
+    """Flatten an imaplib response (bytes and (header, literal) tuples) into tokens"""
+    tokens = []
+    for item in data:
+        if isinstance(item, tuple):
+            tokens.extend(_tokenize_bytes(item[0]))
+            tokens.append(item[1])
+        elif isinstance(item, bytes):
+            tokens.extend(_tokenize_bytes(item))
+    return tokens
+
+def _tokenize_bytes(raw: bytes) -> List:
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(raw):
+        token = match.group()
+        if token == b'(':
+            tokens.append(_OPEN)
+        elif token == b')':
+            tokens.append(_CLOSE)
+        elif token.startswith(b'{'):
+            # Literal marker; the literal itself follows as a separate item
+            continue
+        elif token.startswith(b'"'):
+            tokens.append(re.sub(rb'\\(.)', rb'\1', token[1:-1]))
+        elif token.upper() == b'NIL':
+            tokens.append(None)
+        else:
+            tokens.append(token)
+    return tokens
+
+def _build_tree(tokens: List) -> List:
+    """Turn a token stream into nested lists"""
+    root = []
+    stack = [root]
+    for token in tokens:
+        if token is _OPEN:
+            child = []
+            stack[-1].append(child)
+            stack.append(child)
+        elif token is _CLOSE:
+            if len(stack) > 1:
+                stack.pop()
+        else:
+            stack[-1].append(token)
+    return root
+
+def parse_fetch_response(data) -> Dict[str, object]:
+    """Parse a single-message UID FETCH response into a {item name: value} dict"""
+    tree = _build_tree(_tokenize(data))
+    items = next((node for node in tree if isinstance(node, list)), [])
+
+    result = {}
+    for index in range(0, len(items) - 1, 2):
+        key = items[index]
+        if not isinstance(key, bytes):
+            continue
+        # Partial fetches are echoed back as BODY[1]<0>; the origin is irrelevant here
+        name = re.sub(r'<\d+>$', '', key.decode('ascii', errors='ignore').upper())
+        result[name] = items[index + 1]
+    return result
+
+def _text(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='ignore')
+    return ''
+
+def _params(value) -> Dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {_text(value[i]).lower(): _text(value[i + 1]) for i in range(0, len(value) - 1, 2)}
+
+def _decode_filename(name: str) -> str:
+    try:
+        return str(make_header(decode_header(name)))
+    except Exception:
+        return name
+
+def parse_bodystructure(node: List, section: str = '') -> Dict:
+    """Parse a BODYSTRUCTURE list into a tree of parts carrying their IMAP section numbers"""
+    if node and isinstance(node[0], list):
+        # Multipart: child bodies first, then the subtype and extension data
+        subtype_index = 0
+        while subtype_index < len(node) and isinstance(node[subtype_index], list):
+            subtype_index += 1
+        children = node[:subtype_index]
+        subtype = _text(node[subtype_index]).lower() if len(node) > subtype_index else 'mixed'
+        prefix = f"{section}." if section else ''
+        disposition = node[subtype_index + 2] if len(node) > subtype_index + 2 else None
+        return {
+            'section': section,
+            'content_type': f"multipart/{subtype}",
+            'disposition': _text(disposition[0]).lower() if isinstance(disposition, list) else '',
+            'parts': [parse_bodystructure(child, f"{prefix}{i}") for i, child in enumerate(children, 1)]
+        }
+
+    # A non-multipart top-level body is addressed as section 1
+    section = section or '1'
+    main_type = _text(node[0]).lower()
+    sub_type = _text(node[1]).lower()
+    params = _params(node[2]) if len(node) > 2 else {}
+    encoding = _text(node[5]).lower() if len(node) > 5 else '7bit'
+    size = int(node[6]) if len(node) > 6 and isinstance(node[6], bytes) and node[6].isdigit() else 0
+
+    part = {
+        'section': section,
+        'content_type': f"{main_type}/{sub_type}",
+        'charset': params.get('charset', ''),
+        'encoding': encoding,
+        'size': size,
+        'parts': []
+    }
+
+    if main_type == 'text':
+        disposition_index = 9
+    elif main_type == 'message' and sub_type == 'rfc822':
+        disposition_index = 11
+        if len(node) > 8 and isinstance(node[8], list):
+            inner = node[8]
+            inner_section = section if inner and isinstance(inner[0], list) else f"{section}.1"
+            part['parts'] = [parse_bodystructure(inner, inner_section)]
+    else:
+        disposition_index = 8
+
+    disposition = node[disposition_index] if len(node) > disposition_index else None
+    disposition_params = {}
+    part['disposition'] = ''
+    if isinstance(disposition, list) and disposition:
+        part['disposition'] = _text(disposition[0]).lower()
+        disposition_params = _params(disposition[1]) if len(disposition) > 1 else {}
+
+    filename = disposition_params.get('filename') or params.get('name', '')
+    part['filename'] = _decode_filename(filename) if filename else ''
+    return part
+
+def select_text_parts(part: Dict) -> List[Dict]:
+    """Select the text sections to fetch, keeping one rendering per multipart/alternative"""
+    content_type = part['content_type']
+    if content_type.startswith('multipart/') or content_type == 'message/rfc822':
+        if content_type == 'multipart/alternative':
+            for child in part['parts']:
+                if child['content_type'] == 'text/plain' and child['size'] > 0:
+                    return [child]
+            for child in reversed(part['parts']):
+                selected = select_text_parts(child)
+                if selected:
+                    return selected
+            return []
+
+        selected = []
+        for child in part['parts']:
+            selected.extend(select_text_parts(child))
+        return selected
+
+    if part['disposition'] == 'attachment':
+        return []
+    if content_type in ('text/plain', 'text/html'):
+        return [part]
+    return []
+
+def collect_attachments(part: Dict) -> List[Dict]:
+    """Collect name, type and size of every attachment without touching its payload"""
+    content_type = part['content_type']
+    if part['parts']:
+        attachments = []
+        for child in part['parts']:
+            attachments.extend(collect_attachments(child))
+        return attachments
+
+    if content_type.startswith('multipart/'):
+        return []
+    if part['disposition'] == 'attachment' or not content_type.startswith('text/'):
+        return [{
+            'filename': part['filename'],
+            'content_type': content_type,
+            'size': part['size'],
+            'section': part['section']
+        }]
+    return []
+
+def decode_section(payload: Optional[bytes], part: Dict) -> str:
+    """Decode a (possibly truncated) section payload using its transfer encoding and charset"""
+    if not payload:
+        return ''
+
+    encoding = part.get('encoding', '')
+    try:
+        if encoding == 'base64':
+            compact = re.sub(rb'[^A-Za-z0-9+/=]', b'', payload)
+            # A byte cap can cut the data mid-quantum; drop the incomplete tail
+            payload = base64.b64decode(compact[:len(compact) - len(compact) % 4])
+        elif encoding == 'quoted-printable':
+            payload = quopri.decodestring(payload)
+    except (binascii.Error, ValueError):
+        pass
+
+    charset = part.get('charset') or 'utf-8'
+    try:
+        return payload.decode(charset, errors='ignore')
+    except LookupError:
+        return payload.decode('utf-8', errors='ignore')
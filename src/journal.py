@@ -0,0 +1,136 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Set
+
+class PipelineJournal:
+    """Local write-ahead journal of each email's progress through the pipeline
+
+    An SQLite database in WAL mode holds one row per unfinished email with its
+    stage (fetched, classified) and the steps completed since (persisted,
+    replied, forwarded). A row written at classification carries everything
+    needed to finish the email, so after a crash the pipeline can store it and
+    send its reply and forward without refetching or reclassifying. Rows are
+    deleted once every required step is done.
+
+    With synchronous='normal' a commit survives a process crash; 'full' also
+    survives power loss at the cost of an fsync per commit.
+    """
+
+    # The step recorded when each of the pipeline's actions succeeds
+    ACTION_STEPS = {'reply': 'replied', 'forward': 'forwarded'}
+
+    def __init__(self, path: str = 'pipeline_journal.db', synchronous: str = 'normal'):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self._lock = threading.Lock()
+        # The async database writer marks steps from its own thread
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if synchronous == 'full' else 'NORMAL'}")
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                account TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                uid TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                required TEXT NOT NULL DEFAULT '[]',
+                done TEXT NOT NULL DEFAULT '[]',
+                payload TEXT,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_mailbox ON entries (account, folder)')
+
+    @staticmethod
+    def key(account: str, folder: str, uid: str) -> str:
+        return f"{account}/{folder}/{uid}"
+
+    def record_fetched(self, account: str, folder: str, uids: Iterable[str]):
+        """Record a batch of fetched emails in one transaction"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO entries (key, account, folder, uid, stage, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [(self.key(account, folder, uid), account, folder, uid, 'fetched', now) for uid in uids]
+            )
+
+    def record_classified(self, account: str, folder: str, uid: str, document: Dict, actions: List[str]):
+        """Record a routed email with the document and the steps still needed to finish it"""
+        payload = json.dumps(document, default=str)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (key, account, folder, uid, stage, required, done, payload, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.key(account, folder, uid), account, folder, uid, 'classified',
+                 json.dumps(['persisted'] + [self.ACTION_STEPS[action] for action in actions]), '[]', payload, time.time())
+            )
+
+    def mark(self, account: str, folder: str, uid: str, step: str):
+        """Record a completed step ('persisted' or an ACTION_STEPS value), removing the entry once all required steps are done"""
+        key = self.key(account, folder, uid)
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute('SELECT required, done FROM entries WHERE key = ?', (key,)).fetchone()
+                if row:
+                    required, done = set(json.loads(row[0])), set(json.loads(row[1]))
+                    done.add(step)
+                    if required <= done:
+                        self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                    else:
+                        self._conn.execute('UPDATE entries SET done = ?, updated_at = ? WHERE key = ?',
+                                           (json.dumps(sorted(done)), time.time(), key))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def discard(self, account: str, folder: str, uid: str):
+        """Forget an email that needs no further work (e.g. already processed elsewhere)"""
+        with self._lock:
+            self._conn.execute('DELETE FROM entries WHERE key = ?', (self.key(account, folder, uid),))
+
+    def discard_fetched(self, account: str, folder: str, uids: Iterable[str]):
+        """Forget emails of a batch that were fetched but never classified (skipped, failed or abandoned)"""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM entries WHERE key = ? AND stage = 'fetched'",
+                [(self.key(account, folder, uid),) for uid in uids]
+            )
+
+    def uids(self, account: str, folder: str) -> Set[str]:
+        """UIDs of a mailbox that were classified but not finished, which must not be fetched again"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT uid FROM entries WHERE account = ? AND folder = ? AND stage = 'classified'", (account, folder)
+            )
+            return {row[0] for row in rows}
+
+    def unfinished(self, account: str, folder: str) -> List[Dict]:
+        """Entries of a mailbox left unfinished, oldest first, with whether the email was
+        persisted and which actions are still to be sent"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT uid, stage, required, done, payload FROM entries WHERE account = ? AND folder = ? ORDER BY updated_at',
+                (account, folder)
+            ).fetchall()
+        entries = []
+        for uid, stage, required, done, payload in rows:
+            required, done = json.loads(required), set(json.loads(done))
+            entries.append({
+                'uid': uid,
+                'stage': stage,
+                'persisted': 'persisted' in done,
+                'actions': [action for action, step in self.ACTION_STEPS.items() if step in required and step not in done],
+                'document': json.loads(payload) if payload else None
+            })
+        return entries
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,183 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from config.settings import Config
+
+# Pass as extra= on per-email log calls so they are rate limited under load
+HOT_PATH = {'hot_path': True}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+# Worker processes send their records here and the parent writes them (see worker_log_queue)
+_worker_queue = None
+_worker_listener: Optional[logging.handlers.QueueListener] = None
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class HotPathRateLimiter(logging.Filter):
+    """Lets through at most rate hot-path records per second from each call site
+
+    Records logged with extra=HOT_PATH are counted per (file, line); the ones over
+    the limit are dropped before they are queued, and the next record let through
+    from that call site reports how many were dropped. Other records always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._sites: Dict[Tuple[str, int], Dict] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or not getattr(record, 'hot_path', False):
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.setdefault((record.pathname, record.lineno),
+                                          {'tokens': self.rate, 'updated': now, 'dropped': 0})
+            # Token bucket refilled at rate per second, holding at most one second's worth
+            site['tokens'] = min(self.rate, site['tokens'] + (now - site['updated']) * self.rate)
+            site['updated'] = now
+            if site['tokens'] < 1:
+                site['dropped'] += 1
+                return False
+            site['tokens'] -= 1
+            dropped, site['dropped'] = site['dropped'], 0
+
+        if dropped:
+            record.msg = f"{record.getMessage()} ({dropped} similar messages suppressed)"
+            record.args = None
+        return True
+
+def _file_handler(log_file: str) -> logging.Handler:
+    """Build the rotating file handler selected by LOG_ROTATION ('size' or 'time')"""
+    if Config.LOG_ROTATION == 'time':
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file, when=Config.LOG_ROTATE_WHEN, backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    return logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+
+def setup_logging(log_file: str = None, stream=None) -> logging.handlers.QueueListener:
+    """Route all logging through a queue drained by a background listener thread
+
+    Callers only enqueue records; formatting and the file/console writes happen on
+    the listener thread. Console output goes to stream (stdout by default). Safe to
+    call again (e.g. in a forked worker process), which replaces the previous
+    handlers and listener.
+    """
+    global _listener
+    stop_logging()
+
+    formatter = JsonFormatter() if Config.LOG_FORMAT == 'json' else logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    handlers = [_file_handler(log_file or Config.LOG_FILE), logging.StreamHandler(stream or sys.stdout)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    _install_queue_handler(log_queue)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def _install_queue_handler(log_queue):
+    """Make log_queue the only destination of the root logger"""
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(HotPathRateLimiter(Config.LOG_HOT_PATH_RATE))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, Config.LOG_LEVEL.upper(), logging.INFO))
+
+def worker_log_queue():
+    """Return the queue that worker processes log to, creating it on first use
+
+    Call it in the parent before starting workers and pass the queue to
+    setup_worker_logging() in each of them. A second listener thread in the parent
+    writes the workers' records through the same handlers, so only one process
+    ever opens and rotates the log file. Returns None when setup_logging() has not
+    been called, in which case workers keep the handlers they inherited.
+    """
+    global _worker_queue, _worker_listener
+    if _worker_queue is None and _listener is not None:
+        _worker_queue = multiprocessing.Queue(-1)
+        _worker_listener = logging.handlers.QueueListener(
+            _worker_queue, *_listener.handlers, respect_handler_level=True
+        )
+        _worker_listener.start()
+    return _worker_queue
+
+def setup_worker_logging(log_queue):
+    """Send this (worker) process's records to the parent's worker_log_queue()
+
+    The handlers and listener inherited from a forked parent are dropped without
+    being closed, so the child never writes to or rotates the parent's log file.
+    Processes started from this one reuse the same queue.
+    """
+    global _listener, _worker_queue, _worker_listener
+    if log_queue is None:
+        return
+    _listener = None
+    _worker_listener = None
+    _worker_queue = log_queue
+    _install_queue_handler(log_queue)
+
+@contextmanager
+def listeners_paused():
+    """Stop the listener threads while forking, so the child is copied from a single-threaded process
+
+    Records logged meanwhile wait in the queues and are written once the listeners restart.
+    """
+    running = [listener for listener in (_listener, _worker_listener) if listener is not None]
+    for listener in running:
+        listener.stop()
+    try:
+        yield
+    finally:
+        for listener in running:
+            listener.start()
+
+def stop_logging():
+    """Flush queued records and stop the listener threads"""
+    global _listener, _worker_listener, _worker_queue
+    if _worker_listener is not None:
+        _worker_listener.stop()
+        _worker_listener = None
+        _worker_queue = None
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+atexit.register(stop_logging)
@@ -0,0 +1,103 @@
+import hashlib
+import logging
+import re
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+SIGNATURE_BITS = 64
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+_DIGITS_PATTERN = re.compile(r'\d+')
+
+def simhash(text: str, shingle_size: int = 2, min_tokens: int = 5) -> Optional[int]:
+    """Compute a 64-bit SimHash over word shingles, or None if the text is too short"""
+    # Numbers (counters, timestamps, ticket ids) are what usually differs within a storm
+    tokens = [_DIGITS_PATTERN.sub('0', token) for token in _TOKEN_PATTERN.findall(text.lower())]
+    if len(tokens) < min_tokens:
+        return None
+
+    shingles = [' '.join(tokens[i:i + shingle_size]) for i in range(max(1, len(tokens) - shingle_size + 1))]
+    weights = [0] * SIGNATURE_BITS
+    for shingle in shingles:
+        # blake2b is stable across processes, unlike the built-in hash()
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIGNATURE_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    signature = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            signature |= 1 << bit
+    return signature
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+class NearDuplicateDetector:
+    """LSH index of recent SimHash signatures with a sliding time window
+
+    Signatures are split into bands; by the pigeonhole principle two signatures
+    within max_distance bits share at least one identical band whenever
+    bands > max_distance, so only emails in a matching band bucket are compared.
+    """
+
+    def __init__(self, window_seconds: int = 3600, max_distance: int = 6, max_entries: int = 10000, bands: int = 4):
+        self.logger = logging.getLogger(__name__)
+        self.window_seconds = window_seconds
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.bands = max(bands, max_distance + 1)
+        self.band_bits = SIGNATURE_BITS // self.bands
+        self._entries = deque()
+        self._buckets: List[Dict[int, List[Dict]]] = [{} for _ in range(self.bands)]
+
+    def _band_values(self, signature: int) -> List[int]:
+        mask = (1 << self.band_bits) - 1
+        return [(signature >> (band * self.band_bits)) & mask for band in range(self.bands)]
+
+    def _evict(self, now: float):
+        """Drop entries older than the window or beyond the size limit"""
+        while self._entries and (now - self._entries[0]['seen_at'] > self.window_seconds
+                                 or len(self._entries) > self.max_entries):
+            entry = self._entries.popleft()
+            for band, value in enumerate(self._band_values(entry['signature'])):
+                bucket = self._buckets[band].get(value)
+                if bucket is None:
+                    continue
+                bucket.remove(entry)
+                if not bucket:
+                    del self._buckets[band][value]
+
+    def find(self, signature: Optional[int], now: float = None) -> Optional[Dict]:
+        """Find the closest recent entry within max_distance bits of a signature"""
+        if signature is None:
+            return None
+        now = now or time.time()
+        self._evict(now)
+
+        best, best_distance = None, self.max_distance + 1
+        for band, value in enumerate(self._band_values(signature)):
+            for entry in self._buckets[band].get(value, []):
+                distance = hamming_distance(signature, entry['signature'])
+                if distance < best_distance:
+                    best, best_distance = entry, distance
+        return best
+
+    def add(self, signature: Optional[int], uid: str, department: str, from_email: str = '', seen_at: float = None):
+        """Record a classified email's signature"""
+        if signature is None:
+            return
+        entry = {
+            'signature': signature,
+            'uid': uid,
+            'department': department,
+            'from_email': from_email,
+            'seen_at': seen_at or time.time()
+        }
+        self._entries.append(entry)
+        for band, value in enumerate(self._band_values(signature)):
+            self._buckets[band].setdefault(value, []).append(entry)
+        self._evict(entry['seen_at'])
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,75 @@
+import logging
+import queue
+import threading
+from typing import Callable, Dict, List, Optional
+
+class ParallelFetcher:
+    """Fetches a set of UIDs over several IMAP connections at once
+
+    Worker threads each open their own connection and pull UIDs from a shared
+    task queue, so fast connections take more of the work. Results go through a
+    bounded queue and are reassembled in the original UID order.
+    """
+
+    _DONE = object()
+
+    def __init__(self, connection_factory: Callable, connections: int = 4, queue_size: int = 100):
+        self.logger = logging.getLogger(__name__)
+        self.connection_factory = connection_factory
+        self.connections = max(1, connections)
+        self.queue_size = queue_size
+
+    def _worker(self, tasks: queue.Queue, results: queue.Queue, stop: threading.Event):
+        processor = self.connection_factory()
+        try:
+            if not processor.connect_to_email():
+                return
+            while not stop.is_set():
+                try:
+                    index, uid = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                results.put((index, processor._process_single_email(uid)))
+        except Exception as e:
+            self.logger.error(f"Fetch worker failed: {e}")
+        finally:
+            processor.disconnect_from_email()
+            results.put(self._DONE)
+
+    def fetch(self, uids: List[bytes], fallback: Callable[[bytes], Optional[Dict]]) -> List[Dict]:
+        """Fetch and parse emails in UID order; UIDs no worker could fetch go through fallback"""
+        tasks = queue.Queue()
+        for index, uid in enumerate(uids):
+            tasks.put((index, uid))
+
+        results = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=self._worker, args=(tasks, results, stop), name=f"imap-fetch-{i}", daemon=True)
+            for i in range(min(self.connections, len(uids)))
+        ]
+        for worker in workers:
+            worker.start()
+        self.logger.info(f"Fetching {len(uids)} emails over {len(workers)} IMAP connections")
+
+        fetched: Dict[int, Optional[Dict]] = {}
+        finished = 0
+        try:
+            while finished < len(workers):
+                item = results.get()
+                if item is self._DONE:
+                    finished += 1
+                    continue
+                index, email_info = item
+                fetched[index] = email_info
+        finally:
+            stop.set()
+
+        # Anything left (e.g. every connection failed) is fetched on the caller's connection
+        missing = [index for index in range(len(uids)) if index not in fetched]
+        if missing:
+            self.logger.warning(f"{len(missing)} emails were not fetched in parallel, fetching them serially")
+            for index in missing:
+                fetched[index] = fallback(uids[index])
+
+        return [fetched[index] for index in range(len(uids)) if fetched[index]]
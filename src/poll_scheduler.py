@@ -0,0 +1,72 @@
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+class AdaptivePollScheduler:
+    """Chooses the wait before the next mailbox check from observed arrivals and backlog
+
+    The interval tracks an exponentially weighted moving average of the arrival
+    rate, aiming for target_per_poll new emails per check, and stays between the
+    minimum and maximum of the active profile. Idle checks back off
+    geometrically; a check that leaves a backlog (for example because it hit the
+    per-cycle batch cap) schedules the next one immediately.
+    """
+
+    def __init__(self, min_interval: float = 10, max_interval: float = 300, target_per_poll: float = 1.0,
+                 smoothing: float = 0.3, backoff: float = 1.5, profiles: Optional[List[Dict]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_per_poll = target_per_poll
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.profiles = profiles or []
+        self.arrival_rate = 0.0  # Emails per second (moving average)
+        self.interval = min_interval
+        self._last_poll_at: Optional[float] = None
+
+    @staticmethod
+    def parse_profiles(raw: str) -> List[Dict]:
+        """Parse business-hours profiles from JSON, e.g.
+        [{"days": [0, 1, 2, 3, 4], "start": "08:00", "end": "18:00", "min_interval": 5, "max_interval": 60}]
+        Days are 0 (Monday) to 6 (Sunday).
+        """
+        if not raw:
+            return []
+        profiles = json.loads(raw)
+        if not isinstance(profiles, list):
+            raise ValueError("Polling profiles must be a JSON list")
+        return profiles
+
+    def _bounds(self, now: datetime) -> Tuple[float, float]:
+        """Get the (min, max) interval of the profile active at a given time"""
+        current = now.strftime('%H:%M')
+        for profile in self.profiles:
+            if now.weekday() not in profile.get('days', range(7)):
+                continue
+            if profile.get('start', '00:00') <= current < profile.get('end', '24:00'):
+                return (profile.get('min_interval', self.min_interval),
+                        profile.get('max_interval', self.max_interval))
+        return self.min_interval, self.max_interval
+
+    def next_interval(self, poll_started_at: float, arrivals: int, backlog: int = 0, now: datetime = None) -> float:
+        """Record a completed poll and return the seconds to wait, measured from poll_started_at"""
+        min_interval, max_interval = self._bounds(now or datetime.now())
+
+        if self._last_poll_at is not None:
+            elapsed = max(poll_started_at - self._last_poll_at, 1e-3)
+            self.arrival_rate = self.smoothing * (arrivals / elapsed) + (1 - self.smoothing) * self.arrival_rate
+        self._last_poll_at = poll_started_at
+
+        if backlog > 0:
+            # Work is waiting on the server; poll again right away
+            self.interval = min_interval
+            return 0.0
+
+        # Without a rate estimate yet, keep the current interval
+        rate_interval = self.target_per_poll / self.arrival_rate if self.arrival_rate > 0 else self.interval
+        if arrivals == 0:
+            rate_interval = max(rate_interval, self.interval * self.backoff)
+        self.interval = min(max(rate_interval, min_interval), max_interval)
+        return self.interval
@@ -0,0 +1,122 @@
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from email.header import decode_header, make_header
+from typing import Any, Dict, Iterable, List, Optional
+
+def _decoded(value: str) -> str:
+    try:
+        return str(make_header(decode_header(value or '')))
+    except Exception:
+        return value or ''
+
+# X-Priority: 1 (Highest) to 5 (Lowest); only the leading digit matters ("1 (Highest)")
+_X_PRIORITY_SCORES = {'1': 3, '2': 2, '4': -1, '5': -1}
+_IMPORTANCE_SCORES = {'high': 2, 'low': -1}
+
+class PriorityScorer:
+    """Scores emails from their headers alone, before any body is fetched or classified
+
+    Higher is more urgent. X-Priority 1-2 and Importance: high raise the score,
+    X-Priority 4-5 and Importance: low (bulk mail) lower it, each subject keyword
+    adds keyword_weight, and allowlisted senders (an address or an @domain) add
+    sender_weight.
+    """
+
+    def __init__(self, keywords: List[str], senders: List[str], keyword_weight: int = 3, sender_weight: int = 4):
+        self.keywords = [keyword.strip().lower() for keyword in keywords if keyword.strip()]
+        self.senders = {sender.strip().lower() for sender in senders if sender.strip()}
+        self.keyword_weight = keyword_weight
+        self.sender_weight = sender_weight
+
+    def score(self, email_data) -> int:
+        """Score an email record or a dict of its subject, from_email, x_priority and importance"""
+        score = _X_PRIORITY_SCORES.get((email_data.get('x_priority') or '').strip()[:1], 0)
+        score += _IMPORTANCE_SCORES.get((email_data.get('importance') or '').strip().lower(), 0)
+
+        subject = _decoded(email_data.get('subject')).lower()
+        score += self.keyword_weight * sum(1 for keyword in self.keywords if keyword in subject)
+
+        from_email = (email_data.get('from_email') or '').lower()
+        if from_email and (from_email in self.senders or '@' + from_email.rsplit('@', 1)[-1] in self.senders):
+            score += self.sender_weight
+        return score
+
+class AgingPriorityQueue:
+    """Priority queue in which waiting raises an item's priority by one point per aging_seconds
+
+    Aging grows at the same rate for every item, so ordering by
+    score + (now - enqueued_at) / aging_seconds equals ordering by the fixed key
+    score - enqueued_at / aging_seconds, which lets a plain heap serve it. Low
+    scores therefore still come out once they have waited long enough.
+    """
+
+    def __init__(self, aging_seconds: float = 600):
+        self.aging_seconds = aging_seconds
+        self._heap = []
+        self._counter = itertools.count()  # Keeps equal priorities in insertion order
+
+    def push(self, item: Any, score: float, enqueued_at: float = None):
+        enqueued_at = time.time() if enqueued_at is None else enqueued_at
+        key = score - enqueued_at / self.aging_seconds if self.aging_seconds > 0 else score
+        heapq.heappush(self._heap, (-key, next(self._counter), item))
+
+    def pop(self) -> Any:
+        return heapq.heappop(self._heap)[2]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+class FirstSeenTimes:
+    """When this process first saw each UID, the clock for priority aging and time-to-forward
+
+    The Date header is set by the sender and can be skewed by hours or days, so it
+    would let a backdated email jump the queue and distort the latency metric.
+    """
+
+    def __init__(self):
+        self._times: Dict[str, float] = {}
+
+    def get(self, uid: str) -> float:
+        """First-seen time of uid, which is now if it was not seen before"""
+        return self._times.setdefault(uid, time.time())
+
+    def forget(self, uid: str):
+        self._times.pop(uid, None)
+
+    def retain(self, uids: Iterable[str]):
+        """Drop the UIDs that are no longer waiting (e.g. handled by another instance)"""
+        waiting = set(uids)
+        self._times = {uid: seen for uid, seen in self._times.items() if uid in waiting}
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+class ForwardLatencyTracker:
+    """Keeps recent time-to-forward samples (first seen to forward) per department"""
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, department: str, seconds: float):
+        self._samples.setdefault(department, deque(maxlen=self.max_samples)).append(max(0.0, seconds))
+
+    def percentile(self, department: str, fraction: float = 0.99) -> Optional[float]:
+        samples = sorted(self._samples.get(department, ()))
+        if not samples:
+            return None
+        return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+    def summary(self) -> Dict[str, Dict]:
+        """p50/p99 seconds and sample count per department"""
+        return {
+            department: {
+                'count': len(samples),
+                'p50': self.percentile(department, 0.50),
+                'p99': self.percentile(department, 0.99)
+            }
+            for department, samples in self._samples.items()
+        }
@@ -0,0 +1,48 @@
+import logging
+import time
+from collections import OrderedDict
+
+class ReplySuppressor:
+    """Allows at most one auto-reply per sender within a time window
+
+    Open windows are cached in a bounded in-memory map and recorded in the
+    auto_reply_log collection (expired by a TTL index), so workers and restarts
+    agree on who was already replied to. This also breaks reply loops with
+    other auto-responders.
+    """
+
+    def __init__(self, db_manager, window_seconds: int = 3600, capacity: int = 10000):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.window_seconds = window_seconds
+        self.capacity = capacity
+        self._windows: 'OrderedDict[str, float]' = OrderedDict()  # sender -> window end
+
+    def _remember(self, sender: str, expires_at: float):
+        self._windows[sender] = expires_at
+        self._windows.move_to_end(sender)
+        while len(self._windows) > self.capacity:
+            self._windows.popitem(last=False)
+
+    def should_send(self, to_email: str) -> bool:
+        """Return True if an auto-reply may be sent now, opening the sender's window"""
+        sender = (to_email or '').strip().lower()
+        now = time.time()
+        expires_at = self._windows.get(sender)
+        if expires_at and expires_at > now:
+            return False
+
+        claimed = self.db_manager.claim_auto_reply(sender, self.window_seconds)
+        if claimed is False:
+            # Another worker (or an earlier run) replied; the exact end is not needed, only that it is open
+            self._remember(sender, now + min(self.window_seconds, 60))
+            return False
+        # Without the database, the in-memory window still suppresses repeats in this process
+        self._remember(sender, now + self.window_seconds)
+        return True
+
+    def release(self, to_email: str):
+        """Forget a window opened for a reply that could not be sent"""
+        sender = (to_email or '').strip().lower()
+        self._windows.pop(sender, None)
+        self.db_manager.release_auto_reply(sender)
@@ -0,0 +1,92 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from config.settings import Config
+
+def sender_keys(from_email: str) -> List[str]:
+    """Histogram keys for a sender: the full address, then its domain unless it is a shared (free-mail) domain"""
+    from_email = (from_email or '').strip().lower()
+    if '@' not in from_email:
+        return []
+    domain = from_email.rsplit('@', 1)[1]
+    if domain in Config.SENDER_PRIOR_SHARED_DOMAINS:
+        return [f"email:{from_email}"]
+    return [f"email:{from_email}", f"domain:{domain}"]
+
+class SenderPrior:
+    """Per-sender and per-domain department histograms used as a routing fast path
+
+    Histograms live in the sender_stats collection and are cached here in a
+    bounded LRU whose entries expire after ttl_seconds. Only classifier decisions
+    are counted (on insert, and from audits of the prior), so the prior never
+    reinforces its own routing.
+    """
+
+    def __init__(self, db_manager, min_count: int = 5, min_share: float = 0.9,
+                 capacity: int = 10000, ttl_seconds: int = 600):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.min_count = min_count
+        self.min_share = min_share
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._cache: 'OrderedDict[str, Dict]' = OrderedDict()
+
+    def _histograms(self, keys: List[str]) -> Dict[str, Dict[str, int]]:
+        """Get histograms from the cache, loading missing or expired ones in one query"""
+        now = time.time()
+        histograms, missing = {}, []
+        for key in keys:
+            entry = self._cache.get(key)
+            if entry and now - entry['loaded_at'] < self.ttl_seconds:
+                self._cache.move_to_end(key)
+                histograms[key] = entry['counts']
+            else:
+                missing.append(key)
+
+        if missing:
+            loaded = self.db_manager.get_sender_histograms(missing)
+            for key in missing:
+                counts = loaded.get(key, {})
+                self._store(key, counts, now)
+                histograms[key] = counts
+        return histograms
+
+    def _store(self, key: str, counts: Dict[str, int], loaded_at: float):
+        self._cache[key] = {'counts': counts, 'loaded_at': loaded_at}
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def lookup(self, from_email: str) -> Optional[str]:
+        """Return the department a sender consistently lands in, if its history is conclusive"""
+        keys = sender_keys(from_email)
+        if not keys:
+            return None
+
+        histograms = self._histograms(keys)
+        # The exact address is more specific than the domain, so it is checked first
+        for key in keys:
+            counts = histograms.get(key) or {}
+            total = sum(counts.values())
+            if total < self.min_count:
+                continue
+            department, count = max(counts.items(), key=lambda item: item[1])
+            if count / total >= self.min_share:
+                return department
+            # A mixed address history is conclusive on its own; do not fall back to the domain
+            return None
+        return None
+
+    def observe(self, from_email: str, department: str):
+        """Count an audit's classifier result in the stored and cached histograms"""
+        self.db_manager.record_sender_department(from_email, department)
+        self.record(from_email, department)
+
+    def record(self, from_email: str, department: str):
+        """Count a classified email in cached histograms (the database is updated on insert)"""
+        for key in sender_keys(from_email):
+            entry = self._cache.get(key)
+            if entry:
+                entry['counts'][department] = entry['counts'].get(department, 0) + 1
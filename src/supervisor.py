@@ -0,0 +1,182 @@
+import logging
+import multiprocessing
+import queue
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from config.settings import Config
+from src.logging_setup import worker_log_queue
+
+class MailboxSupervisor:
+    """Runs one worker process per account/folder and restarts workers that crash
+
+    A worker that exits with code 0 (e.g. after a graceful shutdown) is not
+    restarted; one that exits with an error or is killed by a signal is, with
+    exponential backoff. The supervisor stops once every worker has exited cleanly.
+    """
+
+    # Counters reported by workers that are summed into the aggregated stats
+    COUNTERS = ('cycles', 'fetched', 'processed', 'errors')
+
+    def __init__(self, mailboxes: List[Dict], worker_target: Callable, check_interval: int = 60, db_manager=None):
+        self.logger = logging.getLogger(__name__)
+        self.mailboxes = mailboxes
+        self.worker_target = worker_target
+        self.check_interval = check_interval
+        self.db_manager = db_manager
+        self.status_queue = multiprocessing.Queue()
+        self.workers: Dict[str, Dict] = {}
+        self.running = True
+
+    @staticmethod
+    def mailbox_key(mailbox: Dict) -> str:
+        """Identify a mailbox as account/folder"""
+        return f"{mailbox['username']}/{mailbox['folder']}"
+
+    def _start_worker(self, mailbox: Dict):
+        """Start (or restart) the worker process for a mailbox"""
+        key = self.mailbox_key(mailbox)
+        process = multiprocessing.Process(
+            target=self.worker_target,
+            args=(mailbox, self.check_interval, self.status_queue, worker_log_queue()),
+            name=f"mailbox-{key}"
+        )
+        process.start()
+
+        worker = self.workers.setdefault(key, {
+            'mailbox': mailbox,
+            'restarts': 0,
+            'carried': {counter: 0 for counter in self.COUNTERS},
+            'status': {}
+        })
+        worker['process'] = process
+        worker['started_at'] = time.time()
+        worker['next_restart'] = None
+        worker['status'] = {'state': 'starting', 'pid': process.pid}
+        self.logger.info(f"Started worker for {key} (pid {process.pid})")
+
+    def _drain_status_queue(self):
+        """Apply all pending status updates sent by workers"""
+        while True:
+            try:
+                update = self.status_queue.get_nowait()
+            except queue.Empty:
+                return
+            worker = self.workers.get(update.get('key'))
+            if worker and update.get('pid') == worker['process'].pid:
+                worker['status'] = update
+
+    def _check_workers(self):
+        """Detect dead workers and restart crashed ones with exponential backoff"""
+        now = time.time()
+        for key, worker in self.workers.items():
+            process = worker['process']
+            if process.is_alive() or worker['status'].get('state') == 'stopped':
+                continue
+
+            if worker['next_restart'] is None:
+                # Keep the counters of the dead process so aggregated stats stay cumulative
+                for counter in self.COUNTERS:
+                    worker['carried'][counter] += worker['status'].get(counter, 0)
+
+                if process.exitcode == 0:
+                    worker['status'] = {'state': 'stopped', 'pid': process.pid, 'exitcode': 0}
+                    self.logger.info(f"Worker for {key} exited cleanly, not restarting it")
+                    continue
+
+                # A worker that stayed up for a while gets a fresh backoff
+                if now - worker['started_at'] > Config.SUPERVISOR_MAX_RESTART_DELAY:
+                    worker['restarts'] = 0
+                worker['restarts'] += 1
+                delay = min(Config.SUPERVISOR_RESTART_DELAY * 2 ** (worker['restarts'] - 1),
+                            Config.SUPERVISOR_MAX_RESTART_DELAY)
+                worker['next_restart'] = now + delay
+                worker['status'] = {'state': 'crashed', 'pid': process.pid, 'exitcode': process.exitcode}
+                self.logger.error(f"Worker for {key} exited with code {process.exitcode}, restarting in {delay} seconds")
+            elif now >= worker['next_restart']:
+                self._start_worker(worker['mailbox'])
+
+    def get_status(self) -> Dict:
+        """Get per-mailbox status and stats aggregated over all workers"""
+        mailboxes = {}
+        totals = {counter: 0 for counter in self.COUNTERS}
+        for key, worker in self.workers.items():
+            status = worker['status']
+            counters = {counter: worker['carried'][counter] + status.get(counter, 0) for counter in self.COUNTERS}
+            for counter, value in counters.items():
+                totals[counter] += value
+            mailboxes[key] = {
+                'state': status.get('state', 'unknown'),
+                'pid': status.get('pid'),
+                'restarts': worker['restarts'],
+                'last_cycle_at': status.get('last_cycle_at'),
+                **counters
+            }
+
+        return {'mailboxes': mailboxes, 'totals': totals}
+
+    def log_status(self):
+        """Log per-mailbox status and aggregated stats"""
+        status = self.get_status()
+        stored = self.db_manager.get_mailbox_stats() if self.db_manager else {}
+
+        self.logger.info("=== Supervisor Status ===")
+        for key, mailbox in status['mailboxes'].items():
+            self.logger.info(
+                f"{key}: {mailbox['state']} (pid {mailbox['pid']}, restarts {mailbox['restarts']}) - "
+                f"cycles {mailbox['cycles']}, fetched {mailbox['fetched']}, processed {mailbox['processed']}, "
+                f"errors {mailbox['errors']}, stored {stored.get(key, 0)}, last cycle {mailbox['last_cycle_at'] or 'never'}"
+            )
+        totals = status['totals']
+        self.logger.info(
+            f"Total: cycles {totals['cycles']}, fetched {totals['fetched']}, "
+            f"processed {totals['processed']}, errors {totals['errors']}"
+        )
+        self.logger.info("=========================")
+
+    def run(self) -> bool:
+        """Start all workers and supervise them until stopped"""
+        if not self.mailboxes:
+            self.logger.error("No mailboxes configured for supervisor mode")
+            return False
+
+        self.logger.info(f"Starting supervisor for {len(self.mailboxes)} mailboxes")
+        try:
+            for mailbox in self.mailboxes:
+                self._start_worker(mailbox)
+
+            last_report = time.time()
+            while self.running:
+                self._drain_status_queue()
+                self._check_workers()
+                if all(worker['status'].get('state') == 'stopped' for worker in self.workers.values()):
+                    self.logger.info("Every worker has exited cleanly, stopping the supervisor")
+                    break
+                if time.time() - last_report >= self.check_interval:
+                    self.log_status()
+                    last_report = time.time()
+                time.sleep(1)
+            return True
+        except Exception as e:
+            self.logger.error(f"Critical error in supervisor: {e}")
+            return False
+        finally:
+            self.stop()
+
+    def stop(self, timeout: Optional[float] = 30):
+        """Ask every worker to shut down gracefully, killing any that do not exit in time"""
+        self.running = False
+        for worker in self.workers.values():
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+
+        deadline = time.time() + timeout
+        for key, worker in self.workers.items():
+            worker['process'].join(max(0, deadline - time.time()))
+            if worker['process'].is_alive():
+                self.logger.warning(f"Worker for {key} did not stop in time, killing it")
+                worker['process'].kill()
+                worker['process'].join()
+
+        self._drain_status_queue()
+        self.logger.info(f"Supervisor stopped at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -0,0 +1,59 @@
+import logging
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+_MESSAGE_ID_PATTERN = re.compile(r'<[^<>\s]+>')
+
+def parse_message_ids(header: str) -> List[str]:
+    """Extract the <message-id> tokens of an In-Reply-To or References header"""
+    return _MESSAGE_ID_PATTERN.findall(header or '')
+
+class ThreadIndex:
+    """Maps Message-IDs to their thread root and department
+
+    Lookups go to an in-memory LRU first and fall back to the email_threads
+    collection, so workers and restarts share the same routing.
+    """
+
+    def __init__(self, db_manager, capacity: int = 10000):
+        self.logger = logging.getLogger(__name__)
+        self.db_manager = db_manager
+        self.capacity = capacity
+        self._cache: 'OrderedDict[str, Dict]' = OrderedDict()
+
+    def _remember(self, message_id: str, thread: Dict):
+        self._cache[message_id] = thread
+        self._cache.move_to_end(message_id)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def find_thread(self, email_data: Dict) -> Optional[Dict]:
+        """Find the thread an email replies to, checking the closest parent first"""
+        # In-Reply-To names the direct parent; References lists ancestors oldest first
+        candidates = parse_message_ids(email_data.get('in_reply_to', ''))
+        candidates += list(reversed(parse_message_ids(email_data.get('references', ''))))
+        candidates = list(dict.fromkeys(candidate for candidate in candidates
+                                        if candidate != email_data.get('message_id')))
+        if not candidates:
+            return None
+
+        for message_id in candidates:
+            if message_id in self._cache:
+                self._cache.move_to_end(message_id)
+                return self._cache[message_id]
+
+        threads = self.db_manager.get_threads(candidates)
+        for message_id in candidates:
+            if message_id in threads:
+                self._remember(message_id, threads[message_id])
+                return threads[message_id]
+        return None
+
+    def add(self, message_id: str, department: str, root: Optional[str] = None):
+        """Record an email as part of a thread (a new thread if no root is given)"""
+        if not message_id:
+            return
+        thread = {'root': root or message_id, 'department': department}
+        self._remember(message_id, thread)
+        self.db_manager.save_thread(message_id, thread['root'], department)
@@ -1,6 +1,8 @@
 import logging
+import random
 from typing import Dict, List, Optional
 from config.settings import Config
+from src.logging_setup import HOT_PATH
 
 class UnifiedClassifier:
     """Unified classifier that can use multiple classification methods"""
@@ -10,6 +12,14 @@ class UnifiedClassifier:
         self.preferred_method = preferred_method
         self.classifiers = {}
         
+        # Optional per-sender fast path (see set_sender_prior)
+        self.sender_prior = None
+        self.audit_rate = Config.SENDER_PRIOR_AUDIT_RATE
+        self.prior_stats = {'lookups': 0, 'hits': 0, 'audits': 0, 'disagreements': 0}
+        
+        # Optional worker processes for batch classification (see set_pool)
+        self.pool = None
+        
         # Initialize available classifiers
         self._initialize_classifiers()
         
@@ -51,14 +61,73 @@ class UnifiedClassifier:
         except Exception as e:
             self.logger.warning(f"MonkeyLearn classifier not available: {e}")
     
-    def classify_email(self, email_content: str) -> str:
-        """Classify email using the preferred method or fallback"""
+    def set_sender_prior(self, sender_prior):
+        """Enable the per-sender routing fast path"""
+        self.sender_prior = sender_prior
+    
+    def classify_email(self, email_content: str, from_email: str = None) -> str:
+        """Classify email using the sender prior, the preferred method or fallback"""
+        return self.route_email(email_content, from_email)['department']
+    
+    def set_pool(self, pool):
+        """Classify batches in a ClassifierPool instead of in this process"""
+        self.pool = pool
+    
+    def route_email(self, email_content: str, from_email: str = None) -> Dict:
+        """Classify email and report whether the sender prior or a classifier decided"""
+        route = self._route_from_prior(email_content, from_email)
+        if route:
+            return route
+        return {'department': self._classify_content(email_content), 'method': 'classifier'}
+    
+    def _route_from_prior(self, email_content: str, from_email: str = None) -> Optional[Dict]:
+        """Route by the sender's history, if it is conclusive"""
+        if self.sender_prior and from_email:
+            self.prior_stats['lookups'] += 1
+            department = self.sender_prior.lookup(from_email)
+            if department:
+                self.prior_stats['hits'] += 1
+                # Occasionally run the full classifier anyway to measure how often the prior is wrong
+                if random.random() < self.audit_rate:
+                    self.prior_stats['audits'] += 1
+                    full_result = self._classify_content(email_content)
+                    # Emails the prior routes are not counted, so audits are how it learns it went wrong
+                    self.sender_prior.observe(from_email, full_result)
+                    if full_result != department:
+                        self.prior_stats['disagreements'] += 1
+                        self.logger.info(f"Sender prior for {from_email} chose {department}, classifier chose {full_result}", extra=HOT_PATH)
+                return {'department': department, 'method': 'sender_prior'}
+        return None
+    
+    def route_batch(self, email_contents: List[str], from_emails: List[str] = None) -> List[Dict]:
+        """Classify several emails, returning one route per email in the same order"""
+        from_emails = from_emails or [None] * len(email_contents)
+        if not self.pool:
+            return [self.route_email(content, from_email) for content, from_email in zip(email_contents, from_emails)]
+        
+        # Sender lookups need the database, so they stay here; only classification goes to the workers
+        routes = [self._route_from_prior(content, from_email) for content, from_email in zip(email_contents, from_emails)]
+        pending = [index for index, route in enumerate(routes) if route is None]
+        departments = self.pool.classify([email_contents[index] for index in pending])
+        for index, department in zip(pending, departments):
+            routes[index] = {'department': department, 'method': 'classifier'}
+        return routes
+    
+    def get_prior_stats(self) -> Dict:
+        """Get sender prior hit rate and audited disagreement rate"""
+        stats = dict(self.prior_stats)
+        stats['hit_rate'] = stats['hits'] / stats['lookups'] if stats['lookups'] else 0.0
+        stats['disagreement_rate'] = stats['disagreements'] / stats['audits'] if stats['audits'] else 0.0
+        return stats
+    
+    def _classify_content(self, email_content: str) -> str:
+        """Classify email content using the preferred method or fallback"""
         
         # Try preferred method first
         if self.preferred_method in self.classifiers:
             try:
                 result = self.classifiers[self.preferred_method].classify_email(email_content)
-                self.logger.info(f"Classification successful with {self.preferred_method}: {result}")
+                self.logger.info(f"Classification successful with {self.preferred_method}: {result}", extra=HOT_PATH)
                 return result
             except Exception as e:
                 self.logger.error(f"Failed with preferred method {self.preferred_method}: {e}")
@@ -70,7 +139,7 @@ class UnifiedClassifier:
             if method in self.classifiers and method != self.preferred_method:
                 try:
                     result = self.classifiers[method].classify_email(email_content)
-                    self.logger.info(f"Classification successful with fallback {method}: {result}")
+                    self.logger.info(f"Classification successful with fallback {method}: {result}", extra=HOT_PATH)
                     return result
                 except Exception as e:
                     self.logger.error(f"Failed with fallback method {method}: {e}")
@@ -97,10 +166,10 @@ class UnifiedClassifier:
         
         if max(scores.values()) > 0:
             result = max(scores, key=scores.get)
-            self.logger.info(f"Simple fallback classification: {result}")
+            self.logger.info(f"Simple fallback classification: {result}", extra=HOT_PATH)
             return result
         
-        self.logger.info("Simple fallback classification: general")
+        self.logger.info("Simple fallback classification: general", extra=HOT_PATH)
         return 'general'
     
     def get_available_methods(self) -> List[str]:
@@ -0,0 +1,60 @@
+import os
+import sys
+import pytest
+
+# Import the application the way main.py does, from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from helpers import FakeClassifier, FakeMailbox, FakeResponder
+
+@pytest.fixture
+def db_manager(monkeypatch):
+    """A connected DatabaseManager backed by an in-memory mongomock client"""
+    mongomock = pytest.importorskip('mongomock')
+    from mongomock.gridfs import enable_gridfs_integration
+    from src import database
+
+    enable_gridfs_integration()
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(database, 'MongoClient', lambda uri: client)
+    manager = database.DatabaseManager()
+    assert manager.connect()
+    yield manager
+    manager.disconnect()
+
+@pytest.fixture
+def other_db_manager(db_manager):
+    """A second DatabaseManager on the same database, as another instance would have"""
+    from src.database import DatabaseManager
+    other = DatabaseManager()
+    for name, value in vars(db_manager).items():
+        if name not in ('instance_id', 'logger') and not name.startswith('_lease_heartbeat'):
+            setattr(other, name, value)
+    return other
+
+@pytest.fixture
+def make_system(db_manager, monkeypatch, tmp_path):
+    """Build EmailSegregationSystems on the mongomock database with fake IMAP, classifier and SMTP"""
+    import main
+    from config.settings import Config
+
+    monkeypatch.setattr(Config, 'validate_config', classmethod(lambda cls: True))
+    monkeypatch.setattr(Config, 'JOURNAL_PATH', str(tmp_path / 'journal.db'))
+    monkeypatch.setattr(Config, 'NEAR_DUPLICATE_DETECTION', False)
+    monkeypatch.setattr(main, 'UnifiedClassifier', lambda preferred_method=None: FakeClassifier())
+    monkeypatch.setattr(main, 'EmailResponder', FakeResponder)
+    monkeypatch.setattr(main.signal, 'signal', lambda signum, handler: None)
+    # Every system shares the database; each gets its own lease owner id like a separate process
+    monkeypatch.setattr(db_manager, 'disconnect', lambda: None)
+    monkeypatch.setattr(db_manager, 'connect', lambda: True)
+
+    def build(mailbox: FakeMailbox, manager=None):
+        monkeypatch.setattr(main, 'DatabaseManager', lambda: manager or db_manager)
+        system = main.EmailSegregationSystem()
+        processor = system.email_processor
+        processor.username, processor.folder = 'support@example.com', 'inbox'
+        processor.mail = mailbox
+        processor.connect_to_email = lambda: True
+        processor.fetch_uids = mailbox.fetch
+        return system
+    return build
@@ -0,0 +1,82 @@
+"""Fakes standing in for the IMAP server, classifiers and SMTP in pipeline tests"""
+from src.email_record import EmailRecord
+
+class FakeMailbox:
+    """Serves UID searches and fetches from a dict of EmailRecords instead of an IMAP server"""
+
+    def __init__(self, messages=None):
+        self.messages = messages or {}
+        self.unfetchable = set()  # UIDs whose fetch fails
+
+    def select(self, folder):
+        return 'OK', [b'']
+
+    def uid(self, command, *args):
+        assert command == 'search'
+        return 'OK', [' '.join(self.messages).encode()]
+
+    def fetch(self, uids):
+        return [self.messages[uid.decode()] for uid in uids
+                if uid.decode() in self.messages and uid.decode() not in self.unfetchable]
+
+    def close(self):
+        pass
+
+    def logout(self):
+        pass
+
+class FakeClassifier:
+    """Routes every email to one department, counting what it classified"""
+
+    def __init__(self, department='order'):
+        self.department = department
+        self.classified = []
+
+    def route_email(self, email_content, from_email=None):
+        return self.route_batch([email_content])[0]
+
+    def route_batch(self, email_contents, from_emails=None):
+        self.classified.extend(email_contents)
+        return [{'department': self.department, 'method': 'classifier'} for _ in email_contents]
+
+    def set_sender_prior(self, sender_prior):
+        pass
+
+    def set_pool(self, pool):
+        pass
+
+    def get_prior_stats(self):
+        return {'hits': 0, 'lookups': 0, 'hit_rate': 0.0, 'audits': 0, 'disagreements': 0, 'disagreement_rate': 0.0}
+
+class FakeResponder:
+    """Records auto-replies and forwards instead of sending them"""
+
+    def __init__(self):
+        self.replies, self.forwards = [], []
+        self.on_forwarded = None
+
+    def send_auto_reply(self, to_email, department):
+        self.replies.append(to_email)
+        return True
+
+    def forward_email(self, from_email, department, content, subject='', date='', first_seen_at=None):
+        self.forwards.append(subject)
+        if self.on_forwarded and first_seen_at is not None:
+            self.on_forwarded(department, first_seen_at)
+        return True
+
+    def flush_digests(self, force=False):
+        return 0
+
+    def set_digest_buffer(self, digest):
+        pass
+
+def make_record(uid, account='support@example.com', folder='inbox', **fields):
+    values = {
+        'message_id': f"<{uid}@example.com>", 'from_header': f"Customer {uid} <customer{uid}@example.com>",
+        'from_email': f"customer{uid}@example.com", 'to_header': account, 'subject': f"Order question {uid}",
+        'date': 'Mon, 1 Jan 2024 10:00:00 +0000', 'in_reply_to': '', 'references': '',
+        'cleaned_content': f"Where is my order {uid}?", 'fingerprint': None, 'attachments': []
+    }
+    values.update(fields)
+    return EmailRecord(uid=str(uid), account=account, folder=folder, **values)
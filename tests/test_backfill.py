@@ -0,0 +1,70 @@
+from helpers import FakeMailbox, make_record
+
+def mailbox_with(count):
+    return FakeMailbox({str(uid): make_record(uid) for uid in range(1, count + 1)})
+
+def stored_uids(db_manager):
+    return sorted(int(uid) for uid in db_manager.get_processed_uids('support@example.com', 'inbox'))
+
+def checkpoint(db_manager, criteria='ALL'):
+    return db_manager.get_backfill_checkpoint(f"support@example.com/inbox/{criteria}")
+
+def test_backfill_stores_everything_and_completes(db_manager, make_system, monkeypatch):
+    from config.settings import Config
+    monkeypatch.setattr(Config, 'BACKFILL_BATCH_SIZE', 3)
+    system = make_system(mailbox_with(7))
+    assert system.run_backfill('ALL')
+    assert stored_uids(db_manager) == list(range(1, 8))
+    assert checkpoint(db_manager)['status'] == 'completed'
+    assert checkpoint(db_manager)['last_uid'] == '7'
+
+def test_fetch_failure_stops_at_the_missing_uid_and_resumes(db_manager, make_system, monkeypatch):
+    from config.settings import Config
+    monkeypatch.setattr(Config, 'BACKFILL_BATCH_SIZE', 4)
+    mailbox = mailbox_with(10)
+    mailbox.unfetchable = {'6'}
+    assert not make_system(mailbox).run_backfill('ALL')
+    # The batch 5-8 was partly stored, but the checkpoint stays before the missing UID
+    assert stored_uids(db_manager) == [1, 2, 3, 4, 5, 7, 8]
+    assert checkpoint(db_manager)['last_uid'] == '5'
+
+    mailbox.unfetchable = set()
+    assert make_system(mailbox).run_backfill('ALL')
+    assert stored_uids(db_manager) == list(range(1, 11))
+    assert checkpoint(db_manager)['status'] == 'completed'
+
+def test_write_failure_does_not_advance_the_checkpoint(db_manager, make_system, monkeypatch):
+    from config.settings import Config
+    monkeypatch.setattr(Config, 'BACKFILL_BATCH_SIZE', 4)
+    mailbox = mailbox_with(8)
+    system = make_system(mailbox)
+    insert_emails = db_manager.insert_emails
+    calls = []
+
+    def flaky_insert(emails):
+        calls.append(len(emails))
+        # The second batch hits a database outage (insert_emails logs it and returns nothing)
+        return [] if len(calls) == 2 else insert_emails(emails)
+
+    monkeypatch.setattr(db_manager, 'insert_emails', flaky_insert)
+    assert not system.run_backfill('ALL')
+    assert stored_uids(db_manager) == [1, 2, 3, 4]
+    assert checkpoint(db_manager)['last_uid'] == '4'
+
+    monkeypatch.setattr(db_manager, 'insert_emails', insert_emails)
+    assert make_system(mailbox).run_backfill('ALL')
+    assert stored_uids(db_manager) == list(range(1, 9))
+
+def test_policies_send_or_defer_actions(db_manager, make_system, monkeypatch):
+    from config.settings import Config
+    monkeypatch.setattr(Config, 'BACKFILL_REPLY_POLICY', 'skip')
+    monkeypatch.setattr(Config, 'BACKFILL_FORWARD_POLICY', 'defer')
+    system = make_system(mailbox_with(3))
+    assert system.run_backfill('ALL')
+    assert system.responder.replies == [] and system.responder.forwards == []
+    assert [email['deferred_actions'] for email in db_manager.get_deferred_emails()] == [['forward']] * 3
+
+    system = make_system(mailbox_with(3))
+    assert system.deliver_deferred()
+    assert len(system.responder.forwards) == 3
+    assert list(db_manager.get_deferred_emails()) == []
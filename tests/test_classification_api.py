@@ -0,0 +1,180 @@
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from config.settings import Config
+from helpers import FakeMailbox
+from src.classification_api import ClassificationApi, LatencyHistogram, MicroBatcher
+
+class RecordingHandler:
+    """Returns each item upper-cased and records the batches it was given"""
+
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def __call__(self, items):
+        if self.gate:
+            self.gate.wait(5)
+        self.batches.append(list(items))
+        return [item.upper() for item in items]
+
+@pytest.fixture
+def make_batcher():
+    batchers = []
+
+    def build(handler, **options):
+        batcher = MicroBatcher(handler, **options)
+        batcher.start()
+        batchers.append(batcher)
+        return batcher
+    yield build
+    for batcher in batchers:
+        batcher.stop()
+
+def test_requests_inside_the_window_share_a_batch(make_batcher):
+    handler = RecordingHandler()
+    batcher = make_batcher(handler, max_batch_size=10, window_seconds=0.2)
+    pending = [batcher.submit(item) for item in ('a', 'b', 'c')]
+    for item in pending:
+        assert item.done.wait(5)
+    assert [item.result for item in pending] == ['A', 'B', 'C']
+    assert handler.batches == [['a', 'b', 'c']]
+    assert all(item.batch_size == 3 for item in pending)
+
+def test_batches_are_capped_at_max_batch_size(make_batcher):
+    handler = RecordingHandler()
+    batcher = make_batcher(handler, max_batch_size=2, window_seconds=0.2)
+    pending = [batcher.submit(item) for item in 'abcde']
+    for item in pending:
+        assert item.done.wait(5)
+    assert [len(batch) for batch in handler.batches] == [2, 2, 1]
+
+def test_full_queue_rejects_new_requests(make_batcher):
+    gate = threading.Event()
+    batcher = make_batcher(RecordingHandler(gate), max_batch_size=1, window_seconds=0, queue_limit=1)
+    first = batcher.submit('a')
+    while batcher.queue_depth:  # Wait until the worker holds the first item
+        time.sleep(0.001)
+    batcher.submit('b')
+    with pytest.raises(queue.Full):
+        batcher.submit('c')
+    gate.set()
+    assert first.done.wait(5)
+    assert batcher.stats['rejected'] == 1
+
+def test_cancelled_requests_are_not_classified(make_batcher):
+    gate = threading.Event()
+    handler = RecordingHandler(gate)
+    batcher = make_batcher(handler, max_batch_size=1, window_seconds=0)
+    first = batcher.submit('a')
+    abandoned = batcher.submit('b')
+    abandoned.cancel()
+    last = batcher.submit('c')
+    gate.set()
+    assert last.done.wait(5) and first.done.wait(5)
+    assert handler.batches == [['a'], ['c']]
+    assert not abandoned.done.is_set()
+    assert batcher.stats['abandoned'] == 1
+
+def test_handler_errors_reach_every_request_of_the_batch(make_batcher):
+    def failing(items):
+        raise RuntimeError('model unavailable')
+    batcher = make_batcher(failing, window_seconds=0.05)
+    pending = [batcher.submit(item) for item in 'ab']
+    for item in pending:
+        assert item.done.wait(5)
+    assert [item.error for item in pending] == ['model unavailable'] * 2
+    assert batcher.stats['errors'] == 1
+
+def test_counters_stay_consistent_under_concurrent_rejections(make_batcher):
+    gate = threading.Event()
+    batcher = make_batcher(RecordingHandler(gate), max_batch_size=1, window_seconds=0, queue_limit=1)
+    batcher.submit('a')
+
+    def flood():
+        for _ in range(500):
+            try:
+                batcher.submit('b')
+            except queue.Full:
+                pass
+    threads = [threading.Thread(target=flood) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    gate.set()
+    batcher.stop()
+    stats = batcher.get_stats()
+    assert stats['rejected'] + stats['requests'] == 2001
+
+def test_latency_histogram_percentiles_fall_in_the_right_bucket():
+    histogram = LatencyHistogram(buckets_per_doubling=4)
+    for _ in range(98):
+        histogram.record('/classify', 0.010)
+    histogram.record('/classify', 0.5)
+    histogram.record('/classify', 1000)  # Beyond the last bucket
+    summary = histogram.summary()['/classify']
+    assert summary['count'] == 100
+    assert 0.010 <= summary['p50'] < 0.010 * 2 ** 0.25
+    assert 0.5 <= summary['p99'] < 0.5 * 2 ** 0.25
+    assert histogram.summary().keys() == {'/classify'}
+
+class FakeClassifier:
+    def route_batch(self, contents, from_emails):
+        return [{'department': 'payment' if 'charged' in content else 'general', 'method': 'classifier'}
+                for content in contents]
+
+    def get_classification_details(self, content):
+        return {'keyword': 'general'}
+
+@pytest.fixture
+def api():
+    api = ClassificationApi(FakeClassifier(), port=0, window_seconds=0.01, max_request_bytes=1000)
+    api.start()
+    yield api
+    api.stop()
+
+def post(api, path, body):
+    request = urllib.request.Request(f"http://127.0.0.1:{api.server.server_port}{path}", data=body, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read()), response.headers
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read()), e.headers
+
+def test_classify_endpoint(api):
+    status, body, headers = post(api, '/classify', json.dumps({'content': 'I was charged twice'}).encode())
+    assert status == 200 and body == {'department': 'payment', 'method': 'classifier'}
+    assert headers['X-Batch-Size'] == '1'
+    status, body, _ = post(api, '/classify_details', json.dumps({'content': 'hello'}).encode())
+    assert status == 200 and body == {'methods': {'keyword': 'general'}}
+
+def test_bad_requests_are_rejected(api):
+    assert post(api, '/classify', b'{"subject": "no content"}')[0] == 400
+    assert post(api, '/classify', b'not json')[0] == 400
+    assert post(api, '/unknown', b'{}')[0] == 404
+    assert post(api, '/classify', json.dumps({'content': 'x' * 2000}).encode())[0] == 413
+
+def test_metrics_report_batcher_counters(api):
+    post(api, '/classify', json.dumps({'content': 'hello'}).encode())
+    with urllib.request.urlopen(f"http://127.0.0.1:{api.server.server_port}/metrics", timeout=5) as response:
+        metrics = json.loads(response.read())
+    assert metrics['api']['/classify']['requests'] == 1
+    assert metrics['api']['/classify']['abandoned'] == 0
+    assert metrics['latency_seconds']['/classify']['count'] == 1
+
+def test_api_mode_without_the_sender_prior_does_not_connect_to_the_database(db_manager, make_system, monkeypatch):
+    monkeypatch.setattr(Config, 'API_PORT', 0)
+    monkeypatch.setattr(Config, 'SENDER_PRIOR', False)
+    connects = []
+    system = make_system(FakeMailbox())
+    monkeypatch.setattr(db_manager, 'connect', lambda: connects.append(True) or True)
+    system._stop_event.set()  # Stop serving right away
+    assert system.run_api()
+    assert connects == []
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from helpers import FakeMailbox, make_record
+from src.classifier_pool import ClassifierPool
+
+PARENT = os.getpid()
+
+class LengthClassifier:
+    """Classifies by text length; with fail_in_workers set it only works in the parent"""
+
+    def __init__(self, fail_in_workers=False):
+        self.fail_in_workers = fail_in_workers
+
+    def _classify_content(self, text):
+        if os.getpid() != PARENT:
+            if self.fail_in_workers:
+                raise RuntimeError('worker failure')
+            if text == 'crash':
+                os._exit(1)
+        return 'long' if len(text) > 5 else 'short'
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def build(classifier, **options):
+        options = {'workers': 2, 'batch_size': 2, 'timeout': 10, **options}
+        pool = ClassifierPool(classifier, **options)
+        pool.start()
+        pools.append(pool)
+        return pool
+    yield build
+    for pool in pools:
+        pool.stop()
+
+TEXTS = ['hi', 'a longer text', 'yo', 'another long one', 'ok']
+EXPECTED = ['short', 'long', 'short', 'long', 'short']
+
+def test_results_come_back_in_input_order(make_pool):
+    pool = make_pool(LengthClassifier())
+    assert pool.classify(TEXTS) == EXPECTED
+    assert pool.stats['batches'] == 3 and pool.stats['fallbacks'] == 0
+
+def test_workers_are_recycled_by_the_host(make_pool):
+    pool = make_pool(LengthClassifier(), max_tasks=1)
+    host_pid = pool.host.pid
+    for _ in range(5):
+        assert pool.classify(TEXTS) == EXPECTED
+    assert pool.host.pid == host_pid and pool.stats['fallbacks'] == 0
+
+def test_failed_batches_back_off_then_give_up(make_pool):
+    pool = make_pool(LengthClassifier(fail_in_workers=True), max_restarts=1, restart_delay=60)
+    assert pool.classify(TEXTS) == EXPECTED
+    assert pool.stats['restarts'] == 1 and pool.stats['fallbacks'] == 3
+
+    # Backing off: classified in the parent without asking the host
+    assert pool.classify(TEXTS[:2]) == EXPECTED[:2]
+    assert pool.host is not None and not pool.active
+
+    pool._retry_at = 0
+    assert pool.classify(TEXTS) == EXPECTED
+    assert pool.host is None
+    # Shut down for good; later calls still work in the parent
+    assert pool.classify(TEXTS[:2]) == EXPECTED[:2]
+    assert not pool.check_health()
+
+def test_crashed_worker_is_replaced_and_the_pool_recovers(make_pool):
+    pool = make_pool(LengthClassifier(), timeout=2, restart_delay=0)
+    assert pool.classify(['crash', 'hi']) == ['short', 'short']
+    assert pool.stats['restarts'] == 1
+    assert pool.classify(TEXTS) == EXPECTED
+    assert pool.check_health()
+    assert pool.stats['restarts'] == 1
+
+def test_health_check_answers_while_workers_are_up(make_pool):
+    pool = make_pool(LengthClassifier())
+    assert pool.check_health()
+
+class RecordingPool:
+    """Stands in for the worker pool so only the decision of what to pool is tested"""
+    stats = {'texts': 0, 'batches': 0, 'restarts': 0, 'fallbacks': 0}
+
+    def stop(self):
+        pass
+
+def test_thread_replies_are_routed_before_pooling(db_manager, make_system, monkeypatch):
+    from config.settings import Config
+    monkeypatch.setattr(Config, 'THREAD_ROUTING', True)
+    first = make_record(1, message_id='<root@example.com>')
+    system = make_system(FakeMailbox({'1': first}))
+    system._process_fetched_emails([])
+
+    reply = make_record(2, in_reply_to='<root@example.com>', references='<root@example.com>')
+    mailbox = FakeMailbox({'1': first, '2': reply, '3': make_record(3)})
+    system = make_system(mailbox)
+    system.classifier_pool = RecordingPool()
+    system._process_fetched_emails(['1'])
+
+    # Only the email without a thread went to the classifier
+    assert system.classifier.classified == ['Where is my order 3?']
+    assert db_manager.collection.find_one({'uid': '2'})['routed_by'] == 'thread'
@@ -0,0 +1,61 @@
+import os
+import stat
+import threading
+
+import pytest
+
+from config.settings import Config
+from helpers import FakeMailbox
+from src.daemon import DaemonServer, send_command
+
+@pytest.fixture
+def serve(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'DAEMON_SOCKET', str(tmp_path / 'daemon.sock'))
+    servers = []
+
+    def start(handlers):
+        server = DaemonServer(handlers)
+        server.start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.stop()
+
+def failing(request):
+    raise RuntimeError('classifier unavailable')
+
+def test_requests_and_responses_are_json_lines(serve):
+    server = serve({'echo': lambda request: {'text': request['text']}, 'fail': failing})
+    assert send_command('echo', text='hello') == {'ok': True, 'text': 'hello'}
+    assert send_command('fail') == {'ok': False, 'error': 'classifier unavailable'}
+    assert send_command('missing') == {'ok': False, 'error': 'Unknown command: missing'}
+    assert stat.S_IMODE(os.stat(server.address).st_mode) == 0o600
+
+def test_stale_socket_is_replaced_and_removed_on_stop(serve):
+    open(Config.DAEMON_SOCKET, 'w').close()
+    server = serve({'ping': lambda request: {'pid': os.getpid()}})
+    assert send_command('ping')['pid'] == os.getpid()
+    server.stop()
+    assert not os.path.exists(Config.DAEMON_SOCKET)
+
+def test_connections_are_served_concurrently(serve):
+    release = threading.Event()
+    serve({'block': lambda request: {'released': release.wait(5)}, 'ping': lambda request: {}})
+    blocked = threading.Thread(target=send_command, args=('block',))
+    blocked.start()
+    try:
+        assert send_command('ping', timeout=2) == {'ok': True}
+    finally:
+        release.set()
+        blocked.join()
+
+def test_classify_does_not_wait_for_a_running_cycle(make_system):
+    system = make_system(FakeMailbox())
+    system._daemon_lock = threading.Lock()
+    with system._daemon_lock:  # A cycle in progress
+        result = []
+        worker = threading.Thread(target=lambda: result.append(system._daemon_classify({'text': 'Where is my order?'})))
+        worker.start()
+        worker.join(2)
+        assert result == [{'department': 'order', 'method': 'classifier'}]
@@ -0,0 +1,136 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from config.settings import Config
+
+def make_email(uid, account='support@example.com', folder='inbox', **fields):
+    email_data = {
+        'uid': uid,
+        'account': account,
+        'folder': folder,
+        'message_id': f"<{uid}@example.com>",
+        'from_email': 'customer@example.com',
+        'subject': f"Subject {uid}",
+        'date': 'Mon, 1 Jan 2024 10:00:00 +0000',
+        'cleaned_content': 'My order has not arrived',
+        'department': 'order'
+    }
+    email_data.update(fields)
+    return email_data
+
+def test_duplicate_from_another_mailbox_is_recorded_as_processed(db_manager):
+    stored = make_email('10', account='sales@example.com', message_id='<shared@example.com>')
+    assert db_manager.insert_email(stored)
+
+    # The same message CC'd to a second monitored mailbox, under that mailbox's UID
+    copy = make_email('77', account='support@example.com', message_id='<shared@example.com>')
+    assert db_manager.email_exists(copy)
+    assert db_manager.record_skipped_uid(copy)
+    assert db_manager.record_skipped_uid(copy)  # Recording twice is harmless
+
+    assert db_manager.get_processed_uids('support@example.com', 'inbox') == ['77']
+    assert db_manager.get_processed_uids('sales@example.com', 'inbox') == ['10']
+
+def test_leased_uids_are_skipped_by_other_instances(db_manager, other_db_manager):
+    assert db_manager.claim_email_uids('a', 'inbox', ['1', '2', '3']) == ['1', '2', '3']
+    assert other_db_manager.claim_email_uids('a', 'inbox', ['1', '2', '3', '4']) == ['4']
+    # Re-claiming our own lease succeeds
+    assert db_manager.claim_email_uids('a', 'inbox', ['1']) == ['1']
+
+def test_released_leases_can_be_claimed(db_manager, other_db_manager):
+    db_manager.claim_email_uids('a', 'inbox', ['1', '2'])
+    # Only the owner's release has an effect
+    assert other_db_manager.release_email_uids('a', 'inbox', ['1']) == 0
+    assert db_manager.release_email_uids('a', 'inbox', ['1']) == 1
+    assert other_db_manager.claim_email_uids('a', 'inbox', ['1', '2']) == ['1']
+
+def test_expired_leases_are_free(db_manager, other_db_manager):
+    db_manager.claim_email_uids('a', 'inbox', ['1'])
+    db_manager.leases.update_many({}, {'$set': {'expires_at': datetime.now(timezone.utc) - timedelta(seconds=1)}})
+    assert other_db_manager.claim_email_uids('a', 'inbox', ['1']) == ['1']
+
+def test_claims_respect_the_limit_and_mailbox(db_manager, other_db_manager):
+    assert db_manager.claim_email_uids('a', 'inbox', ['1', '2', '3'], limit=2) == ['1', '2']
+    # Equal UIDs in another folder are different messages
+    assert other_db_manager.claim_email_uids('a', 'archive', ['1']) == ['1']
+
+def test_compressed_fields_are_decoded_however_the_document_is_read(db_manager, monkeypatch):
+    monkeypatch.setattr(Config, 'COMPRESS_CONTENT', True)
+    monkeypatch.setattr(Config, 'COMPRESSION_MIN_BYTES', 16)
+    content = 'My order has not arrived yet. ' * 20
+    assert db_manager.insert_email(make_email('1', cleaned_content=content))
+    assert isinstance(db_manager.collection.find_one({'uid': '1'})['cleaned_content'], dict)
+
+    def read():
+        [document] = db_manager.iter_emails({'uid': '1'}, {'_id': 0})
+        return document
+    assert read()['cleaned_content'] == content
+    assert dict(read())['cleaned_content'] == content
+    assert {**read()}['cleaned_content'] == content
+    assert content in read().values()
+    assert dict(read().items())['cleaned_content'] == content
+    assert read().copy()['cleaned_content'] == content
+    assert read().pop('cleaned_content') == content
+    assert json.loads(json.dumps(read(), default=str))['cleaned_content'] == content
+
+@pytest.mark.parametrize('projection, fields', [
+    (None, {'_id', 'processed_at', 'subject', 'uid'}),
+    ({'subject': 1, '_id': 0}, {'subject'}),
+    ({'subject': 1}, {'_id', 'subject'}),
+    ({'_id': 0, 'processed_at': 0, 'cleaned_content': 0}, {'subject', 'uid'}),
+])
+def test_keyset_pages_cover_every_email_once_whatever_the_projection(db_manager, projection, fields):
+    base = datetime(2024, 1, 1)
+    for uid in range(7):
+        db_manager.collection.insert_one(make_email(str(uid), processed_at=base + timedelta(minutes=uid // 2)))
+
+    subjects, after = [], None
+    while True:
+        page = db_manager.get_emails_by_department_page('order', page_size=3, after=after, projection=projection)
+        for document in page['emails']:
+            assert fields <= set(document) and not ({'_id', 'processed_at'} - fields) & set(document)
+            subjects.append(document['subject'])
+        after = page['next_cursor']
+        if not after:
+            break
+    # Newest first; emails sharing a processed_at are ordered by _id
+    assert subjects == [f"Subject {uid}" for uid in range(6, -1, -1)]
+
+def test_archived_emails_move_in_batches_and_stay_processed(db_manager):
+    old = datetime.now() - timedelta(days=400)
+    for uid in range(5):
+        db_manager.collection.insert_one(make_email(str(uid), processed_at=old))
+    db_manager.collection.insert_one(make_email('recent', processed_at=datetime.now()))
+
+    assert db_manager.archive_emails(older_than_days=365, batch_size=2, compress=False) == 5
+    assert [document['uid'] for document in db_manager.collection.find()] == ['recent']
+    assert db_manager.archive.count_documents({}) == 5
+    # Tombstones keep archived emails out of the fetch and duplicate checks
+    assert sorted(db_manager.get_processed_uids('support@example.com', 'inbox')) == ['0', '1', '2', '3', '4', 'recent']
+    assert db_manager.email_exists(make_email('99', message_id='<3@example.com>'))
+    assert db_manager.email_exists(make_email('98', message_id='<other@example.com>', subject='Subject 4'))
+    # Nothing is left to move on a rerun
+    assert db_manager.archive_emails(older_than_days=365, batch_size=2, compress=False) == 0
+
+def test_interrupted_archival_can_be_rerun(db_manager):
+    old = datetime.now() - timedelta(days=400)
+    for uid in range(3):
+        db_manager.collection.insert_one(make_email(str(uid), processed_at=old))
+    # A previous run copied one email but stopped before deleting it
+    db_manager.archive.insert_one(db_manager.collection.find_one({'uid': '0'}))
+
+    assert db_manager.archive_emails(older_than_days=365, compress=False) == 3
+    assert db_manager.collection.count_documents({}) == 0
+    assert db_manager.archive.count_documents({}) == 3
+    assert db_manager.tombstones.count_documents({}) == 3
+
+def test_bulk_insert_returns_only_the_emails_actually_inserted(db_manager):
+    assert db_manager.insert_email(make_email('1'))
+    emails = [make_email('1'), make_email('2'), make_email('3')]
+    inserted = db_manager.insert_emails(emails)
+    assert [email['uid'] for email in inserted] == ['2', '3']
+    assert all('_id' in email for email in inserted)
+    assert db_manager.collection.count_documents({}) == 3
+    assert db_manager.insert_emails([]) == []
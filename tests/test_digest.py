@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from config.settings import Config
+from helpers import FakeMailbox, make_record
+from src.digest import DigestBuffer
+from src.email_responder import EmailResponder
+
+class RecordingResponder(EmailResponder):
+    """The real responder (digests included), with messages recorded instead of sent over SMTP"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    def _send_email(self, msg, to_email):
+        self.sent.append(msg['Subject'])
+        return True
+
+@pytest.fixture
+def order_digest(monkeypatch):
+    monkeypatch.setitem(Config.DEPARTMENT_DELIVERY, 'order', 'digest')
+    monkeypatch.setattr(Config, 'DIGEST_MAX_EMAILS', 3)
+
+def queue(buffer, department, count):
+    for number in range(count):
+        buffer.add(department, f"customer{number}@example.com", f"Question {number}", '', 'Where is my order?')
+
+def test_departments_are_due_by_size_or_age(db_manager):
+    buffer = DigestBuffer(db_manager, max_emails=3, max_age_seconds=600)
+    queue(buffer, 'order', 3)
+    queue(buffer, 'general', 1)
+    assert buffer.due_departments() == ['order']
+    assert sorted(buffer.due_departments(datetime.now() + timedelta(seconds=601))) == ['general', 'order']
+
+def test_claimed_items_are_not_claimed_twice_until_released(db_manager):
+    buffer = DigestBuffer(db_manager, max_emails=2)
+    queue(buffer, 'order', 3)
+    first, items = buffer.claim('order')
+    assert [item['subject'] for item in items] == ['Question 0', 'Question 1']
+    second, items = buffer.claim('order')
+    assert [item['subject'] for item in items] == ['Question 2']
+
+    buffer.release(first)
+    buffer.complete(second)
+    _, items = buffer.claim('order')
+    assert [item['subject'] for item in items] == ['Question 0', 'Question 1']
+    assert db_manager.get_digest_backlog() == {}
+
+def test_failed_digest_stays_queued(db_manager, monkeypatch):
+    responder = RecordingResponder()
+    responder.set_digest_buffer(DigestBuffer(db_manager, max_emails=10))
+    queue(responder.digest, 'order', 2)
+    monkeypatch.setattr(responder, '_send_email', lambda msg, to_email: False)
+    assert responder.flush_digest('order') == 0
+    assert db_manager.get_digest_backlog()['order']['count'] == 2
+
+def test_forward_latency_is_recorded_when_the_digest_is_sent(db_manager, make_system, order_digest, monkeypatch):
+    import main
+    monkeypatch.setattr(main, 'EmailResponder', RecordingResponder)
+    system = make_system(FakeMailbox({'1': make_record(1), '2': make_record(2)}))
+    system._check_and_process_emails()
+
+    # Queued, not sent: the emails have not reached the department yet
+    assert not any('Digest' in subject for subject in system.responder.sent)
+    assert system.forward_latency.summary() == {}
+
+    assert system.responder.flush_digests(force=True) == 2
+    assert [subject for subject in system.responder.sent if 'Digest' in subject] == [
+        f"{Config.FORWARD_SUBJECT} - Order Department Digest (2 emails)"
+    ]
+    assert system.forward_latency.summary()['order']['count'] == 2
@@ -0,0 +1,74 @@
+from email import message_from_string
+
+import pytest
+
+from config.settings import Config
+from helpers import FakeMailbox, make_record
+from src.email_processor import EmailProcessor
+
+def make_processor(uids, monkeypatch):
+    processor = EmailProcessor(username='support@example.com', password='secret', folder='inbox')
+    processor.mail = FakeMailbox({str(uid): make_record(uid) for uid in uids})
+    monkeypatch.setattr(processor, 'fetch_uids', processor.mail.fetch)
+    return processor
+
+def lease_claimer(db_manager):
+    return lambda uids, limit: db_manager.claim_email_uids('support@example.com', 'inbox', uids, limit)
+
+def test_cap_applies_without_leases(monkeypatch):
+    processor = make_processor(range(1, 11), monkeypatch)
+    emails = processor.fetch_emails(['1'], max_emails=4)
+    assert [email['uid'] for email in emails] == ['2', '3', '4', '5']
+    assert processor.pending_count == 5
+
+def test_leases_are_claimed_before_the_cap(db_manager, other_db_manager, monkeypatch):
+    first = make_processor(range(1, 11), monkeypatch)
+    second = make_processor(range(1, 11), monkeypatch)
+
+    emails = first.fetch_emails([], lease_claimer(db_manager), max_emails=4)
+    assert [email['uid'] for email in emails] == ['1', '2', '3', '4']
+    assert first.pending_count == 6
+
+    # The second instance skips the leased UIDs instead of stopping at them
+    emails = second.fetch_emails([], lease_claimer(other_db_manager), max_emails=4)
+    assert [email['uid'] for email in emails] == ['5', '6', '7', '8']
+    assert second.pending_count == 2
+
+def test_no_backlog_when_everything_left_is_leased_elsewhere(db_manager, other_db_manager, monkeypatch):
+    db_manager.claim_email_uids('support@example.com', 'inbox', [str(uid) for uid in range(1, 9)])
+    processor = make_processor(range(1, 11), monkeypatch)
+    emails = processor.fetch_emails([], lease_claimer(other_db_manager), max_emails=4)
+    assert [email['uid'] for email in emails] == ['9', '10']
+    assert processor.pending_count == 0
+
+def test_arrivals_count_only_uids_the_previous_fetch_did_not_see(monkeypatch):
+    processor = make_processor(range(1, 11), monkeypatch)
+    processor.fetch_emails([], max_emails=4)
+    assert processor.arrival_count == 10 and processor.pending_count == 6
+
+    # Two new emails arrive; the capped backlog is not counted as arrivals again
+    processor.mail.messages.update({str(uid): make_record(uid) for uid in (11, 12)})
+    processor.fetch_emails(['1', '2', '3', '4'], max_emails=4)
+    assert processor.arrival_count == 2 and processor.pending_count == 4
+
+    processor.fetch_emails([str(uid) for uid in range(1, 13)], max_emails=4)
+    assert processor.arrival_count == 0 and processor.pending_count == 0
+
+@pytest.mark.parametrize('store_raw', [True, False])
+def test_raw_content_is_stored_only_when_enabled(db_manager, monkeypatch, store_raw):
+    monkeypatch.setattr(Config, 'STORE_RAW_CONTENT', store_raw)
+    processor = EmailProcessor(username='support@example.com', password='secret', folder='inbox')
+    message = message_from_string("From: Customer <customer@example.com>\nSubject: Late order\nMessage-ID: <1@example.com>\n\nbody")
+    record = processor._build_email_info(b'1', message, "  Where is   my order?\n\n", [])
+
+    assert record['from_email'] == 'customer@example.com' and record['cleaned_content']
+    assert ('raw_content' in record) is store_raw
+    assert record.get('raw_content') == ("  Where is   my order?\n\n" if store_raw else None)
+    with pytest.raises(KeyError):
+        record['not_a_field'] = 'x'
+
+    record['department'] = 'order'
+    assert db_manager.insert_email(record.to_document())
+    stored = db_manager.collection.find_one({'uid': '1'})
+    assert ('raw_content' in stored) is store_raw
+    assert stored['cleaned_content'] == record['cleaned_content']
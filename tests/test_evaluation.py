@@ -0,0 +1,66 @@
+import json
+
+from src.evaluation import ClassifierEvaluator
+
+class KeywordBackend:
+    """Labels an email by the first department name it mentions"""
+
+    def classify_email(self, text):
+        if 'crash' in text:
+            raise RuntimeError('model failed')
+        return next((label for label in ('order', 'support') if label in text), 'general')
+
+class FakeUnifiedClassifier:
+    classifiers = {'keywords': KeywordBackend()}
+
+    def _simple_fallback(self, text):
+        return 'order'
+
+CORPUS = [
+    ('where is my order', 'order'),
+    ('order arrived broken', 'support'),
+    ('need support please', 'support'),
+    ('app crash on login', 'support'),
+]
+
+def test_corpus_files_load_from_csv_and_json_lines(tmp_path):
+    csv_path = tmp_path / 'corpus.csv'
+    csv_path.write_text('text,label\nwhere is my order, Order \n,support\n', encoding='utf-8')
+    jsonl_path = tmp_path / 'corpus.jsonl'
+    jsonl_path.write_text(json.dumps({'body': 'help', 'department': 'support'}) + '\n\n', encoding='utf-8')
+
+    assert ClassifierEvaluator.load_corpus_file(str(csv_path)) == [('where is my order', 'order')]
+    assert ClassifierEvaluator.load_corpus_file(str(jsonl_path), 'body', 'department') == [('help', 'support')]
+
+def test_labeled_emails_load_from_the_database(db_manager):
+    db_manager.collection.insert_many([
+        {'uid': '1', 'cleaned_content': 'where is my order', 'corrected_department': 'Order'},
+        {'uid': '2', 'cleaned_content': 'unlabeled'},
+        {'uid': '3', 'cleaned_content': 'refund please', 'corrected_department': 'billing'},
+    ])
+    corpus = ClassifierEvaluator.load_corpus_mongo(db_manager)
+    assert sorted(corpus) == [('refund please', 'billing'), ('where is my order', 'order')]
+    assert len(ClassifierEvaluator.load_corpus_mongo(db_manager, limit=1)) == 1
+
+def test_every_backend_is_scored_on_accuracy_errors_and_confusion():
+    report = ClassifierEvaluator(FakeUnifiedClassifier(), memory_sample=2).evaluate(CORPUS)
+    assert set(report) == {'keywords', ClassifierEvaluator.FALLBACK}
+
+    keywords = report['keywords']
+    assert keywords['emails'] == 4 and keywords['accuracy'] == 0.5 and keywords['errors'] == 1
+    assert keywords['confusion'] == {'order': {'order': 1}, 'support': {'order': 1, 'support': 1, 'error': 1}}
+    assert keywords['per_department']['support'] == {'recall': 1 / 3, 'precision': 1.0, 'support': 3}
+    assert keywords['per_department']['order'] == {'recall': 1.0, 'precision': 0.5, 'support': 1}
+    assert 0 <= keywords['p50_ms'] <= keywords['p99_ms']
+    assert report[ClassifierEvaluator.FALLBACK]['accuracy'] == 0.25
+
+def test_only_requested_and_available_methods_are_evaluated():
+    evaluator = ClassifierEvaluator(FakeUnifiedClassifier())
+    assert list(evaluator.backends(['keywords', 'openai'])) == ['keywords']
+    assert evaluator.evaluate([], ['keywords'])['keywords']['accuracy'] == 0.0
+
+def test_report_ranks_backends_by_accuracy():
+    report = ClassifierEvaluator(FakeUnifiedClassifier()).evaluate(CORPUS)
+    lines = list(ClassifierEvaluator.format_report(report))
+    assert lines[1].startswith('keywords') and lines[2].startswith(ClassifierEvaluator.FALLBACK)
+    assert 'keywords: confusion matrix (rows = true department, columns = predicted)' in lines
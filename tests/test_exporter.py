@@ -0,0 +1,32 @@
+import json
+import pytest
+from pymongo.errors import PyMongoError
+from src.exporter import EmailExporter
+
+def store(db_manager, count):
+    for uid in range(1, count + 1):
+        assert db_manager.insert_email({
+            'uid': str(uid), 'account': 'a', 'folder': 'inbox', 'message_id': f"<{uid}@example.com>",
+            'from_email': 'customer@example.com', 'subject': f"Subject {uid}", 'date': '', 'department': 'order'
+        })
+
+def test_jsonl_export_to_stdout(db_manager, capsys):
+    store(db_manager, 3)
+    count = EmailExporter(db_manager).export('-', 'jsonl', ['uid', 'department'], show_progress=False)
+    lines = capsys.readouterr().out.splitlines()
+    assert count == 3
+    assert [json.loads(line) for line in lines] == [{'uid': str(uid), 'department': 'order'} for uid in (1, 2, 3)]
+
+def test_database_error_mid_stream_fails_the_export(db_manager, tmp_path, monkeypatch):
+    store(db_manager, 3)
+    find = db_manager.collection.find
+
+    def failing_find(*args, **kwargs):
+        def documents():
+            yield from list(find(*args, **kwargs))[:1]
+            raise PyMongoError('cursor killed')
+        return documents()
+
+    monkeypatch.setattr(db_manager.collection, 'find', failing_find)
+    with pytest.raises(PyMongoError):
+        EmailExporter(db_manager).export(str(tmp_path / 'out.csv'), 'csv', show_progress=False)
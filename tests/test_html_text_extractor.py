@@ -0,0 +1,29 @@
+from src.html_text_extractor import html_to_text
+
+def test_skips_invisible_elements():
+    html = ('<html><head><title>Title</title><style>p { color: red }</style></head>'
+            '<body><script>alert(1)</script><p>Visible</p><div style="display: none">Hidden</div>'
+            '<span hidden>Also hidden</span><span aria-hidden="true">Decorative</span></body></html>')
+    assert html_to_text(html) == 'Visible'
+
+def test_unclosed_head_does_not_hide_body():
+    assert html_to_text('<html><head><title>T</title><body><p>Hello world</p>') == 'Hello world'
+
+def test_block_elements_start_new_lines():
+    html = '<p>First paragraph</p><ul><li>One<li>Two</ul>Line<br>break'
+    assert html_to_text(html) == 'First paragraph\nOne\nTwo\nLine\nbreak'
+
+def test_unterminated_elements_are_closed_implicitly():
+    html = '<div><p>Para<span style="visibility:hidden">x</div><p>After'
+    assert html_to_text(html) == 'Para\nAfter'
+
+def test_whitespace_is_normalized_and_entities_decoded():
+    assert html_to_text('<p>  Fish  &amp;  chips&nbsp;</p>') == 'Fish & chips'
+
+def test_output_is_capped():
+    text = html_to_text('<p>' + 'word ' * 1000 + '</p>', max_chars=50)
+    assert len(text) <= 50
+
+def test_input_is_fed_in_chunks():
+    html = '<p>' + 'a' * 100 + '</p><p>tail</p>'
+    assert html_to_text(html, chunk_size=7) == 'a' * 100 + '\ntail'
@@ -0,0 +1,60 @@
+from src.imap_bodystructure import (
+    collect_attachments, decode_section, parse_bodystructure, parse_fetch_response, select_text_parts
+)
+
+# multipart/mixed: a multipart/alternative (plain + html) and a PDF attachment
+MIXED_RESPONSE = [
+    b'1 (UID 42 BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 120 4 NIL NIL NIL)'
+    b'("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "7BIT" 480 10 NIL NIL NIL) "ALTERNATIVE" ("BOUNDARY" "b2") NIL NIL)'
+    b'("APPLICATION" "PDF" ("NAME" "invoice.pdf") NIL NIL "BASE64" 20480 NIL ("ATTACHMENT" ("FILENAME" "invoice.pdf")) NIL)'
+    b' "MIXED" ("BOUNDARY" "b1") NIL NIL))'
+]
+
+def parse(response):
+    return parse_bodystructure(parse_fetch_response(response)['BODYSTRUCTURE'])
+
+def test_parses_uid_and_nested_sections():
+    fetched = parse_fetch_response(MIXED_RESPONSE)
+    assert fetched['UID'] == b'42'
+
+    tree = parse(MIXED_RESPONSE)
+    assert tree['content_type'] == 'multipart/mixed'
+    alternative, attachment = tree['parts']
+    assert alternative['content_type'] == 'multipart/alternative'
+    assert [part['section'] for part in alternative['parts']] == ['1.1', '1.2']
+    assert alternative['parts'][0]['encoding'] == 'quoted-printable'
+    assert attachment['section'] == '2'
+    assert attachment['disposition'] == 'attachment'
+
+def test_prefers_plain_text_alternative_and_skips_attachments():
+    selected = select_text_parts(parse(MIXED_RESPONSE))
+    assert [(part['section'], part['content_type']) for part in selected] == [('1.1', 'text/plain')]
+
+def test_falls_back_to_html_when_plain_is_empty():
+    response = [
+        b'1 (BODYSTRUCTURE (("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 0 0 NIL NIL NIL)'
+        b'("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "7BIT" 480 10 NIL NIL NIL) "ALTERNATIVE" NIL NIL NIL))'
+    ]
+    assert [part['content_type'] for part in select_text_parts(parse(response))] == ['text/html']
+
+def test_single_part_body_is_section_one():
+    response = [b'1 (UID 7 BODYSTRUCTURE ("TEXT" "PLAIN" ("CHARSET" "iso-8859-1") NIL NIL "8BIT" 12 1 NIL NIL NIL))']
+    tree = parse(response)
+    assert (tree['section'], tree['charset']) == ('1', 'iso-8859-1')
+    assert select_text_parts(tree) == [tree]
+
+def test_collects_attachment_metadata():
+    assert collect_attachments(parse(MIXED_RESPONSE)) == [
+        {'filename': 'invoice.pdf', 'content_type': 'application/pdf', 'size': 20480, 'section': '2'}
+    ]
+
+def test_literal_strings_are_read_from_tuples():
+    response = [(b'1 (UID 9 BODY[1]<0> {5}', b'Hello'), b')']
+    assert parse_fetch_response(response)['BODY[1]'] == b'Hello'
+
+def test_decodes_transfer_encodings_and_charsets():
+    assert decode_section(b'Caf=C3=A9 au lait', {'encoding': 'quoted-printable', 'charset': 'utf-8'}) == 'Café au lait'
+    # Truncated base64 drops the incomplete trailing quantum
+    assert decode_section(b'SGVsbG8gd29y\r\nbGQ', {'encoding': 'base64', 'charset': 'utf-8'}) == 'Hello wor'
+    assert decode_section(b'\xe9t\xe9', {'encoding': '8bit', 'charset': 'latin-1'}) == 'été'
+    assert decode_section(b'plain', {'encoding': '7bit', 'charset': 'x-unknown'}) == 'plain'
@@ -0,0 +1,48 @@
+import logging
+import multiprocessing
+
+import pytest
+
+from src import logging_setup
+from src.logging_setup import setup_logging, setup_worker_logging, stop_logging, worker_log_queue
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    stop_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+def _log_from_worker(log_queue):
+    setup_worker_logging(log_queue)
+    logging.getLogger('worker').info('hello from the worker')
+
+def test_worker_records_are_written_by_the_parent(tmp_path, restore_logging):
+    log_file = tmp_path / 'app.log'
+    setup_logging(log_file=str(log_file))
+    logging.getLogger('parent').info('hello from the parent')
+
+    worker = multiprocessing.get_context('fork').Process(target=_log_from_worker, args=(worker_log_queue(),))
+    worker.start()
+    worker.join(10)
+    assert worker.exitcode == 0
+    stop_logging()
+
+    lines = log_file.read_text().splitlines()
+    assert any('hello from the parent' in line for line in lines)
+    assert any('hello from the worker' in line for line in lines)
+
+def test_worker_queue_needs_a_parent_listener(restore_logging):
+    stop_logging()
+    assert worker_log_queue() is None
+    # Without a queue a worker keeps the handlers it inherited
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    setup_worker_logging(None)
+    assert root.handlers == handlers
+    assert logging_setup._worker_listener is None
@@ -0,0 +1,45 @@
+from main import EmailSegregationSystem
+from src.near_duplicate import NearDuplicateDetector, hamming_distance, simhash
+
+ALERT = "ALERT: disk usage on host db-01 at {}% since 2024-01-01 10:0{}:03, threshold 90%. Check the volume and free space."
+
+def test_simhash_is_stable_and_ignores_numbers():
+    assert simhash(ALERT.format(91, 0)) == simhash(ALERT.format(91, 0))
+    assert hamming_distance(simhash(ALERT.format(91, 0)), simhash(ALERT.format(97, 5))) == 0
+
+def test_simhash_separates_unrelated_text():
+    other = "Please send me an invoice for the three laptops we bought in March, including the warranty."
+    assert hamming_distance(simhash(ALERT.format(91, 0)), simhash(other)) > 6
+
+def test_short_text_has_no_signature():
+    assert simhash('thanks a lot') is None
+
+def test_detector_finds_close_signatures_through_bands():
+    detector = NearDuplicateDetector(max_distance=3)
+    base = simhash(ALERT.format(91, 0))
+    detector.add(base, '1', 'hardware', 'monitor@example.com', seen_at=1000)
+    # Flip bits in different bands; each candidate still shares an unchanged band with the original
+    near = base ^ (1 << 0) ^ (1 << 20) ^ (1 << 40)
+    far = base ^ sum(1 << bit for bit in range(0, 64, 8))
+    assert detector.find(near, now=1001)['uid'] == '1'
+    assert detector.find(far, now=1001) is None
+    assert detector.find(None) is None
+
+def test_detector_forgets_entries_outside_the_window():
+    detector = NearDuplicateDetector(window_seconds=60, max_entries=2)
+    signature = simhash(ALERT.format(91, 0))
+    detector.add(signature, '1', 'hardware', seen_at=1000)
+    assert detector.find(signature, now=1061) is None
+    assert len(detector) == 0
+
+    for uid in ('2', '3', '4'):
+        detector.add(signature, uid, 'hardware', seen_at=2000)
+    assert len(detector) == 2
+    assert detector.find(signature, now=2000)['uid'] in ('3', '4')
+
+def test_only_a_senders_own_repeats_are_collapsed():
+    original = {'uid': '1', 'department': 'order', 'from_email': 'alice@example.com'}
+    route = {'method': 'near_duplicate', 'department': 'order', 'original': original}
+    planned = EmailSegregationSystem._planned_actions
+    assert planned(None, {'from_email': 'Alice@example.com'}, route) == []
+    assert planned(None, {'from_email': 'bob@example.com'}, route) == ['reply', 'forward']
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from src.parallel_fetcher import ParallelFetcher
+
+class FakeConnection:
+    """Stands in for a cloned EmailProcessor with its own IMAP connection"""
+
+    def __init__(self, connects=True, broken=False, delay=0.0):
+        self.connects, self.broken, self.delay = connects, broken, delay
+        self.fetched, self.disconnected = [], False
+
+    def connect_to_email(self):
+        return self.connects
+
+    def _process_single_email(self, uid):
+        if self.broken:
+            raise ConnectionError('connection reset')
+        time.sleep(self.delay)
+        self.fetched.append(uid)
+        # UID 0 stands for a message that cannot be parsed
+        return {'uid': uid.decode()} if uid != b'0' else None
+
+    def disconnect_from_email(self):
+        self.disconnected = True
+
+def factory(*connections):
+    lock, pending = threading.Lock(), list(connections)
+
+    def create():
+        with lock:
+            return pending.pop(0)
+    return create
+
+def uids(count):
+    return [str(uid).encode() for uid in range(count)]
+
+def test_results_keep_uid_order_across_connections():
+    connections = [FakeConnection(delay=0.002 * i) for i in range(3)]
+    fetched = ParallelFetcher(factory(*connections), connections=3).fetch(uids(30), fallback=lambda uid: None)
+    # Unparseable emails are dropped, the rest come back in UID order
+    assert [email['uid'] for email in fetched] == [str(uid) for uid in range(1, 30)]
+    assert sorted(uid for connection in connections for uid in connection.fetched) == sorted(uids(30))
+    assert all(connection.disconnected for connection in connections)
+
+def test_uids_no_connection_could_fetch_go_through_the_fallback():
+    connections = [FakeConnection(connects=False), FakeConnection(connects=False)]
+    fallback = []
+    fetched = ParallelFetcher(factory(*connections), connections=2).fetch(
+        uids(4), fallback=lambda uid: fallback.append(uid) or {'uid': uid.decode()})
+    assert [email['uid'] for email in fetched] == ['0', '1', '2', '3']
+    assert fallback == uids(4)
+
+def test_a_failed_connection_leaves_its_work_to_the_others():
+    connections = [FakeConnection(broken=True), FakeConnection(delay=0.001)]
+    fallback = []
+    fetched = ParallelFetcher(factory(*connections), connections=2).fetch(
+        uids(10)[1:], fallback=lambda uid: fallback.append(uid) or {'uid': uid.decode()})
+    assert [email['uid'] for email in fetched] == [str(uid) for uid in range(1, 10)]
+    # Only the UID lost with the broken connection is fetched again
+    assert len(fallback) == 1 and not connections[0].fetched
+
+def test_no_more_connections_than_uids():
+    connections = [FakeConnection() for _ in range(4)]
+    fetched = ParallelFetcher(factory(*connections), connections=4).fetch(uids(3)[1:], fallback=lambda uid: None)
+    assert [email['uid'] for email in fetched] == ['1', '2']
+    assert sum(connection.disconnected for connection in connections) == 2
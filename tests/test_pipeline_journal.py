@@ -0,0 +1,177 @@
+import time
+
+import pytest
+
+from helpers import FakeMailbox, make_record
+from src.async_writer import AsyncEmailWriter
+from src.journal import PipelineJournal
+
+ACCOUNT, FOLDER = 'support@example.com', 'inbox'
+
+@pytest.fixture(autouse=True)
+def journal_enabled(monkeypatch):
+    from config.settings import Config
+    monkeypatch.setattr(Config, 'PIPELINE_JOURNAL', True)
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = PipelineJournal(str(tmp_path / 'journal.db'))
+    yield journal
+    journal.close()
+
+def test_entry_is_removed_once_every_required_step_is_done(journal):
+    journal.record_fetched(ACCOUNT, FOLDER, ['1', '2'])
+    assert journal.uids(ACCOUNT, FOLDER) == set()
+
+    journal.record_classified(ACCOUNT, FOLDER, '1', {'uid': '1'}, ['reply', 'forward'])
+    assert journal.uids(ACCOUNT, FOLDER) == {'1'}
+    journal.mark(ACCOUNT, FOLDER, '1', 'persisted')
+    journal.mark(ACCOUNT, FOLDER, '1', 'replied')
+    [entry] = [entry for entry in journal.unfinished(ACCOUNT, FOLDER) if entry['uid'] == '1']
+    assert entry['persisted'] and entry['actions'] == ['forward'] and entry['document'] == {'uid': '1'}
+
+    journal.mark(ACCOUNT, FOLDER, '1', 'forwarded')
+    assert journal.uids(ACCOUNT, FOLDER) == set()
+
+def test_discard_fetched_keeps_classified_entries(journal):
+    journal.record_fetched(ACCOUNT, FOLDER, ['1', '2', '3'])
+    journal.record_classified(ACCOUNT, FOLDER, '2', {'uid': '2'}, [])
+    journal.discard_fetched(ACCOUNT, FOLDER, ['1', '2', '3'])
+    assert [entry['uid'] for entry in journal.unfinished(ACCOUNT, FOLDER)] == ['2']
+
+class FlakyDatabase:
+    """insert_emails stores only the emails whose uid is not in refuse"""
+
+    def __init__(self, refuse=()):
+        self.refuse = set(refuse)
+        self.stored = []
+        self.attempts = 0
+
+    def insert_emails(self, emails):
+        self.attempts += 1
+        inserted = [email_data for email_data in emails if email_data['uid'] not in self.refuse]
+        self.stored.extend(inserted)
+        return inserted
+
+    def email_exists(self, email_data):
+        return False
+
+def test_writer_reports_stored_and_failed_emails_per_batch():
+    database = FlakyDatabase(refuse={'2'})
+    persisted, failed = [], []
+    writer = AsyncEmailWriter(database, persisted.append, batch_size=10, flush_interval=60, on_failed=failed.append,
+                              max_retries=0)
+    writer.start()
+    for uid in ('1', '2', '3'):
+        writer.submit({'uid': uid})
+    writer.stop()
+    assert [[email_data['uid'] for email_data in batch] for batch in persisted] == [['1', '3']]
+    assert [[email_data['uid'] for email_data in batch] for batch in failed] == [['2']]
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+def test_writer_retries_failed_emails_before_giving_up():
+    database = FlakyDatabase(refuse={'2'})
+    persisted, failed = [], []
+    writer = AsyncEmailWriter(database, persisted.append, batch_size=10, flush_interval=0.05, on_failed=failed.append,
+                              max_retries=2, retry_delay=0)
+    writer.start()
+    writer.submit({'uid': '1'})
+    writer.submit({'uid': '2'})
+    wait_for(lambda: failed)
+    writer.stop()
+    assert [[email_data['uid'] for email_data in batch] for batch in failed] == [['2']]
+    assert database.attempts == 3
+
+def test_writer_reports_a_successful_retry_as_persisted():
+    database = FlakyDatabase(refuse={'1'})
+    persisted, failed = [], []
+    writer = AsyncEmailWriter(database, persisted.append, batch_size=10, flush_interval=0.05, on_failed=failed.append,
+                              max_retries=5, retry_delay=0)
+    writer.start()
+    writer.submit({'uid': '1'})
+    wait_for(lambda: database.attempts >= 2)
+    database.refuse = set()
+    wait_for(lambda: persisted)
+    writer.stop()
+    assert [[email_data['uid'] for email_data in batch] for batch in persisted] == [['1']]
+    assert failed == []
+
+@pytest.fixture
+def async_system(make_system, monkeypatch):
+    from config.settings import Config
+    monkeypatch.setattr(Config, 'ASYNC_DB_WRITES', True)
+    monkeypatch.setattr(Config, 'ENABLE_UID_LEASES', True)
+    monkeypatch.setattr(Config, 'DB_WRITE_FLUSH_SECONDS', 60)  # Nothing is written until the writer stops
+    systems = []
+
+    def build(mailbox):
+        system = make_system(mailbox)
+        system._start_services()
+        systems.append(system)
+        return system
+    yield build
+    for system in systems:
+        if system.db_writer:
+            system.db_writer.stop()
+        system.db_manager.stop_lease_heartbeat()
+
+def test_leases_are_held_until_the_async_write_is_confirmed(db_manager, other_db_manager, async_system):
+    system = async_system(FakeMailbox({'1': make_record(1), '2': make_record(2)}))
+    system._check_and_process_emails()
+    assert len(system.responder.forwards) == 2
+    assert other_db_manager.claim_email_uids(ACCOUNT, FOLDER, ['1', '2']) == []
+
+    system.db_writer.stop()
+    assert sorted(db_manager.get_processed_uids(ACCOUNT, FOLDER)) == ['1', '2']
+    assert system.journal.unfinished(ACCOUNT, FOLDER) == []
+    assert other_db_manager.claim_email_uids(ACCOUNT, FOLDER, ['1', '2']) == ['1', '2']
+
+def test_duplicate_in_the_same_batch_is_sent_once(db_manager, async_system):
+    # The same message delivered twice, e.g. once directly and once through a list
+    mailbox = FakeMailbox({'1': make_record(1), '2': make_record(2, message_id='<1@example.com>')})
+    system = async_system(mailbox)
+    system._check_and_process_emails()
+    system.db_writer.stop()
+    assert len(system.responder.forwards) == 1
+    assert db_manager.collection.count_documents({}) == 1
+    # The second UID is recorded as skipped, so it is not fetched again
+    assert sorted(db_manager.get_processed_uids(ACCOUNT, FOLDER)) == ['1', '2']
+
+def test_skipped_and_failed_emails_leave_no_fetched_entries(db_manager, make_system, monkeypatch):
+    mailbox = FakeMailbox({'1': make_record(1), '2': make_record(2)})
+    system = make_system(mailbox)
+    system._check_and_process_emails()
+
+    mailbox.messages['3'] = make_record(3, message_id='<1@example.com>')  # Already stored under UID 1
+    mailbox.messages['4'] = make_record(4)
+    system = make_system(mailbox)
+    monkeypatch.setattr(system, '_route_email', lambda email_data: 1 / 0)
+    system._check_and_process_emails()
+    assert system.journal.unfinished(ACCOUNT, FOLDER) == []
+
+def journal_document(uid):
+    return {
+        'uid': uid, 'account': ACCOUNT, 'folder': FOLDER, 'message_id': f"<{uid}@example.com>",
+        'from_email': f"customer{uid}@example.com", 'subject': f"Order question {uid}",
+        'date': 'Mon, 1 Jan 2024 10:00:00 +0000', 'cleaned_content': 'Where is my order?', 'department': 'sales'
+    }
+
+def test_resume_leaves_entries_leased_elsewhere(db_manager, other_db_manager, make_system, monkeypatch):
+    from config.settings import Config
+    monkeypatch.setattr(Config, 'ENABLE_UID_LEASES', True)
+    system = make_system(FakeMailbox({}))
+    for uid in ('1', '2', '3'):
+        system.journal.record_classified(ACCOUNT, FOLDER, uid, journal_document(uid), ['forward'])
+    system.journal.mark(ACCOUNT, FOLDER, '2', 'persisted')
+    assert other_db_manager.claim_email_uids(ACCOUNT, FOLDER, ['1', '2']) == ['1', '2']
+
+    system._resume_journal()
+    # Only the unleased entry is replayed, and its lease is released afterwards
+    assert system.responder.forwards == ["Order question 3"]
+    assert db_manager.claim_email_uids(ACCOUNT, FOLDER, ['3']) == ['3']
+    # The other instance stores and sends its unstored email itself; the stored one is retried later
+    assert [entry['uid'] for entry in system.journal.unfinished(ACCOUNT, FOLDER)] == ['2']
@@ -0,0 +1,29 @@
+from datetime import datetime
+from src.poll_scheduler import AdaptivePollScheduler
+
+WEDNESDAY_NOON = datetime(2024, 1, 3, 12, 0)
+SUNDAY_NOON = datetime(2024, 1, 7, 12, 0)
+
+def test_idle_checks_back_off_up_to_the_maximum():
+    scheduler = AdaptivePollScheduler(min_interval=10, max_interval=60, backoff=2)
+    intervals = [scheduler.next_interval(t * 100, 0, now=WEDNESDAY_NOON) for t in range(5)]
+    assert intervals == [20, 40, 60, 60, 60]
+
+def test_busy_mailbox_polls_faster():
+    scheduler = AdaptivePollScheduler(min_interval=5, max_interval=300, target_per_poll=1, smoothing=1.0)
+    scheduler.next_interval(0, 0, now=WEDNESDAY_NOON)
+    # 6 emails in 60 seconds: one per 10 seconds
+    assert scheduler.next_interval(60, 6, now=WEDNESDAY_NOON) == 10
+
+def test_backlog_skips_the_wait():
+    scheduler = AdaptivePollScheduler(min_interval=10, max_interval=60)
+    assert scheduler.next_interval(0, 50, backlog=100, now=WEDNESDAY_NOON) == 0.0
+    assert scheduler.interval == 10
+
+def test_profiles_narrow_the_range_during_business_hours():
+    profiles = AdaptivePollScheduler.parse_profiles(
+        '[{"days": [0, 1, 2, 3, 4], "start": "08:00", "end": "18:00", "max_interval": 30}]'
+    )
+    scheduler = AdaptivePollScheduler(min_interval=10, max_interval=300, backoff=100, profiles=profiles)
+    assert scheduler.next_interval(0, 0, now=WEDNESDAY_NOON) == 30
+    assert scheduler.next_interval(100, 0, now=SUNDAY_NOON) == 300
@@ -0,0 +1,72 @@
+from helpers import FakeMailbox, make_record
+from src.priority import AgingPriorityQueue, FirstSeenTimes, ForwardLatencyTracker, PriorityScorer
+
+def drain(queue):
+    return [queue.pop() for _ in range(len(queue))]
+
+def test_scorer_uses_headers_keywords_and_senders():
+    scorer = PriorityScorer(['urgent', 'outage'], ['vip@example.com', '@partner.com'])
+    assert scorer.score({'subject': 'hello'}) == 0
+    assert scorer.score({'subject': 'URGENT: outage'}) == 6
+    assert scorer.score({'subject': '=?utf-8?q?urgent?='}) == 3
+    assert scorer.score({'x_priority': '1 (Highest)', 'importance': 'high'}) == 5
+    assert scorer.score({'x_priority': '5', 'importance': 'low'}) == -2
+    assert scorer.score({'from_email': 'VIP@example.com'}) == 4
+    assert scorer.score({'from_email': 'anyone@partner.com'}) == 4
+
+def test_queue_pops_highest_score_then_insertion_order():
+    queue = AgingPriorityQueue(aging_seconds=600)
+    for item, score in (('a', 0), ('b', 3), ('c', 0), ('d', 1)):
+        queue.push(item, score, enqueued_at=1000)
+    assert drain(queue) == ['b', 'd', 'a', 'c']
+
+def test_waiting_outweighs_a_higher_score_eventually():
+    queue = AgingPriorityQueue(aging_seconds=60)
+    queue.push('bulk', -1, enqueued_at=0)       # Waited 10 minutes: -1 + 10
+    queue.push('urgent', 5, enqueued_at=600)    # Just arrived
+    assert drain(queue) == ['bulk', 'urgent']
+
+def test_without_aging_only_the_score_counts():
+    queue = AgingPriorityQueue(aging_seconds=0)
+    queue.push('old', 0, enqueued_at=0)
+    queue.push('new', 1, enqueued_at=10 ** 9)
+    assert drain(queue) == ['new', 'old']
+
+def test_first_seen_times_are_kept_until_forgotten(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('src.priority.time.time', lambda: now[0])
+    times = FirstSeenTimes()
+    assert times.get('1') == 100.0
+    now[0] = 200.0
+    assert times.get('1') == 100.0 and times.get('2') == 200.0
+    times.retain(['2', '3'])
+    assert len(times) == 1
+    times.forget('2')
+    assert times.get('2') == 200.0
+
+def test_latency_percentiles_per_department():
+    tracker = ForwardLatencyTracker(max_samples=100)
+    for seconds in range(1, 101):
+        tracker.record('payment', seconds)
+    tracker.record('order', -5)
+    summary = tracker.summary()
+    assert summary['payment'] == {'count': 100, 'p50': 50, 'p99': 99}
+    assert summary['order']['p99'] == 0.0
+    assert tracker.percentile('software') is None
+
+def test_backdated_date_header_does_not_jump_the_queue_or_skew_latency(db_manager, make_system, monkeypatch):
+    from config.settings import Config
+    monkeypatch.setattr(Config, 'PRIORITY_ORDERING', True)
+    mailbox = FakeMailbox({
+        '1': make_record(1, date='Mon, 1 Jan 2024 10:00:00 +0000'),
+        '2': make_record(2, date='Mon, 1 Jan 1990 10:00:00 +0000'),
+        '3': make_record(3, date='Mon, 1 Jan 2024 10:00:00 +0000', subject='URGENT order question'),
+    })
+    system = make_system(mailbox)
+    assert system.priority_scorer
+    system._process_fetched_emails([])
+
+    # Same first-seen time, so only the score matters; the 1990 Date header buys nothing
+    assert system.responder.forwards == ['URGENT order question', 'Order question 1', 'Order question 2']
+    assert system.forward_latency.summary()['order']['p99'] < 60
+    assert len(system.first_seen) == 0
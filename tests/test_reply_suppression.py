@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+
+from helpers import FakeMailbox, make_record
+from src.reply_suppression import ReplySuppressor
+
+def test_one_reply_per_sender_within_the_window_across_workers(db_manager, other_db_manager):
+    first, second = ReplySuppressor(db_manager), ReplySuppressor(other_db_manager)
+    assert first.should_send('Customer@Example.com')
+    assert not first.should_send('customer@example.com')
+    # Another worker sees the window through the database
+    assert not second.should_send('customer@example.com')
+    assert second.should_send('someone.else@example.com')
+
+def test_released_and_expired_windows_allow_a_new_reply(db_manager, other_db_manager):
+    first, second = ReplySuppressor(db_manager), ReplySuppressor(other_db_manager)
+    assert first.should_send('customer@example.com')
+    first.release('customer@example.com')
+    assert second.should_send('customer@example.com')
+
+    db_manager.auto_replies.update_many({}, {'$set': {'expires_at': datetime.now(timezone.utc) - timedelta(seconds=1)}})
+    assert ReplySuppressor(db_manager).should_send('customer@example.com')
+
+def test_the_cache_is_bounded(db_manager):
+    suppressor = ReplySuppressor(db_manager, capacity=2)
+    for sender in ('a@example.com', 'b@example.com', 'c@example.com'):
+        assert suppressor.should_send(sender)
+    assert list(suppressor._windows) == ['b@example.com', 'c@example.com']
+    # The evicted sender is still suppressed through the database
+    assert not suppressor.should_send('a@example.com')
+
+def test_repeat_emails_from_a_sender_get_one_reply_but_every_forward(db_manager, make_system, monkeypatch):
+    from config.settings import Config
+    monkeypatch.setattr(Config, 'AUTO_REPLY_SUPPRESSION', True)
+    mailbox = FakeMailbox({str(uid): make_record(uid, from_email='customer@example.com') for uid in range(1, 4)})
+    system = make_system(mailbox)
+    system._process_fetched_emails([])
+
+    assert system.responder.replies == ['customer@example.com']
+    assert len(system.responder.forwards) == 3
+    assert system.stats['suppressed_replies'] == 2
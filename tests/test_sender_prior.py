@@ -0,0 +1,59 @@
+from src.sender_prior import SenderPrior, sender_keys
+
+def store(db_manager, uid, from_email, department, routed_by='classifier'):
+    assert db_manager.insert_email({
+        'uid': str(uid), 'account': 'a', 'folder': 'inbox', 'message_id': f"<{uid}@example.com>",
+        'from_email': from_email, 'subject': f"Subject {uid}", 'date': '', 'department': department,
+        'routed_by': routed_by
+    })
+
+def test_shared_domains_only_get_address_keys():
+    assert sender_keys('Billing@Vendor.example') == ['email:billing@vendor.example', 'domain:vendor.example']
+    assert sender_keys('someone@gmail.com') == ['email:someone@gmail.com']
+    assert sender_keys('not-an-address') == []
+
+def test_consistent_sender_is_routed_by_history(db_manager):
+    for uid in range(5):
+        store(db_manager, uid, 'billing@vendor.example', 'payment')
+    prior = SenderPrior(db_manager, min_count=5, min_share=0.9)
+    assert prior.lookup('billing@vendor.example') == 'payment'
+    # The domain histogram covers other addresses of the same company
+    assert prior.lookup('accounts@vendor.example') == 'payment'
+
+def test_only_classifier_decisions_are_counted(db_manager):
+    for uid in range(3):
+        store(db_manager, uid, 'billing@vendor.example', 'payment')
+    for uid in range(3, 10):
+        store(db_manager, uid, 'billing@vendor.example', 'payment', routed_by='sender_prior')
+    store(db_manager, 10, 'billing@vendor.example', 'payment', routed_by='thread')
+    assert db_manager.get_sender_histograms(['email:billing@vendor.example']) == {
+        'email:billing@vendor.example': {'payment': 3}
+    }
+    assert SenderPrior(db_manager, min_count=5).lookup('billing@vendor.example') is None
+
+def test_bulk_inserts_count_only_classifier_decisions(db_manager):
+    emails = [
+        {'uid': str(uid), 'account': 'a', 'folder': 'inbox', 'message_id': f"<{uid}@example.com>",
+         'from_email': 'ops@vendor.example', 'subject': str(uid), 'date': '', 'department': 'hardware',
+         'routed_by': 'classifier' if uid % 2 else 'sender_prior'}
+        for uid in range(6)
+    ]
+    assert len(db_manager.insert_emails(emails)) == 6
+    assert db_manager.get_sender_histograms(['domain:vendor.example'])['domain:vendor.example'] == {'hardware': 3}
+
+def test_free_mail_domain_does_not_lock_new_senders(db_manager):
+    for uid in range(10):
+        store(db_manager, uid, f"customer{uid}@gmail.com", 'order')
+    assert SenderPrior(db_manager, min_count=5).lookup('new.customer@gmail.com') is None
+
+def test_audits_correct_the_prior(db_manager):
+    for uid in range(5):
+        store(db_manager, uid, 'billing@vendor.example', 'payment')
+    prior = SenderPrior(db_manager, min_count=5, min_share=0.9)
+    assert prior.lookup('billing@vendor.example') == 'payment'
+    # The classifier now disagrees; audited results pull the share below the threshold
+    prior.observe('billing@vendor.example', 'software')
+    assert prior.lookup('billing@vendor.example') is None
+    assert db_manager.get_sender_histograms(['email:billing@vendor.example'])['email:billing@vendor.example'] == {
+        'payment': 5, 'software': 1
+    }
@@ -0,0 +1,42 @@
+import os
+import time
+
+from config.settings import Config
+from src.supervisor import MailboxSupervisor
+
+def exiting_worker(mailbox, check_interval, status_queue, log_queue):
+    os._exit(mailbox['exitcode'])
+
+def wait_until_dead(supervisor):
+    for worker in supervisor.workers.values():
+        worker['process'].join(5)
+
+def test_only_failed_workers_are_restarted(monkeypatch):
+    monkeypatch.setattr(Config, 'SUPERVISOR_RESTART_DELAY', 0)
+    mailboxes = [{'username': 'clean@example.com', 'folder': 'inbox', 'exitcode': 0},
+                 {'username': 'failing@example.com', 'folder': 'inbox', 'exitcode': 3}]
+    supervisor = MailboxSupervisor(mailboxes, exiting_worker)
+    for mailbox in mailboxes:
+        supervisor._start_worker(mailbox)
+    wait_until_dead(supervisor)
+
+    supervisor._check_workers()
+    status = supervisor.get_status()['mailboxes']
+    assert status['clean@example.com/inbox']['state'] == 'stopped'
+    assert status['failing@example.com/inbox']['state'] == 'crashed'
+
+    time.sleep(0.01)
+    supervisor._check_workers()
+    wait_until_dead(supervisor)
+    status = supervisor.get_status()['mailboxes']
+    assert status['clean@example.com/inbox']['restarts'] == 0
+    assert status['failing@example.com/inbox']['restarts'] == 1
+    assert status['failing@example.com/inbox']['state'] == 'starting'
+
+def test_supervisor_stops_once_every_worker_exited_cleanly(monkeypatch):
+    mailboxes = [{'username': 'clean@example.com', 'folder': 'inbox', 'exitcode': 0}]
+    supervisor = MailboxSupervisor(mailboxes, exiting_worker)
+    # Instead of polling every second, wait for the worker to exit
+    monkeypatch.setattr(time, 'sleep', lambda seconds: wait_until_dead(supervisor))
+    assert supervisor.run()
+    assert supervisor.get_status()['mailboxes']['clean@example.com/inbox']['restarts'] == 0